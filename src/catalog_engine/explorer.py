@@ -16,19 +16,44 @@ import bs4
 import requests
 import json
 
+from catalog_engine_v2.client import HttpClient
+from catalog_engine_v2.const import FUNNELBACK_COURSE_API
+from catalog_engine_v2.snapshot import CourseDelta, CourseSnapshotStore
+
 class CourseExplorer:
     """ Class for handling 'https://www.gettysburg.edu/api/funnelback/courses/' api specifically.
     """
+
+    # The attributes of a course which are used, the only ones kept when the api is streamed
+    attrs = ["catalogNumber", "subjectAreaAbbrv", "id", \
+    "deparmentName", "title", "officialCourseDesc", "academicDepartmentId","url"]
     
-    def __init__(self, data: Dict):
+    def __init__(self, data: Dict, delta: CourseDelta = None):
         """ Description
 
         Args:
             data (Dict): [description]
+            delta (CourseDelta): The courses added, removed and changed since the previous
+                snapshot of the api, if the data comes from a `CourseSnapshotStore`.
         """
         self.data = data['data']
-        self.attrs = ["catalogNumber", "subjectAreaAbbrv", "id", \
-        "deparmentName", "title", "officialCourseDesc", "academicDepartmentId","url"]
+        self.delta = delta
+
+    @classmethod
+    def from_snapshot(cls, store: CourseSnapshotStore, client: HttpClient = None, url: str = FUNNELBACK_COURSE_API, force: bool = False) -> "CourseExplorer":
+        """ Build the explorer from the latest snapshot of the api, syncing it first if it is stale
+
+        Args:
+            store (CourseSnapshotStore): The snapshots of the api.
+            client (HttpClient): The http client used to sync.
+            url (str): The url of the courses api.
+            force (bool): Sync even if the latest snapshot is fresh.
+
+        Returns:
+            CourseExplorer: The explorer, with the delta of the snapshot.
+        """
+        data, delta = store.load(client=client, url=url, force=force, attrs=cls.attrs)
+        return cls(data, delta=delta)
 
     def get_description(self, course_code: str) -> str:
         """ Given a course code, return the description of the course from the api
@@ -17,6 +17,9 @@ import requests
 import json
 from .scraper import *
 
+# Content of a page which could not be crawled, in place of its extracted content
+BLANK_CONTENT = "<p>[CONTENT BLANK]</p>"
+
 class Extractor:
     """ Super class of extractor
     """
@@ -45,6 +48,9 @@ class Extractor:
 class FacultyExtractor (Extractor):
     """ This class extracts faculty pages
     """
+    # The (html tag, css class) of every element read from a page, see `Scraper(containers=...)`
+    CONTAINERS = [('div', 'gb-c-longform')]
+
     def __init__(self, scraper: Scraper):
         """ description
         Args:
@@ -58,24 +64,31 @@ class FacultyExtractor (Extractor):
         self.data = self.extract_all_soup()
 
     def extract_all_soup(self):
-        """ Extracts faculty information and places it in the data structure
+        """ Extracts faculty information and places it in the data structure. A page which could
+            not be crawled keeps its place with a blank content, since the generator reads the
+            pages by position.
 
         Returns:
-            [type]: [description]
+            List[Dict]: The title and content of every faculty page, in the csv order.
         """
         data = []
         for i, line in self.scraper.df.iterrows():
-            soup = self.scraper.mapper[i]
             if self.base_uri in str(line["URL"]):
                 page : Dict = {}
                 page['Title'] = str(line["URL"].split('/')[-1])
-                page['Content'] = str(soup.select('div.gb-c-longform')[0])
+                if i in self.scraper.failed:
+                    page['Content'] = BLANK_CONTENT
+                else:
+                    page['Content'] = str(self.scraper.mapper[i].select('div.gb-c-longform')[0])
                 data.append(page)
         return data
 
 class PolicyExtractor (Extractor):
     """ This class extracts policy pages
     """
+    # The (html tag, css class) of every element read from a page, see `Scraper(containers=...)`
+    CONTAINERS = [('h1', 'gb-c-hero__title'), ('div', 'gb-c-longform')]
+
     def __init__(self, scraper: Scraper):
         """ description
         Args:
@@ -142,9 +155,15 @@ class PolicyExtractor (Extractor):
             (Dict): The policy object for that specific page
         """
         data: Dict = {}
-        soup = self.scraper.mapper[soup_id]
-        data['Title'] = str(soup.find('h1', {'class': 'gb-c-hero__title'}).get_text())
-        data['Content'] = str(soup.select('div.gb-c-longform.column')[0])
+        if soup_id in self.scraper.failed:
+            # The policy keeps its place under the title of the csv file
+            title = self.scraper.df.loc[soup_id]["Title"]
+            data['Title'] = str(title) if isinstance(title, str) and title else policy_id
+            data['Content'] = BLANK_CONTENT
+        else:
+            soup = self.scraper.mapper[soup_id]
+            data['Title'] = str(soup.find('h1', {'class': 'gb-c-hero__title'}).get_text())
+            data['Content'] = str(soup.select('div.gb-c-longform.column')[0])
         data['Policy_ID'] = policy_id
         data['Policy_Type'] = self.get_policy_type(data['Title'])
         return data
@@ -174,6 +193,16 @@ class PolicyExtractor (Extractor):
 class CourseExtractor (Extractor):
     """ This class extracts subject pages
     """
+    # The (html tag, css class) of every element read from a page by one of the templates of
+    # `extract_soup`, see `Scraper(containers=...)`
+    CONTAINERS = [
+        ('div', 'gb-c-longform'), # Major-minor and pre-health main page
+        ('div', 'gb-u-spacing-quad-top'), # Program
+        ('li', 'gb-c-accordion__item'), # Courses
+        ('div', 'gb-u-spacing-bottom'), # Main page
+        ('main', 'gb-u-spacing-quad-top'), # Conservatory of music main page
+        ('h1', 'gb-c-hero__title'), # Subject of every main page
+    ]
 
     def __init__(self, scraper: Scraper): 
         """ description
@@ -443,6 +472,28 @@ class CourseExtractor (Extractor):
         
         pass
 
+    def blank_soup(self, base_uri, uri, subject_name):
+        """ The content of a page which could not be crawled. The main page of a subject still gives
+            the subject, so the subject keeps its place in the catalog and its table of contents.
+
+        Args:
+            base_uri (str): the base url of the subject.
+            uri (str): the full url of the page.
+            subject_name (str): the name of the subject in its url, i.e: "economics"
+
+        Returns:
+            dict: One dictionary data for a page, None if it has nothing but blank content
+        """
+        print(f"Not extracting {uri}, it could not be crawled")
+        if uri != base_uri:
+            return None
+        return {
+            'Subject': subject_name.replace('-', ' ').title(),
+            'Major': None,
+            'Minor': None,
+            'Brief': BLANK_CONTENT,
+        }
+
     def extract_all_soup(self):
         """ Extract every soup in the soup list
         
@@ -496,7 +547,10 @@ class CourseExtractor (Extractor):
             soup = self.scraper.mapper[self.course_index[ptr]]
 
             # Returned content is a dict
-            content = self.extract_soup(ptr, current_subject_uri, current_uri, soup)
+            if self.course_index[ptr] in self.scraper.failed:
+                content = self.blank_soup(current_subject_uri, current_uri, current_subject_name)
+            else:
+                content = self.extract_soup(ptr, current_subject_uri, current_uri, soup)
             
             if content:
                 # print("Content keys: "  + str(content.keys()))
@@ -9,7 +9,8 @@
         can be viewed at `../../doc/` folder.
 """
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
+from urllib.parse import urljoin, urlsplit
 import re
 import pandas as pd
 import bs4
@@ -17,79 +18,146 @@ import requests
 import json
 import os
 
+from catalog_engine_v2.cache import CrawlCache, normalize_url, sniff_charset
+from catalog_engine_v2.client import HttpClient
+from catalog_engine_v2.fetcher import FetchEngine
+from catalog_engine_v2.journal import CrawlJournal
+from catalog_engine_v2.singleflight import SingleFlight
+from catalog_engine_v2.strainer import ContainerStrainer
+from catalog_engine_v2.const import DEFAULT_MAX_CONCURRENCY, PARSE_STAGE
+from catalog_engine_v2.parser import parse_html
+
 class Scraper:
     """ The scraper class will crawl all data from link
     """
 
-    def __init__(self, csv_path, data_path='./data/', flag='courses'):
+    def __init__(self, csv_path, data_path='./data/', flag='courses', max_concurrency=DEFAULT_MAX_CONCURRENCY, client: HttpClient = None, cache: CrawlCache = None, parses: SingleFlight = None, journal: CrawlJournal = None, containers: List[Tuple[str, str]] = None):
         """ Description
 
         Args:
             csv_path (str): The path to the csv file that contains all link. 
-            There are two flags for the scraper to know which folder to store data in!
+            flag (str): Which kind of pages the csv file lists, one of 'courses', 'policies' and 'faculty'.
+            max_concurrency (int): Maximum number of pages crawled at the same time.
+            client (HttpClient): The shared http client. A new one is created if not given.
+            cache (CrawlCache): The shared page cache. Defaults to a cache at `data_path + "html/"`.
+            parses (SingleFlight): Shares the parsed soup of an url between rows and scrapers.
+                Defaults to sharing only between the rows of this scraper.
+            journal (CrawlJournal): Records every fetched url. The urls already in the journal of a
+                resumed run are read straight from the cache, without any request.
+            containers (List[Tuple[str, str]]): The (html tag, css class) of the elements the
+                extractor reads, e.g, `CourseExtractor.CONTAINERS`. If given, only those elements
+                are built when a page is parsed. Every page is fully parsed otherwise.
         """
         super().__init__()
         self.flag = flag
         self.csv_path = csv_path
+        self.engine = FetchEngine(max_concurrency)
+        self.client = client if client is not None else HttpClient(pool_maxsize=max_concurrency)
 
         # This variable is created to be modified in `scrape_src()`
         self.mapper: Dict[int, bs4.BeautifulSoup] = {}
+        # Rows which could not be crawled, (row num, url). Their soup in the mapper is empty.
+        self.failed: Dict[int, str] = {}
 
         self.VERBOSE = True
         
         self.df = pd.read_csv(csv_path, names=['URL', 'Title', 'Notes']).iloc[:, :].reset_index()[["URL", "Title", "Notes"]]
 
-        if not os.path.isdir(data_path + "html/"):
-            os.mkdir(data_path + "html/")
-        if not os.path.isdir(data_path + "html/" + "courses/"):
-            os.mkdir(data_path + "html/" + "courses/")
-        if not os.path.isdir(data_path + "html/" + "policies/"):
-            os.mkdir(data_path + "html/" + "policies/")
-        if not os.path.isdir(data_path + "html/" + "faculty/"):
-            os.mkdir(data_path + "html/" + "faculty/")
-        if self.flag == 'courses':
-            self.soup = self.scrape_src(data_path + "html/" + "courses/")
-        elif self.flag == 'policies':
-            self.soup = self.scrape_src(data_path + "html/" + "policies/")
-        elif self.flag == 'faculty':
-            self.soup = self.scrape_src(data_path + "html/" + "faculty/")
+        # Pages are cached by url, so every flag (and the v2 pages) can share the same folder
+        self.cache = cache if cache is not None else CrawlCache(data_path + "html/")
+        self.parses = parses if parses is not None else SingleFlight()
+        self.journal = journal
+        self.strainer = ContainerStrainer(containers) if containers else None
+        if self.flag in ['courses', 'policies', 'faculty']:
+            self.soup = self.scrape_src()
         else:
             print("Wrong flag in scraper!")
 
-    def scrape_src(self, data_path_html=None) -> List[bs4.BeautifulSoup]:
-        """ Scrape every link from the csv file
+    def scrape_src(self) -> List[bs4.BeautifulSoup]:
+        """ Scrape every link from the csv file, reading the pages from the cache when they are there
         
         Returns:
             List[bs4.BeautifulSoup]: [description]
         """
         if self.VERBOSE:
             print("Crawling data from all links ...")
-        # print("len: " + str(len(os.listdir(data_path_html))))
 
-        soup = []
+        # Rows are crawled and parsed concurrently, but the result keeps the csv order
+        rows = []
         for i, line in self.df.iterrows():
             uri = line["URL"]
             if uri.endswith(".pdf"):
                 if self.VERBOSE:
                     print("Not crawling pdf file, continue...")
                 continue
-            
-            if (os.path.exists(data_path_html + str(i) + ".html")):
-                with open(data_path_html + str(i) + ".html", "rb") as f:
-                    src = f.read()
-            else:
-                if self.VERBOSE:
-                    print(f"Crawling Url: {uri}...")
-                src = requests.get(uri).text
-                with open(data_path_html + str(i) + ".html", "wb") as f:
-                    f.write(src.encode("utf8"))
-            soup_src = bs4.BeautifulSoup(src, 'html.parser')
+            rows.append((i, uri))
+
+        soups = self.engine.map(self.__load_soup, [uri for _, uri in rows])
+
+        soup = []
+        for (i, uri), soup_src in zip(rows, soups):
+            if soup_src is None:
+                self.failed[i] = uri
+                soup_src = parse_html("", PARSE_STAGE.scraper)
             soup.append(soup_src)
             self.mapper[i] = soup_src
         if self.VERBOSE:
+            if self.failed:
+                print(f"Failed crawling {len(self.failed)} urls: {list(self.failed.values())}")
+            print(f"Crawler stats: {self.client.controller.stats()}")
             print("Done! Data now loaded in self.soup array")
         return soup
 
+    def __load_soup(self, uri):
+        """ Read the source of one row from the html cache, or crawl it if it is not cached, and parse it.
+            Every row with the same url gets the same soup, which is only fetched and parsed once.
+
+        Args:
+            uri (str): The url of that row.
+
+        Returns:
+            bs4.BeautifulSoup: The soup of the page, or None if the page could not be crawled
+        """
+        try:
+            # A strained soup is only shared with the scrapers using the same strainer
+            key = normalize_url(uri) if self.strainer is None else f"{normalize_url(uri)} {self.strainer.key}"
+            return self.parses.do(key, lambda: self.__parse(*self.__load_src(uri), strainer=self.strainer))
+        except requests.exceptions.RequestException as e:
+            # One failed page should not throw away the rest of the crawl
+            if self.VERBOSE:
+                print(f"Failed crawling url: {uri} ({e})")
+            return None
+
+    @staticmethod
+    def __parse(src, charset, strainer: ContainerStrainer = None):
+        """ Parse the raw bytes of a page with its declared charset, so bs4 does not have to guess it
+        """
+        if strainer is not None:
+            return parse_html(src, PARSE_STAGE.scraper, from_encoding=charset, parse_only=strainer.strainer)
+        return parse_html(src, PARSE_STAGE.scraper, from_encoding=charset)
+
+    def __load_src(self, uri):
+        """ Read the source of one row from the html cache, or crawl it if it is not cached
+
+        Args:
+            uri (str): The url of that row.
+
+        Returns:
+            (bytes, str): The raw html source of the page and its charset
+        """
+        record = self.journal.get("fetch", normalize_url(uri)) if self.journal is not None else None
+        if record is not None and uri in self.cache:
+            # Fetched by the run being resumed, so it is not even revalidated
+            body = self.cache.get(uri)
+            return body, self.cache.get_meta(uri).get("charset") or sniff_charset(None, body)
+        if self.VERBOSE and uri not in self.cache:
+            print(f"Crawling Url: {uri}...")
+        src, charset = self.cache.fetch(uri, self.client)
+        # Error responses are not cached, so they stay outstanding
+        if self.journal is not None and uri in self.cache:
+            self.journal.record("fetch", normalize_url(uri), url=uri)
+        return src, charset
+
     def request_json_from_api(self, url: str):
         """[summary]
 
@@ -99,8 +167,7 @@ class Scraper:
         Returns:
             [type]: [description]
         """
-        res = requests.get(url)
-        data = res.json()
+        data = self.client.get_json(url)
         return data
 
     def set_verbose(self, v):
@@ -127,10 +194,15 @@ class CourseURLScraper:
         and extract links to csv file.
     """
     
-    def __init__(self):
+    def __init__(self, client: HttpClient = None, uri: str = None):
         """[summary]
+
+        Args:
+            client (HttpClient): The shared http client. A new one is created if not given.
+            uri (str): The programs-of-study index. Defaults to the one of www.gettysburg.edu.
         """
-        self.uri = "https://www.gettysburg.edu/academic-programs/curriculum/catalog/programs-of-study/"
+        self.client = client if client is not None else HttpClient()
+        self.uri = uri if uri is not None else "https://www.gettysburg.edu/academic-programs/curriculum/catalog/programs-of-study/"
         self.soup: bs4.BeautifulSoup = self.scrape()
         self.links: List[str] = self.extract_link(self.soup)
     
@@ -140,8 +212,8 @@ class CourseURLScraper:
         Returns:
             (bs4.BeautifulSoup): The soup for the source
         """
-        src = requests.get(self.uri).text
-        soup = bs4.BeautifulSoup(src, 'html.parser')
+        src = self.client.get(self.uri).text
+        soup = parse_html(src, PARSE_STAGE.links)
         return soup
 
     def extract_link(self, soup: bs4.BeautifulSoup) -> List[str]:
@@ -174,4 +246,222 @@ class CourseURLScraper:
         Returns:
             [type]: [description]
         """
-        return str(self.links)
\ No newline at end of file
+        return str(self.links)
+
+# Which manifest a discovered url belongs to, matched against the path (and query) of the url.
+# Every url of the courses manifest also goes to the policies manifest, like in the committed csv files.
+MANIFEST_RULES = {
+    'courses': [
+        r"^/academic-programs/(?!curriculum/)[\w-]+/$",
+        r"^/academic-programs/(?!curriculum/)[\w-]+/(programs|courses)(/[\w./-]*)?$",
+    ],
+    'policies': [
+        r"^/academic-programs/curriculum/catalog/?$",
+        r"^/academic-programs/curriculum/catalog/(degree-requirements|policies|programs-of-study)(/[\w-]*)?$",
+        r"^/academic-programs/curriculum/catalog/policies/policy-details\?id=[\w-]+$",
+        r"^/academic-programs/curriculum/catalog/faculty-registry(/[\w-]*)?$",
+    ],
+    'faculty': [
+        r"^/academic-programs/curriculum/catalog/faculty-registry/[\w-]+$",
+    ],
+}
+
+# Urls which are never followed nor listed, even if a manifest rule matches them
+EXCLUDE_RULES = [
+    r"\.(pdf|jpe?g|png|gif|svg|docx?|xlsx?|pptx?|zip)$",
+    r"/catalog/archive/",
+]
+
+# The csv file of every manifest, in the `data` folder
+MANIFEST_FILES = {
+    'courses': 'courseLinks.csv',
+    'policies': 'pages.csv',
+    'faculty': 'faculty.csv',
+}
+
+class DiscoveryCrawler(CourseURLScraper):
+    """ Breadth-first crawler which discovers every page of the catalog, starting from the
+        programs-of-study index and the catalog home, and regenerates the url manifests
+        (`courseLinks.csv`, `pages.csv` and `faculty.csv`) in one pass over the site.
+        Only the urls matching a manifest rule are followed, and every level of the frontier
+        is crawled concurrently.
+    """
+
+    def __init__(self, client: HttpClient = None, uri: str = None, cache: CrawlCache = None, max_depth=4, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """ Description
+
+        Args:
+            client (HttpClient): The shared http client. A new one is created if not given.
+            uri (str): The programs-of-study index. Defaults to the one of www.gettysburg.edu.
+            cache (CrawlCache): The shared page cache, so the scrapers reuse the discovered pages.
+                Pages are always downloaded if not given.
+            max_depth (int): How many links away from the seeds the crawl goes.
+            max_concurrency (int): Maximum number of pages crawled at the same time.
+        """
+        self.cache = cache
+        self.max_depth = max_depth
+        self.engine = FetchEngine(max_concurrency)
+        # Normalized url -> the url as it was first discovered
+        self.visited: Dict[str, str] = {}
+        # Urls which could not be crawled, with their error
+        self.failed: Dict[str, str] = {}
+        super().__init__(client=client, uri=uri)
+        self.manifests: Dict[str, List[str]] = self.crawl()
+
+    def extract_link(self, soup: bs4.BeautifulSoup, base: str = None) -> List[str]:
+        """ Every link of a page which belongs to a manifest, made absolute and without fragment
+
+        Args:
+            soup (bs4.BeautifulSoup): The soup of the page.
+            base (str): The url of the page. Defaults to the programs-of-study index.
+
+        Returns:
+            List[str]: The links, in page order and without duplicates.
+        """
+        base = base if base is not None else self.uri
+        links = []
+        for link_soup in soup.find_all('a', href=True):
+            link = urljoin(base, str(link_soup['href']).strip()).split('#')[0]
+            if self.manifest_of(link) and link not in links:
+                links.append(link)
+        return links
+
+    def manifest_of(self, url: str) -> List[str]:
+        """ Which manifests an url belongs to
+
+        Args:
+            url (str): An absolute url.
+
+        Returns:
+            List[str]: The flags of the manifests, empty if the url is out of the crawl.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ['http', 'https'] or parts.netloc.lower() != urlsplit(self.uri).netloc.lower():
+            return []
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        if any(re.search(rule, path) for rule in EXCLUDE_RULES):
+            return []
+        flags = [flag for flag, rules in MANIFEST_RULES.items() if any(re.search(rule, path) for rule in rules)]
+        if 'courses' in flags and 'policies' not in flags:
+            flags.append('policies')
+        return flags
+
+    def __load_links(self, url: str) -> List[str]:
+        try:
+            if self.cache is not None:
+                src, charset, status = self.cache.fetch_with_status(url, self.client)
+            else:
+                res = self.client.get(url)
+                # Without a declared charset, requests would decode text/html as ISO-8859-1
+                src, charset, status = res.content, sniff_charset(res.headers.get("Content-Type"), res.content), res.status_code
+        except requests.exceptions.RequestException as e:
+            self.failed[url] = str(e)
+            return []
+        # An error page is not scanned for links
+        if not 200 <= status < 300:
+            self.failed[url] = f"HTTP {status}"
+            return []
+        # Only the anchors are needed, so the rest of the page is not built into the tree
+        soup = parse_html(src, PARSE_STAGE.links, from_encoding=charset, parse_only=bs4.SoupStrainer('a'))
+        return self.extract_link(soup, base=url)
+
+    def crawl(self) -> Dict[str, List[str]]:
+        """ Crawl the site level by level from the programs-of-study index and the catalog home
+
+        Returns:
+            Dict[str, List[str]]: The sorted urls of every manifest.
+        """
+        # The index itself has already been crawled by `CourseURLScraper`
+        self.visited[normalize_url(self.uri)] = self.uri
+        frontier = []
+        for url in [urljoin(self.uri, "../")] + self.extract_link(self.soup):
+            if normalize_url(url) not in self.visited:
+                self.visited[normalize_url(url)] = url
+                frontier.append(url)
+
+        depth = 1
+        while frontier and depth <= self.max_depth:
+            next_frontier = []
+            for links in self.engine.map(self.__load_links, frontier):
+                for link in links:
+                    if normalize_url(link) not in self.visited:
+                        self.visited[normalize_url(link)] = link
+                        next_frontier.append(link)
+            frontier = next_frontier
+            depth += 1
+
+        manifests = {flag: [] for flag in MANIFEST_FILES}
+        for url in self.visited.values():
+            if url in self.failed:
+                continue
+            for flag in self.manifest_of(url):
+                manifests[flag].append(url)
+        return {flag: sorted(urls) for flag, urls in manifests.items()}
+
+    def diff(self, flag: str, csv_path: str) -> Tuple[List[str], List[str]]:
+        """ Compare a discovered manifest with a committed csv file, by normalized url
+
+        Args:
+            flag (str): The manifest, one of 'courses', 'policies' and 'faculty'.
+            csv_path (str): The committed csv file of that manifest.
+
+        Returns:
+            (List[str], List[str]): The urls discovered but not in the csv file, and the urls of
+                the csv file which were not discovered.
+        """
+        committed = pd.read_csv(csv_path, names=['URL', 'Title', 'Notes'])['URL'].tolist()
+        committed_keys = {normalize_url(url) for url in committed}
+        discovered_keys = {normalize_url(url) for url in self.manifests[flag]}
+        added = [url for url in self.manifests[flag] if normalize_url(url) not in committed_keys]
+        removed = [url for url in committed if normalize_url(url) not in discovered_keys]
+        return added, removed
+
+    def to_csv(self, path: str, flag: str = 'courses', committed_path: str = None):
+        """ Write a manifest in the format of the committed csv files. The urls still discovered
+            keep their line order of the committed csv file, so the file diffs cleanly, and the
+            new urls come after them.
+
+        Args:
+            path (str): The csv file to write.
+            flag (str): The manifest, one of 'courses', 'policies' and 'faculty'.
+            committed_path (str): The committed csv file of that manifest, whose order, titles and
+                notes are kept for the urls still discovered.
+        """
+        notes = {}
+        if committed_path is not None and os.path.exists(committed_path):
+            committed = pd.read_csv(committed_path, names=['URL', 'Title', 'Notes']).fillna('')
+            for _, line in committed.iterrows():
+                notes.setdefault(normalize_url(line['URL']), (line['Title'], line['Notes']))
+        # Dicts keep their insertion order, so this is the line of every committed url
+        order = {key: i for i, key in enumerate(notes)}
+        urls = sorted(self.manifests[flag], key=lambda url: order.get(normalize_url(url), len(order)))
+        rows = [[url, *notes.get(normalize_url(url), ('', ''))] for url in urls]
+        df = pd.DataFrame(rows, columns=['URL', 'Title', 'Notes'])
+        if flag == 'courses':
+            df = df[['URL']]
+        df.to_csv(path, header=False, index=False)
+
+    def write_manifests(self, out_path: str, data_path: str = './data/') -> Dict[str, Tuple[List[str], List[str]]]:
+        """ Write every manifest and diff it against the committed csv files
+
+        Args:
+            out_path (str): The folder to write the manifests to. Use `data_path` to replace the
+                committed csv files.
+            data_path (str): The folder of the committed csv files.
+
+        Returns:
+            Dict[str, (List[str], List[str])]: The added and removed urls of every manifest.
+        """
+        os.makedirs(out_path, exist_ok=True)
+        diffs = {}
+        for flag, file_name in MANIFEST_FILES.items():
+            committed_path = os.path.join(data_path, file_name)
+            if os.path.exists(committed_path):
+                diffs[flag] = self.diff(flag, committed_path)
+            else:
+                diffs[flag] = (list(self.manifests[flag]), [])
+            self.to_csv(os.path.join(out_path, file_name), flag, committed_path)
+        return diffs
+
+    def __str__(self):
+        return str({flag: len(urls) for flag, urls in self.manifests.items()})
@@ -0,0 +1,58 @@
+from catalog_engine.scraper import DiscoveryCrawler
+from catalog_engine_v2.cache import CrawlCache
+from catalog_engine_v2.client import HttpClient
+from catalog_engine_v2.test.conftest import html_page, server
+
+INDEX = "/academic-programs/curriculum/catalog/programs-of-study/"
+
+def serve_site(server):
+    server.routes[INDEX] = html_page("""
+        <a href="/academic-programs/biology/">Biology</a>
+        <a href="/academic-programs/chemistry/">Chemistry</a>
+        <a href="/academic-programs/curriculum/catalog/faculty-registry/jane-doe">Jane Doe</a>
+        <a href="https://www.example.com/academic-programs/other/">Elsewhere</a>
+    """)
+    server.routes["/academic-programs/curriculum/catalog/"] = html_page("<a href='policies/grading'>Grading</a>")
+    server.routes["/academic-programs/curriculum/catalog/policies/grading"] = html_page("<p>Grading</p>")
+    server.routes["/academic-programs/curriculum/catalog/faculty-registry/jane-doe"] = html_page("<p>Jane Doe</p>")
+    # No charset in the header, only in the page
+    server.routes["/academic-programs/biology/"] = 200, {"Content-Type": "text/html"}, \
+        '<meta charset="windows-1252"><a href="courses/écologie">Écologie</a>'.encode("windows-1252")
+    server.routes["/academic-programs/biology/courses/%C3%A9cologie"] = html_page("<p>Écologie</p>")
+    # The links of an error page are not followed
+    server.routes["/academic-programs/chemistry/"] = 404, {"Content-Type": "text/html"}, b'<a href="/academic-programs/physics/">Physics</a>'
+
+def test_discovery_follows_the_manifest_links(server, tmp_path):
+    serve_site(server)
+    with HttpClient() as client:
+        crawler = DiscoveryCrawler(client=client, uri=server.url(INDEX), cache=CrawlCache(str(tmp_path)))
+    assert crawler.manifests['courses'] == [
+        server.url("/academic-programs/biology/"),
+        server.url("/academic-programs/biology/courses/écologie"),
+    ]
+    assert crawler.manifests['faculty'] == [server.url("/academic-programs/curriculum/catalog/faculty-registry/jane-doe")]
+    assert server.url("/academic-programs/curriculum/catalog/policies/grading") in crawler.manifests['policies']
+    assert crawler.failed[server.url("/academic-programs/chemistry/")] == "HTTP 404"
+    assert server.hits("/academic-programs/physics/") == 0
+
+def test_discovery_without_a_cache_sniffs_the_charset(server):
+    serve_site(server)
+    with HttpClient() as client:
+        crawler = DiscoveryCrawler(client=client, uri=server.url(INDEX))
+    assert server.url("/academic-programs/biology/courses/écologie") in crawler.manifests['courses']
+    assert server.url("/academic-programs/chemistry/") in crawler.failed
+
+def test_written_manifests_keep_the_committed_order(server, tmp_path):
+    serve_site(server)
+    with HttpClient() as client:
+        crawler = DiscoveryCrawler(client=client, uri=server.url(INDEX))
+    grading = server.url("/academic-programs/curriculum/catalog/policies/grading")
+    biology = server.url("/academic-programs/biology/")
+    committed_path = str(tmp_path / "pages.csv")
+    with open(committed_path, "w", encoding="utf8") as f:
+        f.write(f"{grading},Grading,\n{server.url('/academic-programs/gone/')},Gone,\n{biology},Biology,kept\n")
+    crawler.to_csv(str(tmp_path / "out.csv"), 'policies', committed_path)
+    with open(tmp_path / "out.csv", encoding="utf8") as f:
+        lines = f.read().splitlines()
+    new = sorted(set(crawler.manifests['policies']) - {grading, biology})
+    assert lines == [f"{grading},Grading,", f"{biology},Biology,kept"] + [f"{url},," for url in new]
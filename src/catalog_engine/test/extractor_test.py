@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+import pandas as pd
+
+from catalog_engine.extractor import BLANK_CONTENT, CourseExtractor, FacultyExtractor, PolicyExtractor
+from catalog_engine_v2.const import PARSE_STAGE
+from catalog_engine_v2.parser import parse_html
+
+SITE = "https://www.gettysburg.edu/academic-programs/"
+
+def crawled(rows, failed):
+    """ The rows of a scraper, with the rows at the `failed` indices not crawled
+    """
+    df = pd.DataFrame([[url, title, ""] for url, title, _ in rows], columns=['URL', 'Title', 'Notes'])
+    mapper = {i: parse_html("" if i in failed else body, PARSE_STAGE.scraper) for i, (_, _, body) in enumerate(rows)}
+    return SimpleNamespace(df=df, mapper=mapper, failed={i: rows[i][0] for i in failed})
+
+def test_a_failed_faculty_page_keeps_its_place():
+    registry = SITE + "curriculum/catalog/faculty-registry/"
+    rows = [(registry + name, "", f'<div class="gb-c-longform"><p>{name}</p></div>') for name in ["current-faculty", "emeriti-faculty", "others-holding-faculty-rank"]]
+    data = FacultyExtractor(crawled(rows, failed=[1])).data
+    assert [page["Title"] for page in data] == ["current-faculty", "emeriti-faculty", "others-holding-faculty-rank"]
+    assert [page["Content"] for page in data] == [
+        '<div class="gb-c-longform"><p>current-faculty</p></div>',
+        BLANK_CONTENT,
+        '<div class="gb-c-longform"><p>others-holding-faculty-rank</p></div>',
+    ]
+
+def test_a_failed_policy_keeps_its_title():
+    details = SITE + "curriculum/catalog/policies/policy-details?id="
+    body = '<h1 class="gb-c-hero__title">Grading</h1><div class="gb-c-longform column"><p>Grading</p></div>'
+    rows = [(details + "1", "Grading", body), (details + "2", "Payment Plans", body)]
+    data = PolicyExtractor(crawled(rows, failed=[1])).data
+    assert [(policy["Title"], policy["Policy_Type"], policy["Content"]) for policy in data] == [
+        ("Grading", "Academic", '<div class="gb-c-longform column"><p>Grading</p></div>'),
+        ("Payment Plans", "Financial", BLANK_CONTENT),
+    ]
+
+def test_a_failed_subject_page_keeps_its_subject():
+    main = '<h1 class="gb-c-hero__title">{}</h1><div class="gb-u-spacing-bottom"><p class="gb-u-type-p">Major</p></div>'
+    rows = [
+        (SITE + "biology/", "", main.format("Biology")),
+        (SITE + "computer-science/", "", main.format("Computer Science")),
+        (SITE + "computer-science/courses/", "", ""),
+    ]
+    data = CourseExtractor(crawled(rows, failed=[1, 2])).data
+    assert list(data) == ["biology", "computer-science"]
+    assert data["biology"]["Subject"] == "Biology"
+    assert data["computer-science"] == {"Subject": "Computer Science", "Major": None, "Minor": None, "Brief": BLANK_CONTENT}
@@ -0,0 +1,174 @@
+""" @author: Alex Nguyen
+  @file: archive.py
+  This file contains the http archive which records every response of a run to one file and
+    replays them later, so the whole pipeline can run without any network.
+"""
+
+from typing import Dict
+import gzip
+import json
+import os
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .cache import normalize_url
+from .client import HttpClient
+
+class ArchiveMiss(requests.exceptions.RequestException):
+  """ Raised in replay mode when an url has not been recorded in the archive.
+  """
+  pass
+
+class HttpArchive:
+  """ Every recorded response (status, headers and body), keyed by the normalized url and stored
+    in one gzip compressed json file. Bodies are kept as latin-1 text, which maps every byte to
+    one character, so any body survives the round trip.
+  """
+
+  def __init__(self, path: str) -> None:
+    """ initializer
+
+    Args:
+      path (str): The path to the archive file. It is loaded if it exists.
+    """
+    self.path = path
+    self.lock = threading.Lock()
+    self.entries: Dict[str, Dict] = {}
+    if os.path.exists(self.path):
+      self.load()
+
+  def load(self) -> None:
+    with gzip.open(self.path, "rt", encoding="utf8") as f:
+      self.entries = json.load(f)["entries"]
+
+  def save(self) -> None:
+    with self.lock:
+      data = {"version": 1, "entries": self.entries}
+      with gzip.open(self.path, "wt", encoding="utf8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+  def __contains__(self, url: str) -> bool:
+    return normalize_url(url) in self.entries
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def record(self, url: str, res: requests.Response) -> None:
+    """ Store a response. A later response of the same url replaces the earlier one, except that
+      a 304 or the response of a HEAD request never replaces a full body.
+
+    Args:
+      url (str): The requested url.
+      res (requests.Response): The response of that request.
+    """
+    key = normalize_url(url)
+    with self.lock:
+      if res.status_code == 304 and key in self.entries:
+        return
+      if res.request is not None and res.request.method == "HEAD" and key in self.entries:
+        return
+      self.entries[key] = {
+        "status": res.status_code,
+        "headers": dict(res.headers),
+        "body": res.content.decode("latin-1"),
+      }
+
+  def replay(self, url: str) -> requests.Response:
+    """ Build the response of an url from the archive.
+
+    Args:
+      url (str): The requested url.
+
+    Raises:
+      ArchiveMiss: If the url has not been recorded.
+
+    Returns:
+      requests.Response: The recorded response.
+    """
+    try:
+      entry = self.entries.get(normalize_url(url))
+    except ValueError:
+      # An url which cannot be parsed can never have been recorded
+      entry = None
+    if entry is None:
+      raise ArchiveMiss(f"{url} is not in the archive {self.path}")
+    res = requests.Response()
+    res.url = url
+    res.status_code = entry["status"]
+    res.headers = CaseInsensitiveDict(entry["headers"])
+    res.encoding = get_encoding_from_headers(res.headers)
+    res._content = entry["body"].encode("latin-1")
+    # The body is all there, so `iter_content` of a streamed request reads it instead of `raw`
+    res._content_consumed = True
+    return res
+
+class RecordingClient(HttpClient):
+  """ An http client which also writes every response it gets into an archive.
+    Call `close()` (or use it in a `with` block) to save the archive file.
+  """
+
+  def __init__(self, archive: HttpArchive, **kwargs) -> None:
+    """ initializer
+
+    Args:
+      archive (HttpArchive): The archive to record to.
+      **kwargs: The arguments of `HttpClient`.
+    """
+    super().__init__(**kwargs)
+    self.archive = archive
+
+  def get(self, url: str, **kwargs) -> requests.Response:
+    res = super().get(url, **kwargs)
+    self.archive.record(url, res)
+    return res
+
+  def head(self, url: str, **kwargs) -> requests.Response:
+    # Recorded too, so that checking the links of a replayed run does not miss them
+    res = super().head(url, **kwargs)
+    self.archive.record(url, res)
+    return res
+
+  def close(self) -> None:
+    self.archive.save()
+    super().close()
+
+class ReplayClient(HttpClient):
+  """ An http client which serves every request from an archive and never touches the network.
+  """
+
+  def __init__(self, archive: HttpArchive, **kwargs) -> None:
+    """ initializer
+
+    Args:
+      archive (HttpArchive): The archive to replay from.
+      **kwargs: The arguments of `HttpClient`.
+    """
+    super().__init__(**kwargs)
+    self.archive = archive
+
+  def get(self, url: str, **kwargs) -> requests.Response:
+    return self.archive.replay(url)
+
+  def head(self, url: str, **kwargs) -> requests.Response:
+    # The recorded response of the url tells whether it resolves
+    return self.archive.replay(url)
+
+def open_client(record_path: str = None, replay_path: str = None, **kwargs) -> HttpClient:
+  """ Build the http client of a run.
+
+  Args:
+    record_path (str): If given, every response is recorded to this archive file.
+    replay_path (str): If given, every response is replayed from this archive file.
+    **kwargs: The arguments of `HttpClient`.
+
+  Returns:
+    HttpClient: A recording, replaying or plain client.
+  """
+  assert not (record_path and replay_path), "Cannot record and replay at the same time"
+  if record_path:
+    return RecordingClient(HttpArchive(record_path), **kwargs)
+  if replay_path:
+    return ReplayClient(HttpArchive(replay_path), **kwargs)
+  return HttpClient(**kwargs)
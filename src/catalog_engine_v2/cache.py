@@ -0,0 +1,380 @@
+""" @author: Alex Nguyen
+  @file: cache.py
+  This file contains the disk cache of crawled pages, keyed by the hash of the normalized url.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from .client import HttpClient
+from .deadline import Deadline
+from .const import DEFAULT_CHARSET
+from .singleflight import SingleFlight
+
+def normalize_url(url: str) -> str:
+  """ Normalize an url so that different spellings of the same page share one cache entry.
+    The scheme and host are lowercased, the default port and the fragment are dropped and the
+    query parameters are sorted. The path is kept as it is.
+
+  Args:
+    url (str): The url. E.g, "HTTPS://www.Gettysburg.edu:443/academic-programs/?b=2&a=1#top"
+
+  Returns:
+    str: The normalized url. E.g, "https://www.gettysburg.edu/academic-programs/?a=1&b=2"
+  """
+  parts = urlsplit(url.strip())
+  scheme = parts.scheme.lower()
+  netloc = parts.netloc.lower()
+  if (scheme == "https" and netloc.endswith(":443")) or (scheme == "http" and netloc.endswith(":80")):
+    netloc = netloc.rsplit(":", 1)[0]
+  path = parts.path or "/"
+  query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+  return urlunsplit((scheme, netloc, path, query, ""))
+
+def sniff_charset(content_type: str, body: bytes) -> str:
+  """ Find the declared charset of a page without decoding it: first the `Content-Type` header,
+    then a `<meta charset>` (or `http-equiv`) tag near the top of the body.
+
+  Args:
+    content_type (str): The `Content-Type` header, may be None.
+    body (bytes): The raw body of the page.
+
+  Returns:
+    str: The declared charset, or DEFAULT_CHARSET if the page declares none.
+  """
+  match = re.search(r"charset=[\"']?([\w-]+)", content_type or "", re.I)
+  if match is None:
+    match = re.search(rb"<meta[^>]+charset=[\"']?([\w-]+)", body[:4096], re.I)
+    if match is not None:
+      return match.group(1).decode("ascii").lower()
+    return DEFAULT_CHARSET
+  return match.group(1).lower()
+
+class CrawlCache:
+  """ Disk cache of crawled pages. Each entry is stored gzip compressed as `<root>/<key>.html.gz`
+    with a metadata sidecar `<root>/<key>.json` holding the url, fetch time, status, byte size and
+    the `ETag`/`Last-Modified` validators, where `key` is the sha1 of the normalized url. The v1
+    `Scraper` and the v2 `Page` share one cache, so a page is fetched once no matter how many
+    csv rows or template slots point to it. Bodies are stored as the raw bytes the server sent,
+    with their charset in the sidecar, so they go to the parser without being decoded first.
+
+    With a size budget, the least recently used entries are evicted once the compressed entries
+    take more than the budget. The last access time of an entry is the mtime of its body file.
+  """
+
+  def __init__(self, root: str, revalidate: bool = False, max_bytes: int = None, sitemap=None) -> None:
+    """ initializer
+
+    Args:
+      root (str): The folder of the cache. Created if it does not exist.
+      revalidate (bool): If True, a cached page is revalidated with a conditional request
+        (`If-None-Match`/`If-Modified-Since`) instead of being reused as it is. A 304 answer
+        reuses the stored body, so only the pages that changed are downloaded again.
+      max_bytes (int): Size budget of the stored (compressed) bodies. Unbounded if None.
+      sitemap (Sitemap): If given, a cached page listed in the sitemap is reused without any
+        request when its `lastmod` is older than the fetch, and downloaded again otherwise.
+        Pages missing from the sitemap follow `revalidate`.
+    """
+    self.root = root
+    self.revalidate = revalidate
+    self.max_bytes = max_bytes
+    self.sitemap = sitemap
+    os.makedirs(self.root, exist_ok=True)
+
+    # Concurrent fetches of the same url share one request. The results are not kept in
+    # memory, a repeated fetch is served from the disk.
+    self.flights = SingleFlight(memoize=False)
+
+    # Counters of the revalidation mode
+    self.lock = threading.Lock()
+    self.n_not_modified = 0
+    self.n_modified = 0
+    self.n_evictions = 0
+    self.n_unchanged = 0 # Reused without any request because of the sitemap
+
+    # key -> [last access time, stored bytes, raw bytes] of every entry on the disk
+    self.index: Dict[str, List] = self.__scan()
+
+  @staticmethod
+  def key(url: str) -> str:
+    return hashlib.sha1(normalize_url(url).encode("utf8")).hexdigest()
+
+  def __body_path(self, url: str) -> str:
+    return os.path.join(self.root, self.key(url) + ".html.gz")
+
+  def __legacy_body_path(self, url: str) -> str:
+    # Entries cached before the bodies were compressed
+    return os.path.join(self.root, self.key(url) + ".html")
+
+  def __meta_path(self, url: str) -> str:
+    return os.path.join(self.root, self.key(url) + ".json")
+
+  def __contains__(self, url: str) -> bool:
+    return os.path.exists(self.__meta_path(url)) and \
+      (os.path.exists(self.__body_path(url)) or os.path.exists(self.__legacy_body_path(url)))
+
+  def __scan(self) -> Dict[str, List]:
+    index = {}
+    for name in os.listdir(self.root):
+      if not name.endswith(".json"):
+        continue
+      key = name[:-len(".json")]
+      for body_name, compressed in [(key + ".html.gz", True), (key + ".html", False)]:
+        body_path = os.path.join(self.root, body_name)
+        if os.path.exists(body_path):
+          with open(os.path.join(self.root, name), "r") as f:
+            raw_size = json.load(f)["size"]
+          index[key] = [os.path.getmtime(body_path), os.path.getsize(body_path), raw_size]
+          break
+    return index
+
+  def get(self, url: str) -> Optional[bytes]:
+    """ Read the cached body of an url, and mark it as recently used.
+
+    Returns:
+      bytes: The body, or None if the url is not cached.
+    """
+    if url not in self:
+      return None
+    try:
+      path = self.__body_path(url)
+      if os.path.exists(path):
+        with open(path, "rb") as f:
+          body = gzip.decompress(f.read())
+      else:
+        path = self.__legacy_body_path(url)
+        with open(path, "rb") as f:
+          body = f.read()
+      now = time.time()
+      os.utime(path, (now, now))
+    except FileNotFoundError:
+      # Evicted meanwhile, which is a miss
+      return None
+    with self.lock:
+      if self.key(url) in self.index:
+        self.index[self.key(url)][0] = now
+    return body
+
+  def get_meta(self, url: str) -> Optional[Dict]:
+    """ Read the metadata sidecar of an url.
+
+    Returns:
+      Dict: The metadata, or None if the url is not cached.
+    """
+    if url not in self:
+      return None
+    try:
+      with open(self.__meta_path(url), "r") as f:
+        return json.load(f)
+    except FileNotFoundError:
+      # Evicted meanwhile, which is a miss
+      return None
+
+  def urls(self) -> List[str]:
+    """ Returns:
+      List[str]: The url of every cached entry.
+    """
+    with self.lock:
+      keys = list(self.index)
+    urls = []
+    for key in keys:
+      try:
+        with open(os.path.join(self.root, key + ".json"), "r") as f:
+          urls.append(json.load(f)["url"])
+      except FileNotFoundError:
+        # Evicted meanwhile
+        pass
+    return urls
+
+  def put(self, url: str, body: bytes, status: int = 200, headers: Dict[str, str] = None) -> Dict:
+    """ Store the body of an url, together with its metadata.
+
+    Args:
+      url (str): The url of the page.
+      body (bytes): The body of the page.
+      status (int): The http status of the response.
+      headers (Dict[str, str]): The response headers, where the validators are taken from.
+
+    Returns:
+      Dict: The stored metadata.
+    """
+    headers = headers if headers is not None else {}
+    meta = {
+      "url": normalize_url(url),
+      "fetched_at": time.time(),
+      "status": status,
+      "size": len(body),
+      "charset": sniff_charset(headers.get("Content-Type"), body),
+      "stored_size": None,
+      "etag": headers.get("ETag"),
+      "last_modified": headers.get("Last-Modified"),
+    }
+    compressed = gzip.compress(body)
+    meta["stored_size"] = len(compressed)
+    # The body is written before the sidecar, so an entry only counts as cached once both exist.
+    self.__write_atomic(self.__body_path(url), compressed)
+    self.__write_atomic(self.__meta_path(url), json.dumps(meta).encode("utf8"))
+    if os.path.exists(self.__legacy_body_path(url)):
+      os.remove(self.__legacy_body_path(url))
+    with self.lock:
+      self.index[self.key(url)] = [time.time(), len(compressed), len(body)]
+    self.__evict(keep=self.key(url))
+    return meta
+
+  def __evict(self, keep: str) -> None:
+    """ Remove the least recently used entries until the cache fits in its budget.
+
+    Args:
+      keep (str): The key of the entry just stored, which is never evicted.
+    """
+    if self.max_bytes is None:
+      return
+    with self.lock:
+      total = sum(entry[1] for entry in self.index.values())
+      if total <= self.max_bytes:
+        return
+      for key in sorted(self.index, key=lambda k: self.index[k][0]):
+        if total <= self.max_bytes:
+          break
+        if key == keep:
+          continue
+        for name in [key + ".json", key + ".html.gz", key + ".html"]:
+          if os.path.exists(os.path.join(self.root, name)):
+            os.remove(os.path.join(self.root, name))
+        total -= self.index.pop(key)[1]
+        self.n_evictions += 1
+
+  def stats(self) -> Dict:
+    """ Returns:
+      Dict: The number of entries, their raw and compressed (stored) bytes, the budget, the
+        number of evicted entries, the revalidation counters and the number of pages the
+        sitemap said were unchanged.
+    """
+    with self.lock:
+      return {
+        "entries": len(self.index),
+        "raw_bytes": sum(entry[2] for entry in self.index.values()),
+        "stored_bytes": sum(entry[1] for entry in self.index.values()),
+        "max_bytes": self.max_bytes,
+        "evictions": self.n_evictions,
+        "not_modified": self.n_not_modified,
+        "modified": self.n_modified,
+        "unchanged_skipped": self.n_unchanged,
+      }
+
+  def fetch(self, url: str, client: HttpClient, deadline: Deadline = None) -> Tuple[bytes, str]:
+    """ Return the cached body of an url, or crawl it with the client and cache it.
+      In revalidation mode, a cached page is only reused after the server answers 304.
+      With a sitemap, a cached page it lists is reused without any request if its `lastmod` is
+      older than the fetch. Error responses are returned but not cached.
+
+    Args:
+      url (str): The url of the page.
+      client (HttpClient): The http client used on a cache miss.
+      deadline (Deadline): The deadline of the request, if one is sent.
+
+    Returns:
+      (bytes, str): The raw body of the page and its charset, to be handed to the parser as
+        `BeautifulSoup(body, from_encoding=charset)`.
+    """
+    body, charset, _ = self.fetch_with_status(url, client, deadline)
+    return body, charset
+
+  def fetch_with_status(self, url: str, client: HttpClient, deadline: Deadline = None) -> Tuple[bytes, str, int]:
+    """ Same as `fetch()`, with the http status of the body, so that an error page is told apart.
+
+    Returns:
+      (bytes, str, int): The raw body of the page, its charset and its status.
+    """
+    return self.flights.do(self.key(url), lambda: self.__fetch(url, client, deadline))
+
+  def __fetch(self, url: str, client: HttpClient, deadline: Deadline = None) -> Tuple[bytes, str, int]:
+    meta = self.get_meta(url)
+    body = self.get(url) if meta is not None else None
+    if body is not None:
+      # Entries cached before the charset was stored hold utf8 re-encoded text
+      charset = meta.get("charset") or sniff_charset(None, body)
+      changed = self.sitemap.changed_since(url, meta["fetched_at"]) if self.sitemap is not None else None
+      if changed is False:
+        with self.lock:
+          self.n_unchanged += 1
+        return body, charset, meta["status"]
+      if changed is None and not self.revalidate:
+        return body, charset, meta["status"]
+
+    # Without any validator, the conditional request is a full request, so the page is downloaded again
+    request_headers = self.validator_headers(meta) if body is not None else {}
+
+    res = client.get(url, headers=request_headers, deadline=deadline)
+    if body is not None and res.status_code == 304:
+      if self.touch(url, res.headers) is None:
+        # Evicted meanwhile, so the body read before is stored again
+        self.put(url, body, meta["status"], {
+          "Content-Type": f"text/html; charset={charset}",
+          "ETag": res.headers.get("ETag", meta.get("etag")),
+          "Last-Modified": res.headers.get("Last-Modified", meta.get("last_modified")),
+        })
+      with self.lock:
+        self.n_not_modified += 1
+      return body, charset, meta["status"]
+
+    new_body = res.content
+    if res.ok:
+      new_meta = self.put(url, new_body, res.status_code, res.headers)
+      if body is not None:
+        with self.lock:
+          self.n_modified += 1
+      return new_body, new_meta["charset"], res.status_code
+    return new_body, sniff_charset(res.headers.get("Content-Type"), new_body), res.status_code
+
+  def touch(self, url: str, headers: Dict[str, str] = None) -> Dict:
+    """ Mark a cached page as fresh after a 304, keeping its body.
+
+    Args:
+      url (str): The url of the page.
+      headers (Dict[str, str]): The 304 response headers, which may carry new validators.
+
+    Returns:
+      Dict: The updated metadata, None if the page is not cached any more.
+    """
+    headers = headers if headers is not None else {}
+    meta = self.get_meta(url)
+    if meta is None:
+      return None
+    meta["fetched_at"] = time.time()
+    meta["etag"] = headers.get("ETag", meta.get("etag"))
+    meta["last_modified"] = headers.get("Last-Modified", meta.get("last_modified"))
+    self.__write_atomic(self.__meta_path(url), json.dumps(meta).encode("utf8"))
+    return meta
+
+  @staticmethod
+  def validator_headers(meta: Dict) -> Dict[str, str]:
+    """ Build the conditional request headers from the stored validators.
+
+    Args:
+      meta (Dict): The metadata of a cached page.
+
+    Returns:
+      Dict[str, str]: The `If-None-Match`/`If-Modified-Since` headers, empty if there is no validator.
+    """
+    headers = {}
+    if meta.get("etag"):
+      headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+      headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+  @staticmethod
+  def __write_atomic(path: str, data: bytes) -> None:
+    # Several fetch threads may write the same entry at the same time
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+      f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,157 @@
+""" @author: Alex Nguyen
+  @file: client.py
+  This file contains the http client shared by every component that talks to the website.
+"""
+
+from typing import Dict, Iterator, Tuple, Union
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from .const import DEFAULT_MAX_CONCURRENCY, DEFAULT_POOL_CONNECTIONS, DEFAULT_TIMEOUT
+from .controller import AdaptiveController
+from .deadline import Deadline, DeadlineExceeded
+
+# Size of the chunks of a body downloaded under a deadline
+DEADLINE_CHUNK_SIZE = 64 * 1024
+
+def iter_body(res: requests.Response, chunk_size: int, deadline: Deadline = None) -> Iterator[bytes]:
+  """ Iterate over the body of a streamed response, checking the deadline between chunks.
+    With urllib3 2, a chunk is whatever has arrived (up to `chunk_size`), so a server dripping
+    bytes cannot hold a read until `chunk_size` bytes are there.
+
+  Args:
+    res (requests.Response): A response requested with `stream=True`.
+    chunk_size (int): The largest chunk.
+    deadline (Deadline): Raises `DeadlineExceeded` between two chunks once it has passed, or when
+      a read fails after it has passed.
+
+  Raises:
+    requests.exceptions.RequestException: If a read fails, e.g, a `ReadTimeout` or a `ConnectionError`.
+
+  Returns:
+    Iterator[bytes]: The decoded chunks of the body.
+  """
+  if deadline is not None and res.raw is not None and hasattr(res.raw, "read1") and not res._content_consumed:
+    while True:
+      deadline.check()
+      try:
+        chunk = res.raw.read1(chunk_size, decode_content=True)
+      except urllib3.exceptions.HTTPError as e:
+        # The raw stream raises urllib3 errors, which `iter_content` would have wrapped
+        if deadline.expired:
+          raise DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded") from e
+        if isinstance(e, urllib3.exceptions.ReadTimeoutError):
+          raise requests.exceptions.ReadTimeout(e) from e
+        raise requests.exceptions.ConnectionError(e) from e
+      if not chunk:
+        return
+      yield chunk
+  for chunk in res.iter_content(chunk_size):
+    if deadline is not None:
+      deadline.check()
+    yield chunk
+
+class HttpClient:
+  """ A keep-alive http client backed by one pooled `requests.Session`.
+    Create one client per run and pass it to every `Scraper`, `Page` and api helper, so that
+    all the requests to www.gettysburg.edu reuse the same few TCP+TLS connections.
+  """
+
+  def __init__(
+      self,
+      pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+      pool_maxsize: int = DEFAULT_MAX_CONCURRENCY,
+      timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+      headers: Dict[str, str] = None,
+      controller: AdaptiveController = None
+    ) -> None:
+    """ initializer
+
+    Args:
+      pool_connections (int): Number of hosts to keep a connection pool for.
+      pool_maxsize (int): Maximum number of open connections per host. Extra requests to the
+        same host wait for a free connection instead of opening a new one.
+      timeout (float or (float, float)): Default (connect, read) timeout in seconds.
+      headers (Dict[str, str]): Headers sent with every request.
+      controller (AdaptiveController): Adapts the number of requests in flight per host and
+        retries failed requests. Defaults to a controller capped at `pool_maxsize`.
+    """
+    self.timeout = timeout
+    self.controller = controller if controller is not None else AdaptiveController(max_limit=pool_maxsize)
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+    self.session.mount("http://", adapter)
+    self.session.mount("https://", adapter)
+    if headers:
+      self.session.headers.update(headers)
+
+  def get(self, url: str, deadline: Deadline = None, **kwargs) -> requests.Response:
+    """ Send a GET request through the pooled session.
+
+    Args:
+      url (str): The url to request.
+      deadline (Deadline): If given, the whole request, retries and body download included, is
+        abandoned with `DeadlineExceeded` when the deadline passes.
+      **kwargs: Any other keyword arguments of `requests.Session.get`.
+
+    Returns:
+      requests.Response: The response.
+    """
+    kwargs.setdefault("timeout", self.timeout)
+    if deadline is None:
+      return self.controller.request(url, lambda: self.session.get(url, **kwargs))
+    return self.controller.request(url, lambda: self.__get_within(url, deadline, **kwargs), deadline=deadline)
+
+  def __get_within(self, url: str, deadline: Deadline, stream: bool = False, **kwargs) -> requests.Response:
+    # The read timeout only bounds each socket read, so a server dripping bytes could hold a
+    # plain request forever. The body is read chunk by chunk, checking the deadline in between.
+    deadline.check()
+    kwargs["timeout"] = deadline.cap(kwargs["timeout"])
+    res = self.session.get(url, stream=True, **kwargs)
+    if stream:
+      return res
+    chunks = []
+    try:
+      for chunk in iter_body(res, DEADLINE_CHUNK_SIZE, deadline):
+        chunks.append(chunk)
+      deadline.check()
+    except BaseException:
+      res.close()
+      raise
+    res._content = b"".join(chunks)
+    res._content_consumed = True
+    return res
+
+  def head(self, url: str, **kwargs) -> requests.Response:
+    """ Send a HEAD request through the pooled session.
+
+    Args:
+      url (str): The url to request.
+      **kwargs: Any other keyword arguments of `requests.Session.head`.
+
+    Returns:
+      requests.Response: The response.
+    """
+    kwargs.setdefault("timeout", self.timeout)
+    return self.controller.request(url, lambda: self.session.head(url, **kwargs))
+
+  def get_json(self, url: str, **kwargs):
+    """ Send a GET request and decode the json body.
+
+    Args:
+      url (str): The url of the api.
+
+    Returns:
+      The decoded json data.
+    """
+    return self.get(url, **kwargs).json()
+
+  def close(self) -> None:
+    self.session.close()
+
+  def __enter__(self) -> "HttpClient":
+    return self
+
+  def __exit__(self, *args) -> None:
+    self.close()
@@ -85,4 +85,56 @@ class COURSE_CRAWLING_MODE:
 
 FUNNELBACK_COURSE_API = "https://www.gettysburg.edu/api/funnelback/courses/"
 
-DEFAULT_SAVED_PICKLE_PAGE_DATA_FILE_NAME = "id_to_page.pickle"
\ No newline at end of file
+GETTYSBURG_SITEMAP = "https://www.gettysburg.edu/sitemap.xml"
+
+DEFAULT_SAVED_PICKLE_PAGE_DATA_FILE_NAME = "id_to_page.pickle"
+
+# Folder of the data path keeping the compiled slot plans of the templates
+DEFAULT_TEMPLATE_PLAN_FOLDER_NAME = "template_plans"
+
+# Number of pages requested at the same time by the fetch engine
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Number of hosts the http client keeps a connection pool for
+DEFAULT_POOL_CONNECTIONS = 4
+
+# Default (connect, read) timeout in seconds of every request
+DEFAULT_TIMEOUT = (5, 30)
+
+# Charset of a page which declares none, neither in its headers nor in a meta tag
+DEFAULT_CHARSET = "utf-8"
+
+# A snapshot of the courses api younger than this (in seconds) is used without downloading the api
+DEFAULT_SNAPSHOT_MAX_AGE = 24 * 3600
+
+# Number of snapshot versions of the courses api kept on the disk
+DEFAULT_SNAPSHOT_KEEP = 5
+
+# Seconds a worker owns a leased job before another worker may reclaim it
+DEFAULT_LEASE_SECONDS = 120
+
+# Times a job is tried before it is given up
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds a page may take to crawl, retries included, before it is left blank
+DEFAULT_PAGE_DEADLINE = 120
+
+# Crawled pages which may wait for their section to be written in the pipelined generation
+DEFAULT_PIPELINE_BUFFER = 32
+
+# Seconds the result of a link check is reused without checking the link again
+DEFAULT_LINK_TTL = 24 * 3600
+
+# Number of links checked at the same time by the link validator
+DEFAULT_LINK_CONCURRENCY = 32
+
+# Parsing stages, each of which may get its own html parser backend
+class PARSE_STAGE:
+  page = "page" # The crawled pages of the template slots
+  scraper = "scraper" # The pages of the v1 scrapers
+  links = "links" # The pages only searched for links
+  template = "template" # The catalog template
+  course = "course" # The course blocks built from the courses api
+
+# The parser backend of every stage not given one
+DEFAULT_PARSER = "html.parser"
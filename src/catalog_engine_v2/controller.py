@@ -0,0 +1,221 @@
+""" @author: Alex Nguyen
+  @file: controller.py
+  This file contains the adaptive concurrency and retry controller of the http client.
+"""
+
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+import requests
+
+from .const import DEFAULT_MAX_CONCURRENCY
+from .deadline import Deadline, DeadlineExceeded
+
+# Statuses which mean the server is overloaded or briefly broken, so the request is worth retrying
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+class HostState:
+  """ The concurrency window of one host.
+  """
+
+  def __init__(self, limit: float) -> None:
+    self.limit = limit
+    self.in_flight = 0
+    self.condition = threading.Condition()
+
+class AdaptiveController:
+  """ AIMD (additive increase, multiplicative decrease) controller of the number of requests in
+    flight per host. Every healthy response raises the window of its host a little, and every
+    error (429, 5xx, connection error) or slow response cuts it by a factor. Failed requests are
+    retried with jittered exponential backoff.
+  """
+
+  def __init__(
+      self,
+      initial_limit: float = 2,
+      min_limit: float = 1,
+      max_limit: float = DEFAULT_MAX_CONCURRENCY,
+      latency_target: float = 2.0,
+      decrease_factor: float = 0.5,
+      max_retries: int = 3,
+      backoff_base: float = 0.5,
+      backoff_max: float = 30.0
+    ) -> None:
+    """ initializer
+
+    Args:
+      initial_limit (float): The starting window of every host.
+      min_limit (float): The window never goes below this.
+      max_limit (float): The window never goes above this. Should match the connection pool size.
+      latency_target (float): A response slower than this (in seconds) counts as congestion.
+      decrease_factor (float): The window is multiplied by this on congestion.
+      max_retries (int): How many times a failed request is retried.
+      backoff_base (float): The first backoff in seconds, doubled on every retry.
+      backoff_max (float): The longest backoff in seconds.
+    """
+    self.initial_limit = initial_limit
+    self.min_limit = min_limit
+    self.max_limit = max_limit
+    self.latency_target = latency_target
+    self.decrease_factor = decrease_factor
+    self.max_retries = max_retries
+    self.backoff_base = backoff_base
+    self.backoff_max = backoff_max
+
+    self.lock = threading.Lock()
+    self.hosts: Dict[str, HostState] = {}
+
+    # Time accounting, in seconds summed over every request
+    self.n_requests = 0
+    self.n_retries = 0
+    self.n_failures = 0
+    self.wait_time = 0.0 # Waiting for a free slot in the window of the host
+    self.backoff_time = 0.0 # Sleeping before a retry
+    self.transfer_time = 0.0 # Actually talking to the server
+
+  def __host(self, url: str) -> HostState:
+    try:
+      host = urlsplit(url).netloc.lower()
+    except ValueError as e:
+      # The same error requests raises for an url it cannot parse
+      raise requests.exceptions.InvalidURL(f"Invalid URL {url!r}: {e}") from e
+    with self.lock:
+      if host not in self.hosts:
+        self.hosts[host] = HostState(self.initial_limit)
+      return self.hosts[host]
+
+  def __acquire(self, state: HostState, deadline: Deadline = None) -> None:
+    # A full window is waited for at most until the deadline
+    with state.condition:
+      while state.in_flight >= max(1, int(state.limit)):
+        timeout = deadline.remaining() if deadline is not None else None
+        if timeout == 0:
+          deadline.check()
+        state.condition.wait(timeout)
+      state.in_flight += 1
+
+  def __release(self, state: HostState, healthy: Optional[bool]) -> None:
+    with state.condition:
+      state.in_flight -= 1
+      if healthy is None:
+        pass # Says nothing about the host, the window is left as it is
+      elif healthy:
+        # Additive increase: about one more slot per full window of healthy responses
+        state.limit = min(self.max_limit, state.limit + 1 / state.limit)
+      else:
+        state.limit = max(self.min_limit, state.limit * self.decrease_factor)
+      state.condition.notify_all()
+
+  def backoff(self, attempt: int, res: requests.Response = None) -> float:
+    """ The time to sleep before retrying, using the `Retry-After` header when the server sends one.
+
+    Args:
+      attempt (int): The number of the failed attempt, starting from 0.
+      res (requests.Response): The failed response, if any.
+
+    Returns:
+      float: Seconds to sleep.
+    """
+    if res is not None and res.headers.get("Retry-After", "").strip().isdigit():
+      return min(self.backoff_max, float(res.headers["Retry-After"]))
+    # "Full jitter": a random sleep up to the exponential bound spreads the retries of many threads
+    return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+  def request(self, url: str, send: Callable[[], requests.Response], deadline: Deadline = None) -> requests.Response:
+    """ Send a request inside the window of its host, retrying it when it fails.
+
+    Args:
+      url (str): The requested url, whose host decides the window.
+      send (Callable): The function sending the request.
+      deadline (Deadline): No attempt starts, and no backoff sleeps, past this deadline.
+
+    Raises:
+      requests.exceptions.RequestException: The last connection error or timeout, when every
+        attempt raised one, or any other request error, which is not retried.
+      DeadlineExceeded: If the deadline passed before any attempt succeeded, waiting for a free
+        slot in the window included.
+
+    Returns:
+      requests.Response: The first successful response, or the last failed one.
+    """
+    state = self.__host(url)
+    for attempt in range(self.max_retries + 1):
+      if deadline is not None:
+        deadline.check()
+      start = time.monotonic()
+      self.__acquire(state, deadline)
+      acquired = time.monotonic()
+      res, error, ok = None, None, False
+      # Whatever `send()` raises, the slot goes back to the window. None says nothing about the host.
+      healthy: Optional[bool] = None
+      try:
+        res = send()
+        ok = res.status_code not in RETRY_STATUSES
+        healthy = ok and time.monotonic() - acquired <= self.latency_target
+      except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        # A timeout cut short by the deadline means the page ran out of its own time budget, which
+        # is no sign of congestion, and retrying it is pointless
+        if isinstance(e, DeadlineExceeded) or (isinstance(e, requests.exceptions.Timeout) and deadline is not None and deadline.expired):
+          with self.lock:
+            self.n_requests += 1
+            self.n_failures += 1
+          if isinstance(e, DeadlineExceeded):
+            raise
+          raise DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded") from e
+        error = e
+        healthy = False
+      except requests.exceptions.RequestException:
+        # Too many redirects, an invalid url, a broken body: retrying gives the same answer
+        healthy = False
+        with self.lock:
+          self.n_requests += 1
+          self.n_failures += 1
+        raise
+      finally:
+        self.__release(state, healthy)
+      done = time.monotonic()
+
+      with self.lock:
+        self.n_requests += 1
+        self.wait_time += acquired - start
+        self.transfer_time += done - acquired
+
+      if ok:
+        return res
+      if attempt == self.max_retries:
+        break
+      sleep = self.backoff(attempt, res)
+      if deadline is not None and deadline.remaining() is not None and sleep >= deadline.remaining():
+        # Retrying after the deadline is pointless
+        break
+      if res is not None:
+        # A discarded response must give its connection back to the pool, or a streamed one holds it forever
+        res.close()
+      with self.lock:
+        self.n_retries += 1
+        self.backoff_time += sleep
+      time.sleep(sleep)
+
+    with self.lock:
+      self.n_failures += 1
+    if error is not None:
+      raise error
+    return res
+
+  def stats(self) -> Dict:
+    """ Returns:
+      Dict: The request counts, the time spent waiting (window + backoff) versus transferring,
+        and the current window of every host.
+    """
+    with self.lock:
+      return {
+        "requests": self.n_requests,
+        "retries": self.n_retries,
+        "failures": self.n_failures,
+        "wait_seconds": round(self.wait_time + self.backoff_time, 3),
+        "backoff_seconds": round(self.backoff_time, 3),
+        "transfer_seconds": round(self.transfer_time, 3),
+        "limits": {host: round(state.limit, 2) for host, state in self.hosts.items()},
+      }
@@ -0,0 +1,83 @@
+""" @author: Alex Nguyen
+  @file: deadline.py
+  This file contains the deadline of a page or a run, which bounds the total time of every
+    request made for it, retries and body download included.
+"""
+
+from typing import Optional, Tuple, Union
+import time
+import requests
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+  """ Raised when a request is not finished before its deadline. It is a `Timeout`, so everything
+    which already survives a failed request survives it too.
+  """
+  pass
+
+class Deadline:
+  """ A point in time after which the work it was given for is abandoned.
+  """
+
+  def __init__(self, seconds: Optional[float] = None) -> None:
+    """ initializer
+
+    Args:
+      seconds (float): The budget from now. None means no deadline.
+    """
+    self.seconds = seconds
+    self.at = time.monotonic() + seconds if seconds is not None else None
+
+  def remaining(self) -> Optional[float]:
+    """ Returns:
+      float: Seconds left, never negative. None if there is no deadline.
+    """
+    if self.at is None:
+      return None
+    return max(0.0, self.at - time.monotonic())
+
+  @property
+  def expired(self) -> bool:
+    return self.at is not None and time.monotonic() >= self.at
+
+  def check(self) -> None:
+    """ Raises:
+      DeadlineExceeded: If the deadline has passed.
+    """
+    if self.expired:
+      raise DeadlineExceeded(f"Deadline of {self.seconds}s exceeded")
+
+  def within(self, seconds: Optional[float]) -> "Deadline":
+    """ The earlier of this deadline and a budget from now, e.g, a page budget inside a run budget.
+
+    Args:
+      seconds (float): The budget from now. None means no other limit.
+
+    Returns:
+      Deadline: The new deadline.
+    """
+    remaining = self.remaining()
+    if remaining is None or (seconds is not None and seconds < remaining):
+      return Deadline(seconds)
+    deadline = Deadline(remaining)
+    deadline.seconds = self.seconds
+    return deadline
+
+  def cap(self, timeout: Union[None, float, Tuple[float, float]]) -> Union[float, Tuple[float, float]]:
+    """ Shorten a requests timeout so that no single wait goes past the deadline.
+
+    Args:
+      timeout (float or (float, float)): The (connect, read) timeout.
+
+    Returns:
+      float or (float, float): The capped timeout.
+    """
+    remaining = self.remaining()
+    if remaining is None:
+      return timeout
+    # requests rejects a zero timeout
+    remaining = max(remaining, 0.001)
+    if timeout is None:
+      return remaining
+    if isinstance(timeout, tuple):
+      return tuple(min(t, remaining) if t is not None else remaining for t in timeout)
+    return min(timeout, remaining)
@@ -17,21 +17,47 @@ import requests
 import json
 import collections
 
+from .client import HttpClient
+from .const import FUNNELBACK_COURSE_API, PARSE_STAGE
+from .parser import parse_fragment
+from .snapshot import CourseDelta, CourseSnapshotStore
+
 class CourseExplorer:
     """ Class for handling 'https://www.gettysburg.edu/api/funnelback/courses/' api specifically.
     """
+
+    # The attributes of a course which are used, the only ones kept when the api is streamed
+    attrs = ["catalogNumber", "subjectAreaAbbrv", "id", \
+    "deparmentName", "title", "officialCourseDesc", "academicDepartmentId","url"]
     
-    def __init__(self, data: Dict):
+    def __init__(self, data: Dict, delta: CourseDelta = None):
         """ Description
 
         Args:
             data (Dict): [description]
+            delta (CourseDelta): The courses added, removed and changed since the previous
+                snapshot of the api, if the data comes from a `CourseSnapshotStore`.
         """
         self.data = data['data']
-        self.attrs = ["catalogNumber", "subjectAreaAbbrv", "id", \
-        "deparmentName", "title", "officialCourseDesc", "academicDepartmentId","url"]
+        self.delta = delta
         self.subjects_dict: Dict = self.__populate_subject_dict()
 
+    @classmethod
+    def from_snapshot(cls, store: CourseSnapshotStore, client: HttpClient = None, url: str = FUNNELBACK_COURSE_API, force: bool = False) -> "CourseExplorer":
+        """ Build the explorer from the latest snapshot of the api, syncing it first if it is stale
+
+        Args:
+            store (CourseSnapshotStore): The snapshots of the api.
+            client (HttpClient): The http client used to sync.
+            url (str): The url of the courses api.
+            force (bool): Sync even if the latest snapshot is fresh.
+
+        Returns:
+            CourseExplorer: The explorer, with the delta of the snapshot.
+        """
+        data, delta = store.load(client=client, url=url, force=force, attrs=cls.attrs)
+        return cls(data, delta=delta)
+
     def __populate_subject_dict(self):
         result: collections.Counter = collections.Counter()
         for course in self.data:
@@ -94,7 +120,7 @@ class CoursePage:
 
         # https://stackoverflow.com/a/21356230
         # `li` has the form <div><li></li></div>? I guess so?
-        li = bs4.BeautifulSoup("<li></li>", "html.parser")
+        li = parse_fragment("<li></li>", PARSE_STAGE.course)
 
         # The acutal li tag inside the div of `li`
         original_li = li.li
@@ -131,7 +157,7 @@ class CoursePage:
         # Read this reference: https://www.geeksforgeeks.org/how-to-insert-a-new-tag-into-a-beautifulsoup-object/
         
         # `div` have the form <div><div></div></div>
-        div = bs4.BeautifulSoup("<div></div>", "html.parser")
+        div = parse_fragment("<div></div>", PARSE_STAGE.course)
 
         # the actual div tag inside the div of `div`
         original_div = div.div
@@ -172,7 +198,7 @@ class CoursePage_v2:
 
         # https://stackoverflow.com/a/21356230
         # `li` has the form <div><li></li></div>? I guess so?
-        li = bs4.BeautifulSoup("<li></li>", "html.parser")
+        li = parse_fragment("<li></li>", PARSE_STAGE.course)
 
         # The acutal li tag inside the div of `li`
         original_li = li.li
@@ -209,7 +235,7 @@ class CoursePage_v2:
         # Read this reference: https://www.geeksforgeeks.org/how-to-insert-a-new-tag-into-a-beautifulsoup-object/
         
         # `div` have the form <div><div></div></div>
-        div = bs4.BeautifulSoup("<div></div>", "html.parser")
+        div = parse_fragment("<div></div>", PARSE_STAGE.course)
 
         # the actual div tag inside the div of `div`
         original_div = div.div
@@ -0,0 +1,46 @@
+""" @author: Alex Nguyen
+  @file: fetcher.py
+  This file contains the fetch engine which runs many page requests at the same time.
+"""
+
+from typing import Callable, List, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+
+from .const import DEFAULT_MAX_CONCURRENCY
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+class FetchEngine:
+  """ Run a fetch function over a list of jobs with a bounded number of worker threads.
+    Results always come back in the same order as the jobs, so the caller can zip them
+    with the csv rows (or template slots) they came from.
+  """
+
+  def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> None:
+    """ initializer
+
+    Args:
+      max_concurrency (int): Maximum number of requests in flight at the same time.
+        1 means the jobs run one by one in the calling thread.
+    """
+    assert max_concurrency >= 1, "max_concurrency must be at least 1"
+    self.max_concurrency = max_concurrency
+
+  def map(self, fn: Callable[[T], R], jobs: List[T]) -> List[R]:
+    """ Apply `fn` to every job concurrently.
+
+    Args:
+      fn (Callable): The function that does the fetching of one job.
+      jobs (List): The list of jobs, i.e, urls or (row index, url) pairs.
+
+    Returns:
+      List: The results of `fn`, ordered the same as `jobs`.
+    """
+    jobs = list(jobs)
+    if self.max_concurrency == 1 or len(jobs) <= 1:
+      return [fn(job) for job in jobs]
+    n_workers = min(self.max_concurrency, len(jobs))
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+      # `executor.map` yields in submission order, not completion order.
+      return list(executor.map(fn, jobs))
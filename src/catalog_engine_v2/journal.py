@@ -0,0 +1,115 @@
+""" @author: Alex Nguyen
+  @file: journal.py
+  This file contains the append-only crawl journal, which lets an interrupted run resume with
+    only the work it had not finished.
+"""
+
+from typing import Dict, Optional
+import json
+import os
+import threading
+import time
+
+class CrawlJournal:
+  """ An append-only json lines file with one record per completed unit of work (a fetched csv
+    row, an extracted template page). Each record has a `kind` and a `key`, and a later record of
+    the same kind and key replaces the earlier one. Every record is flushed to the disk before
+    `record()` returns, so a crash loses at most the record being written, which is skipped when
+    the journal is read back.
+  """
+
+  def __init__(self, path: str, resume: bool = False) -> None:
+    """ initializer
+
+    Args:
+      path (str): The path to the journal file.
+      resume (bool): If True, the records of the previous run are read and kept, and new records
+        are appended. Otherwise the journal starts empty.
+    """
+    self.path = path
+    self.resume = resume
+    self.lock = threading.Lock()
+    self.records: Dict[str, Dict[str, Dict]] = {}
+    self.n_replayed = 0 # Records of the previous run which have been used again
+    if os.path.dirname(self.path):
+      os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    if resume and os.path.exists(self.path):
+      self.__load()
+    self.file = open(self.path, "a" if resume else "w", encoding="utf8")
+    if resume and self.__ends_mid_line():
+      # Close the cut line, so the next record is not glued to it
+      self.file.write("\n")
+
+  def __ends_mid_line(self) -> bool:
+    if os.path.getsize(self.path) == 0:
+      return False
+    with open(self.path, "rb") as f:
+      f.seek(-1, os.SEEK_END)
+      return f.read(1) != b"\n"
+
+  def __load(self) -> None:
+    with open(self.path, "r", encoding="utf8") as f:
+      for line in f:
+        try:
+          record = json.loads(line)
+        except json.JSONDecodeError:
+          # The line being written when the previous run died
+          continue
+        self.records.setdefault(record["kind"], {})[record["key"]] = record
+
+  def get(self, kind: str, key: str) -> Optional[Dict]:
+    """ The completed record of a unit of work, if any.
+
+    Args:
+      kind (str): The kind of work, e.g, "page".
+      key (str): The key of the unit in its kind, e.g, the html id of the page.
+
+    Returns:
+      Dict: The record, None if the work is outstanding.
+    """
+    with self.lock:
+      record = self.records.get(kind, {}).get(key)
+      if record is not None:
+        self.n_replayed += 1
+      return record
+
+  def record(self, kind: str, key: str, **data) -> Dict:
+    """ Append a completed unit of work.
+
+    Args:
+      kind (str): The kind of work.
+      key (str): The key of the unit in its kind.
+      **data: Whatever is needed to restore the unit without doing the work again.
+
+    Returns:
+      Dict: The record.
+    """
+    record = {"kind": kind, "key": key, "at": time.time(), **data}
+    line = json.dumps(record, ensure_ascii=False)
+    with self.lock:
+      self.records.setdefault(kind, {})[key] = record
+      self.file.write(line + "\n")
+      self.file.flush()
+      os.fsync(self.file.fileno())
+    return record
+
+  def __len__(self) -> int:
+    return sum(len(records) for records in self.records.values())
+
+  def stats(self) -> Dict[str, int]:
+    """ Returns:
+      Dict[str, int]: The number of records of every kind, and how many were replayed.
+    """
+    with self.lock:
+      counts = {kind: len(records) for kind, records in self.records.items()}
+      counts["replayed"] = self.n_replayed
+      return counts
+
+  def close(self) -> None:
+    self.file.close()
+
+  def __enter__(self) -> "CrawlJournal":
+    return self
+
+  def __exit__(self, *args) -> None:
+    self.close()
@@ -0,0 +1,231 @@
+""" @author: Alex Nguyen
+  @file: links.py
+  This file contains the link validator, which checks that every outbound link of a generated
+    catalog still resolves. Run it as `python -m catalog_engine_v2.links CATALOG [CATALOG ...]`
+    from the `src` folder.
+"""
+
+from typing import Dict, Iterable, List
+from urllib.parse import urldefrag, urlsplit
+import argparse
+import json
+import os
+import threading
+import time
+import requests
+
+from .client import HttpClient
+from .const import DEFAULT_LINK_CONCURRENCY, DEFAULT_LINK_TTL, PARSE_STAGE
+from .controller import AdaptiveController
+from .fetcher import FetchEngine
+from .parser import parse_html
+from .singleflight import SingleFlight
+
+def extract_links(src) -> List[str]:
+  """ Every unique http(s) link of an html document, in document order. The fragment is dropped,
+    since `page#a` and `page#b` resolve to the same page.
+
+  Args:
+    src (str or bytes): The html document.
+
+  Returns:
+    List[str]: The absolute urls.
+  """
+  links: Dict[str, None] = {}
+  for a in parse_html(src, PARSE_STAGE.links).find_all("a", href=True):
+    url = a["href"].strip()
+    try:
+      url = urldefrag(url)[0]
+      scheme = urlsplit(url).scheme
+    except ValueError:
+      # An url which cannot be parsed, e.g, `http://[::1/`, is kept so that it is reported broken
+      scheme = url.split(":", 1)[0].lower()
+    if scheme in ("http", "https"):
+      links[url] = None
+  return list(links)
+
+class LinkValidator:
+  """ Check links concurrently, with a HEAD request first and a GET request when the HEAD request
+    fails, since some servers answer HEAD wrongly. The requests go through the shared http client,
+    so they reuse its connections and stay inside the window of their host. The results are kept
+    in a json file and reused until they are older than the ttl.
+  """
+
+  def __init__(self, client: HttpClient, cache_path: str = None, ttl: float = DEFAULT_LINK_TTL, max_concurrency: int = DEFAULT_LINK_CONCURRENCY) -> None:
+    """ initializer
+
+    Args:
+      client (HttpClient): The http client.
+      cache_path (str): The json file of the results. The results are not kept if not given.
+      ttl (float): Seconds a result is reused without checking the link again.
+      max_concurrency (int): Number of links checked at the same time, over every host.
+    """
+    self.client = client
+    self.cache_path = cache_path
+    self.ttl = ttl
+    self.engine = FetchEngine(max_concurrency)
+    self.flights = SingleFlight()
+    self.lock = threading.Lock()
+    self.results: Dict[str, Dict] = {}
+    if self.cache_path is not None and os.path.exists(self.cache_path):
+      with open(self.cache_path, "r", encoding="utf8") as f:
+        self.results = json.load(f)
+
+    # Counters
+    self.n_checked = 0 # Requested
+    self.n_cached = 0 # Reused from the cache
+    self.n_fallbacks = 0 # Checked again with GET after a failed HEAD
+
+  def is_fresh(self, result: Dict) -> bool:
+    return result is not None and time.time() - result["checked_at"] < self.ttl
+
+  def check(self, url: str) -> Dict:
+    """ Check one link, or reuse its fresh result.
+
+    Args:
+      url (str): The link.
+
+    Returns:
+      Dict: The url, the last status (None if no response came back), whether the link is ok, the
+        method of the last request, the error if any and the time of the check.
+    """
+    with self.lock:
+      result = self.results.get(url)
+      if self.is_fresh(result):
+        self.n_cached += 1
+        return result
+    return self.flights.do(url, lambda: self.__check(url))
+
+  def __check(self, url: str) -> Dict:
+    try:
+      res = self.client.head(url, allow_redirects=True)
+      res.close()
+      if res.status_code < 400:
+        return self.__keep(url, res.status_code, "HEAD")
+    except requests.exceptions.RequestException:
+      pass
+
+    with self.lock:
+      self.n_fallbacks += 1
+    try:
+      # Only the status is needed, so the body is never downloaded, and the connection goes back to the pool
+      with self.client.get(url, stream=True) as res:
+        return self.__keep(url, res.status_code, "GET")
+    except requests.exceptions.RequestException as e:
+      return self.__keep(url, None, "GET", repr(e))
+
+  def __keep(self, url: str, status: int, method: str, error: str = None) -> Dict:
+    result = {
+      "url": url,
+      "status": status,
+      "ok": status is not None and status < 400,
+      "method": method,
+      "error": error,
+      "checked_at": time.time(),
+    }
+    with self.lock:
+      self.n_checked += 1
+      # A network error may be transient, so it is never reused
+      if error is None:
+        self.results[url] = result
+    return result
+
+  def validate(self, urls: Iterable[str]) -> Dict[str, Dict]:
+    """ Check every link concurrently.
+
+    Args:
+      urls (Iterable[str]): The links.
+
+    Returns:
+      Dict[str, Dict]: Map from every link to its result, in the order of the links.
+    """
+    urls = list(dict.fromkeys(urls))
+    return dict(zip(urls, self.engine.map(self.check, urls)))
+
+  def save(self) -> None:
+    if self.cache_path is None:
+      return
+    with self.lock:
+      data = json.dumps(self.results, ensure_ascii=False)
+    tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf8") as f:
+      f.write(data)
+    os.replace(tmp_path, self.cache_path)
+
+  def stats(self) -> Dict[str, int]:
+    """ Returns:
+      Dict[str, int]: The numbers of links checked, reused from the cache and checked again with GET.
+    """
+    with self.lock:
+      return {"checked": self.n_checked, "cached": self.n_cached, "fallbacks": self.n_fallbacks}
+
+def broken_links(results: Dict[str, Dict]) -> Dict[str, Dict]:
+  """ The results of the links which do not resolve.
+
+  Args:
+    results (Dict[str, Dict]): The results of `LinkValidator.validate()`.
+
+  Returns:
+    Dict[str, Dict]: Map from every broken link to its result.
+  """
+  return {url: result for url, result in results.items() if not result["ok"]}
+
+def print_broken_report(results: Dict[str, Dict]) -> None:
+  broken = broken_links(results)
+  print(f"{len(broken)} of {len(results)} links are broken")
+  for url, result in broken.items():
+    print(f"  {result['status'] if result['status'] is not None else result['error'].split('(')[0]}: {url}")
+
+def validate_catalogs(paths: List[str], client: HttpClient, cache_path: str = None, ttl: float = DEFAULT_LINK_TTL, max_concurrency: int = DEFAULT_LINK_CONCURRENCY) -> Dict[str, Dict]:
+  """ Check every unique link of some generated catalogs.
+
+  Args:
+    paths (List[str]): The html files of the catalogs.
+    client (HttpClient): The http client.
+    cache_path (str): The json file of the results.
+    ttl (float): Seconds a result is reused without checking the link again.
+    max_concurrency (int): Number of links checked at the same time.
+
+  Returns:
+    Dict[str, Dict]: Map from every link to its result.
+  """
+  urls: List[str] = []
+  for path in paths:
+    with open(path, "rb") as f:
+      urls += extract_links(f.read())
+  validator = LinkValidator(client, cache_path=cache_path, ttl=ttl, max_concurrency=max_concurrency)
+  results = validator.validate(urls)
+  validator.save()
+  print(f"Links: {validator.stats()}")
+  return results
+
+def link_client(max_concurrency: int = DEFAULT_LINK_CONCURRENCY) -> HttpClient:
+  """ An http client fit for checking links: connection pools for many hosts, as many connections
+    per host as checking threads, short timeouts and one retry, so a dead host does not hold the
+    check for long.
+  """
+  return HttpClient(
+    pool_connections=max_concurrency,
+    pool_maxsize=max_concurrency,
+    timeout=(5, 10),
+    controller=AdaptiveController(max_limit=max_concurrency, max_retries=1, backoff_max=5)
+  )
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Check every outbound link of generated catalogs.")
+  parser.add_argument("catalogs", nargs="+", help="The html files of the catalogs.")
+  parser.add_argument("--cache", help="The json file keeping the results between runs.")
+  parser.add_argument("--ttl", metavar="HOURS", type=float, default=DEFAULT_LINK_TTL / 3600, help="Reuse the results younger than this.")
+  parser.add_argument("--max-concurrency", metavar="N", type=int, default=DEFAULT_LINK_CONCURRENCY, help="Number of links checked at the same time.")
+  parser.add_argument("--report", help="Write the broken links to this json file.")
+  args = parser.parse_args(argv)
+
+  with link_client(args.max_concurrency) as client:
+    results = validate_catalogs(args.catalogs, client, cache_path=args.cache, ttl=args.ttl * 3600, max_concurrency=args.max_concurrency)
+  print_broken_report(results)
+  if args.report:
+    with open(args.report, "w", encoding="utf8") as f:
+      json.dump(broken_links(results), f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+  main()
@@ -4,34 +4,127 @@
 """
 
 from typing import List, Dict
-import requests
+import copy
+import threading
+import time
 import bs4
+import requests
 
+from .cache import CrawlCache, normalize_url, sniff_charset
+from .client import HttpClient
+from .deadline import Deadline, DeadlineExceeded
+from .parser import parse_fragment, parse_html
+from .singleflight import SingleFlight
+from .strainer import ContainerStrainer, locator_strainer
+from .streaming import stream_until_locator
+from .transform import ContentTransformer
 from .setting import BlockSetting, PageLocator
-from .const import PAGE_TAG, PAGE_TAG_TO_DEFAULT_LOCATOR_NAME, HTML_TAG_NAME
+from .const import PAGE_TAG, PAGE_TAG_TO_DEFAULT_LOCATOR_NAME, PARSE_STAGE
+
 
+def resolve_locator(page_tag: PAGE_TAG, html_id: str, locators_data: Dict, logging: List[str] = None) -> PageLocator:
+  """ The locator of the content of a page: the special locator of its html id if there is one,
+    the default locator of its tag otherwise.
+
+  Args:
+    page_tag (PAGE_TAG): The tag of the page.
+    html_id (str): The html id of the page on the template.
+    locators_data (Dict): The locators json.
+    logging (List[str]): Where to log which case it is.
+
+  Returns:
+    PageLocator: The locator.
+  """
+  logging = logging if logging is not None else []
+  # If it is a special case
+  if html_id in locators_data["data"].keys():
+    logging.append("Special locator case")
+    page_locator_data = locators_data["data"][html_id]
+  # Else, it is a default cases
+  else:
+    assert page_tag in PAGE_TAG_TO_DEFAULT_LOCATOR_NAME.keys(), "Wrong behavior"
+    logging.append("Default locator case")
+    # For example, `DEFAULT_CONFIG_COURSE_MAIN` in locators.json
+    page_locator_data = locators_data["data"][PAGE_TAG_TO_DEFAULT_LOCATOR_NAME[page_tag]]
+  return PageLocator(
+    html_tag=page_locator_data["data"]["html_tag"],
+    css_class=page_locator_data["data"]["css_class"],
+    exclude_list=page_locator_data["exclude"] if "exclude" in page_locator_data else None
+  )
 
 class Page:
-  """ This is the page class
-  
+  """ This is the page class. The page is crawled, parsed and extracted in the initializer, unless
+    it is `lazy`, in which case that work waits for `load()`, or for the first call needing the
+    content (`generate()`, `get_subject_abbrs()`, `to_record()`).
   """
   
-  def __init__(self, page_tag: PAGE_TAG, html_id, header_level, url, locators_data) -> None:
+  def __init__(self, page_tag: PAGE_TAG, html_id, header_level, url, locators_data, client: HttpClient = None, cache: CrawlCache = None, parses: SingleFlight = None, stream: bool = False, deadline: Deadline = None, lazy: bool = False, strain: bool = False) -> None:
     # For debuggin purpose
     self.logging: List[str] = []
+    self.VERBOSE = False
     
     # Main variables
     self.html_id = html_id # the unique id of that page, which is also on the template
     self.page_tag = page_tag
     self.header_level: str = header_level
     self.url = url
+    self.client = client if client is not None else HttpClient()
+    self.cache = cache # Optional, the page is always crawled when there is no cache
+    self.parses = parses # Optional, shares the soup with the other pages of the same url
+    self.stream = stream # Stop downloading once the located element is closed
+    self.deadline = deadline # Optional, the crawl is abandoned when it passes
+    self.blank_reason: str = None # Why the content is "[CONTENT BLANK]", None if it is not
+    self.bytes_read: int = 0
+    self.bytes_saved: int = 0 # None when the server does not tell the size of the page
+    self.extract_seconds: float = 0.0 # Time spent extracting the content out of the parsed page
     self.soup: bs4.BeautifulSoup = None
-    self.crawl_success = self.__crawl()
+    self.subject_abbrs: List[str] = None # Only set on a page restored from a journal record
+    # The locator is needed before crawling, to know when a streamed download can stop
     self.locators_data = locators_data
     self.locator: PageLocator = self.__get_locator()
+    # Only the located element is built when the page is parsed, unless the locator needs more
+    self.strainer: ContainerStrainer = locator_strainer(self.locator) if strain else None
+    self.crawl_success: bool = None
     
     # Content to be shown out
-    self.content = self.__extract()
+    self.content = None
+    self.loaded = False
+    self.load_lock = threading.Lock()
+    if not lazy:
+      self.load()
+
+  def load(self, deadline: Deadline = None) -> "Page":
+    """ Crawl, parse and extract the page, once. Safe to call from several threads.
+
+    Args:
+      deadline (Deadline): Replaces the deadline given to the initializer, e.g, to start the
+        budget of a lazy page when its crawl actually starts.
+
+    Returns:
+      Page: This page.
+    """
+    with self.load_lock:
+      if not self.loaded:
+        if deadline is not None:
+          self.deadline = deadline
+        self.crawl_success = self.__crawl()
+        start = time.perf_counter()
+        self.content = self.__extract()
+        self.extract_seconds = time.perf_counter() - start
+        self.loaded = True
+    return self
+
+  def set_blank(self, reason: str) -> None:
+    """ Give up the page without crawling it, leaving the "[CONTENT BLANK]" placeholder.
+
+    Args:
+      reason (str): Why the page is blank.
+    """
+    with self.load_lock:
+      self.crawl_success = False
+      self.blank_reason = reason
+      self.content = "[CONTENT BLANK]"
+      self.loaded = True
 
   def __crawl(self) -> bool:
     """ Crawl and return whether it has been crawled
@@ -42,158 +135,81 @@ class Page:
     if self.url.endswith(".pdf"):
       if self.VERBOSE:
         print("Not crawling pdf file, continue...")
+      self.blank_reason = "pdf file, not crawled"
+      return False
+    try:
+      if self.parses is not None:
+        self.soup = self.parses.do(self.__parse_key(), self.__fetch_soup)
+      else:
+        self.soup = self.__fetch_soup()
+    except requests.exceptions.RequestException as e:
+      # The client already retried, so this page is left blank instead of aborting the catalog
+      self.logging.append(f"Failed crawling: {e}")
+      self.blank_reason = f"missed its deadline ({e})" if isinstance(e, DeadlineExceeded) else f"failed crawling ({e})"
+      if self.VERBOSE:
+        print(f"Failed crawling url: {self.url} ({e})")
       return False
-    src = requests.get(self.url).text
-    self.soup = bs4.BeautifulSoup(src, 'html.parser')
     return True
 
+  def __parse_key(self) -> str:
+    # A streamed soup may stop right after the located element, so it is only shared with pages
+    # using the same locator
+    if self.stream:
+      return f"{normalize_url(self.url)} {self.locator.html_tag}.{'.'.join(self.locator.css_class)}"
+    # A strained soup only has the located element, so it is only shared with the same strainer
+    if self.strainer is not None:
+      return f"{normalize_url(self.url)} {self.strainer.key}"
+    return normalize_url(self.url)
+
+  def __fetch_soup(self) -> bs4.BeautifulSoup:
+    if self.stream and (self.cache is None or self.url not in self.cache):
+      return self.__stream_soup()
+    # The raw bytes go straight to the parser with their declared charset, nothing is decoded before
+    if self.cache is not None:
+      src, charset = self.cache.fetch(self.url, self.client, deadline=self.deadline)
+    else:
+      res = self.client.get(self.url, deadline=self.deadline)
+      src, charset = res.content, sniff_charset(res.headers.get("Content-Type"), res.content)
+    return parse_html(src, PARSE_STAGE.page, from_encoding=charset, **self.__parse_only())
+
+  def __stream_soup(self) -> bs4.BeautifulSoup:
+    result = stream_until_locator(self.client, self.url, self.locator, deadline=self.deadline)
+    self.bytes_read = result.bytes_read
+    self.bytes_saved = result.bytes_saved
+    self.logging.append(f"Streamed {result.bytes_read} bytes, saved {result.bytes_saved} bytes")
+    if not result.complete:
+      return parse_html(result.src, PARSE_STAGE.page, **self.__parse_only())
+    # The locator never matched, so the whole page has been read and can be cached as usual
+    if self.cache is not None and 200 <= result.status < 300:
+      self.cache.put(self.url, result.src, result.status, result.headers)
+    return parse_html(result.src, PARSE_STAGE.page, from_encoding=result.charset, **self.__parse_only())
+
+  def __parse_only(self) -> Dict:
+    return {"parse_only": self.strainer.strainer} if self.strainer is not None else {}
+
   def __get_locator(self) -> PageLocator:
     # This method figures out the actual tag of the page and the coresponding css class of the page using defaults and human-defined parameters.
     
     # For example, we try to do the page with id `africana-studies-program-description`
     # return PageLocator("div", "gb-c-longform gb-u-spacing-triple gb-u-spacing-double-bottom")
-    
-    # If it is a special case
-    if self.html_id in self.locators_data["data"].keys():
-      self.logging.append("Special locator case")
-      default_locator_name = self.html_id
-      page_locator_data = self.locators_data["data"][default_locator_name]
-      return PageLocator(
-        html_tag=page_locator_data["data"]["html_tag"],
-        css_class=page_locator_data["data"]["css_class"],
-        exclude_list=page_locator_data["exclude"] if "exclude" in page_locator_data else None
-      )
-    # Else, it is a default cases
-    else:
-      assert self.page_tag in PAGE_TAG_TO_DEFAULT_LOCATOR_NAME.keys(), "Wrong behavior"
-      self.logging.append("Default locator case")
-      # For example, `DEFAULT_CONFIG_COURSE_MAIN` in locators.json
-      default_locator_name = PAGE_TAG_TO_DEFAULT_LOCATOR_NAME[self.page_tag]
-      page_locator_data = self.locators_data["data"][default_locator_name]
-      return PageLocator(
-        html_tag=page_locator_data["data"]["html_tag"],
-        css_class=page_locator_data["data"]["css_class"],
-        exclude_list=page_locator_data["exclude"] if "exclude" in page_locator_data else None
-      )
+    return resolve_locator(self.page_tag, self.html_id, self.locators_data, self.logging)
 
   def __extract(self):
+    if not self.crawl_success:
+      return "[CONTENT BLANK]"
     page_content = self.soup.find(self.locator.html_tag, {'class': self.locator.css_class})
 
     if page_content == None:
+      self.blank_reason = "locator matched nothing"
       return "[CONTENT BLANK]"
+    # The soup may be shared with other pages of the same url, so only a copy of the subtree is modified
+    page_content = copy.copy(page_content)
     self.logging.append(f"Root page attrs: {str(page_content.attrs)}")
     # page_content.attrs = {}
 
-    # Debug
-    # if self.html_id == "music-sunderman-conservatory-program-description":
-    #   print(self.locator.exclude_list)
-
-    # First, exclude every excluding tag specified in the locator!
-    for i, excluding_tag in enumerate(self.locator.exclude_list):
-      if "from" in excluding_tag:
-        # TODO: Fix this bug
-        # print(self.__str__())
-        # tag = page_content.find(excluding_tag["from"]["html_tag"])
-        
-        # if "css_class" in excluding_tag["from"] and len(excluding_tag["from"]["css_class"].split()) != 0:
-        #   tag = page_content.find(excluding_tag["from"]["html_tag"], {"class": excluding_tag["from"]["css_class"].split()})
-        # print(f"This is tag: ___ {tag}")
-        # if "inclusive" in excluding_tag["from"] and excluding_tag["from"]["inclusive"]:
-        #   tag.extract()
-        # for t in tag.find_next_siblings():
-        #   print(f"[taggaga] _____ {t}")
-        #   t.extract()
-        pass
-      elif "to" in excluding_tag:
-        # TODO: Fix this bug
-        # NOTE: Untested code
-        # print(self.__str__())
-        # tag = page_content.find_all(recursive=False)[0]
-        # stop = True
-        # for t in tag.find_next_siblings():
-        #   if t.name == excluding_tag["to"]["html_tag"]:
-        #     for css_attr in t.attrs["class"]:
-        #       if css_attr not in excluding_tag["to"]["css_class"].split():
-        #         stop = False
-        #         break
-        #   else:
-        #     stop = False
-          
-        #   t.exclude()
-        #   if stop:
-        #     break
-        pass
-        
-      # Else, it is just normal tag excluding
-      else:
-        assert "html_tag" in excluding_tag and "css_class" in excluding_tag, "Wrong behavior excluding locators."
-        tags = page_content.find_all(excluding_tag["html_tag"], {"class": excluding_tag["css_class"].split(" ")})
-        for tag in tags:
-          tag.extract()
-    
-    # Second 
-    # TODO: Work on this
-    # Array data to keep track of the current heading level of the page
-
-    # Maximum heading level of the original page, always be the first heading_n
-    # (h) 1 < 2 < 3 < 4 < 5 < 6
-    max_heading_level = 0
-
-    for tag in page_content.find_all(): # We want to process recursively here.
-      
-      # tag name is one of the h_n with n from 1 to 6 inclusive
-      # Use for the second elif
-      list_h_n = list(str(tag.name).lower())
-
-      # First, process accordingly to different tag names.
-      if tag.name == HTML_TAG_NAME.img or \
-          tag.name == HTML_TAG_NAME.hr or \
-          tag.name == HTML_TAG_NAME.button or \
-          tag.name == HTML_TAG_NAME.rect or \
-          tag.name == HTML_TAG_NAME.svg:
-          # or tag.name == HTML_TAG_NAME.br:
-        self.logging.append(f"Removed img or hr tag.")
-        tag.extract()
-      # tag name is one of the h_n with n from 1 to 6 inclusive
-      elif list_h_n[0] == "h":
-        original_heading_level = int(list_h_n[1])
-        assert original_heading_level <= 6 and original_heading_level >= 1, "Wrong behavior heading level"
-        # Process something to put to result content
-        if max_heading_level == 0:
-          max_heading_level = original_heading_level
-        
-        # When we have max heading level, we will have original_heading_level - max_heading_level as the
-        # difference of level between max level, and plus 1 to get the difference + 1
-        # We now can plus those differneces to the current desired page heading level
-        desired_page_heading_level_list_h_n = list(str(self.header_level).lower())
-        desired_page_heading_level = int(desired_page_heading_level_list_h_n[1]) + original_heading_level - max_heading_level + 1
-        
-        # Set new tag name
-        tag.name = "h" + str(desired_page_heading_level)
-        # pass
-      # elif tag.name == HTML_TAG_NAME.h1:
-      #   pass
-      elif tag.name == HTML_TAG_NAME.p and tag.text.strip() == "" and len(tag.find_all()) == 0: # Extract the blank 'p' tag
-        tag.extract()
-      else:
-        pass
-
-      # Lastly, rmeove all attributes except for urls:
-      if tag.name != HTML_TAG_NAME.a:
-        self.logging.append(f"Remove attributes")
-        tag.attrs = {}
-      else:
-        self.logging.append(f"Leave tag link: {tag.href}")
-        if "href" in tag.attrs:
-          # TODO: We also need to add the host name gettysburg.edu to every urls that does not contains them
-          this_url = tag.attrs["href"]
-          if this_url[0] == "/":
-            this_url = "https://www.gettysburg.edu" + this_url
-
-          # Exclude all other attributes except for href
-          tag.attrs = {"href": this_url} 
-          
-    self.logging.append(f"{page_content}")
+    # Every cleanup rule, the excludes of the locator included, runs in one walk of the content
+    counts = ContentTransformer(self.header_level, self.locator.exclude_list).transform(page_content)
+    self.logging.append(f"Transformed: {counts}")
     return page_content
   
   def get_subject_abbrs(self) -> List[str]:
@@ -202,7 +218,12 @@ class Page:
     Returns:
         List[str]: List of the subject abbreviations. E.g: ["ARTS", "ARTH"]
     """
+    if self.subject_abbrs is not None:
+      return list(self.subject_abbrs)
+    self.load()
     result_abbrs: List[str] = []
+    if not self.crawl_success:
+      return result_abbrs
     # print(f"[COURSE EXPLORER] soup: {self.soup}")
     accordion_groups = self.soup.find_all("ul", {"class": "gb-c-accordion__group"})
     # print(f"[COURSE EXPLORER] Accordion group: {accordion_groups}")
@@ -216,8 +237,93 @@ class Page:
       result_abbrs.append(abbr)
     return result_abbrs
 
+  def to_record(self, with_subject_abbrs: bool = False) -> Dict:
+    """ What a crawl journal keeps of this page to restore it without crawling it again.
+
+    Args:
+      with_subject_abbrs (bool): Also keep the subject abbreviations, for a courses page in api mode.
+
+    Returns:
+      Dict: The url, the crawl status and the extracted content as html.
+    """
+    self.load()
+    record = {
+      "url": self.url,
+      "crawl_success": self.crawl_success,
+      "blank": isinstance(self.content, str),
+      "blank_reason": self.blank_reason,
+      "content": str(self.content),
+      "bytes_read": self.bytes_read,
+      "bytes_saved": self.bytes_saved,
+    }
+    if with_subject_abbrs:
+      record["subject_abbrs"] = self.get_subject_abbrs()
+    return record
+
+  @staticmethod
+  def blank_record(url: str, reason: str) -> Dict:
+    """ The record of a page left blank without being crawled, e.g, after the run deadline.
+
+    Args:
+      url (str): The url of the page.
+      reason (str): Why it is blank.
+
+    Returns:
+      Dict: A record for `from_record()`.
+    """
+    return {
+      "url": url,
+      "crawl_success": False,
+      "blank": True,
+      "blank_reason": reason,
+      "content": "[CONTENT BLANK]",
+      "bytes_read": 0,
+      "bytes_saved": 0,
+    }
+
+  @classmethod
+  def from_record(cls, record: Dict, page_tag: PAGE_TAG, html_id, header_level, locators_data, stream: bool = False) -> "Page":
+    """ Restore a page from its crawl journal record, without any request nor parse of the page.
+
+    Args:
+      record (Dict): The record made by `to_record()`.
+      page_tag, html_id, header_level, locators_data, stream: As in the initializer.
+
+    Returns:
+      Page: The page, with the same content as when it was recorded.
+    """
+    page = cls.__new__(cls)
+    page.logging = ["Restored from the crawl journal"]
+    page.VERBOSE = False
+    page.html_id = html_id
+    page.page_tag = page_tag
+    page.header_level = header_level
+    page.url = record["url"]
+    page.client = None
+    page.cache = None
+    page.parses = None
+    page.stream = stream
+    page.deadline = None
+    page.blank_reason = record.get("blank_reason")
+    page.bytes_read = record["bytes_read"]
+    page.bytes_saved = record["bytes_saved"]
+    page.extract_seconds = 0.0
+    page.soup = None
+    page.subject_abbrs = record.get("subject_abbrs", [])
+    page.locators_data = locators_data
+    page.locator = page.__get_locator()
+    page.strainer = None
+    page.crawl_success = record["crawl_success"]
+    page.loaded = True
+    page.load_lock = threading.Lock()
+    if record["blank"]:
+      page.content = record["content"]
+    else:
+      page.content = parse_fragment(record["content"], PARSE_STAGE.page).find()
+    return page
+
   def __str__(self) -> str:
     return f"[Page] Unique id: {self.html_id}, this page's header is {self.header_level}."
 
   def generate(self) -> str:
-    return self.content
\ No newline at end of file
+    return self.load().content
\ No newline at end of file
@@ -0,0 +1,130 @@
+""" @author: Alex Nguyen
+  @file: parser.py
+  This file contains the parser factory, which picks the html parser backend of every parsing stage.
+"""
+
+from typing import Dict, List
+import importlib.util
+import threading
+import warnings
+import bs4
+
+from .const import DEFAULT_PARSER, PARSE_STAGE
+
+# The backends of BeautifulSoup, with the module each one needs
+PARSER_BACKENDS = {
+  "html.parser": None, # Pure python, always available and the slowest
+  "lxml": "lxml", # libxml2, the fastest
+  "html5lib": "html5lib", # Parses like a browser, the most lenient and even slower than html.parser
+}
+
+def available_parsers() -> List[str]:
+  """ Returns:
+    List[str]: The backends whose module is installed.
+  """
+  return [backend for backend, module in PARSER_BACKENDS.items() if module is None or importlib.util.find_spec(module) is not None]
+
+class ParserFactory:
+  """ Build the BeautifulSoup of every parsing stage (see `PARSE_STAGE`) with the backend chosen
+    for that stage. A backend which is not installed falls back to `html.parser` with a warning,
+    so a configuration never breaks a run.
+  """
+
+  def __init__(self, default: str = DEFAULT_PARSER, stages: Dict[str, str] = None) -> None:
+    """ initializer
+
+    Args:
+      default (str): The backend of every stage not in `stages`.
+      stages (Dict[str, str]): Map from a stage to its backend, e.g, {"page": "lxml"}.
+    """
+    stages = stages if stages is not None else {}
+    known_stages = [v for k, v in vars(PARSE_STAGE).items() if not k.startswith("_")]
+    for stage in stages:
+      assert stage in known_stages, f"Unknown parsing stage {stage}, expected one of {known_stages}"
+    self.default = self.__usable(default)
+    self.stages = {stage: self.__usable(backend) for stage, backend in stages.items()}
+
+  @staticmethod
+  def __usable(backend: str) -> str:
+    assert backend in PARSER_BACKENDS, f"Unknown parser {backend}, expected one of {list(PARSER_BACKENDS)}"
+    if backend not in available_parsers():
+      warnings.warn(f"The parser {backend} is not installed, using {DEFAULT_PARSER} instead")
+      return DEFAULT_PARSER
+    return backend
+
+  def backend(self, stage: str) -> str:
+    return self.stages.get(stage, self.default)
+
+  def parse(self, src, stage: str, **kwargs) -> bs4.BeautifulSoup:
+    """ Parse a document.
+
+    Args:
+      src (str or bytes): The html.
+      stage (str): The parsing stage, which decides the backend.
+      **kwargs: Any other keyword arguments of `bs4.BeautifulSoup`, e.g, `from_encoding`.
+
+    Returns:
+      bs4.BeautifulSoup: The soup.
+    """
+    return bs4.BeautifulSoup(src, self.backend(stage), **kwargs)
+
+  def parse_fragment(self, src, stage: str, **kwargs) -> bs4.BeautifulSoup:
+    """ Parse a piece of html which is not a whole document. lxml and html5lib wrap it into
+      `<html><body>`, which is removed, so the soup has the same top level elements with any backend.
+
+    Args:
+      src (str or bytes): The html fragment.
+      stage (str): The parsing stage, which decides the backend.
+
+    Returns:
+      bs4.BeautifulSoup: The soup.
+    """
+    soup = self.parse(src, stage, **kwargs)
+    html = soup.find("html", recursive=False)
+    if html is not None and self.backend(stage) != "html.parser":
+      head = html.find("head", recursive=False)
+      if head is not None and not head.contents:
+        head.decompose()
+      body = html.find("body", recursive=False)
+      if body is not None:
+        body.unwrap()
+      html.unwrap()
+    return soup
+
+# The factory of the run, set once at the start by `main.py` or `mainv2.py`
+_factory = ParserFactory()
+_factory_lock = threading.Lock()
+
+def get_parser_factory() -> ParserFactory:
+  return _factory
+
+def set_parser_factory(factory: ParserFactory) -> None:
+  global _factory
+  with _factory_lock:
+    _factory = factory
+
+def parse_html(src, stage: str, **kwargs) -> bs4.BeautifulSoup:
+  """ Parse a document with the backend of its stage in the factory of the run.
+  """
+  return get_parser_factory().parse(src, stage, **kwargs)
+
+def parse_fragment(src, stage: str, **kwargs) -> bs4.BeautifulSoup:
+  """ Parse a piece of html with the backend of its stage in the factory of the run.
+  """
+  return get_parser_factory().parse_fragment(src, stage, **kwargs)
+
+def parser_factory_from_args(default: str, stage_backends: List[str] = None) -> ParserFactory:
+  """ Build a factory from command line arguments.
+
+  Args:
+    default (str): The backend of every stage.
+    stage_backends (List[str]): Overrides of the form `STAGE=BACKEND`, e.g, `page=lxml`.
+
+  Returns:
+    ParserFactory: The factory.
+  """
+  stages = {}
+  for stage_backend in stage_backends or []:
+    stage, _, backend = stage_backend.partition("=")
+    stages[stage.strip()] = backend.strip()
+  return ParserFactory(default, stages)
@@ -0,0 +1,102 @@
+""" @author: Alex Nguyen
+  @file: parser_bench.py
+  This file contains the benchmark of the html parser backends. Every installed backend parses every
+    cached page, and the fragments matched by the locators are checked to be the same as with
+    `html.parser`. Run it as `python -m catalog_engine_v2.parser_bench --cache ./data/html/` from
+    the `src` folder.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import argparse
+import time
+import bs4
+
+from .cache import CrawlCache
+from .const import DEFAULT_PARSER
+from .parser import PARSER_BACKENDS, available_parsers
+from .utils import load_json_locators
+
+def locators_of(locators_data: Dict) -> List[Tuple[str, List[str]]]:
+  """ The distinct (html tag, css classes) of the locators json.
+  """
+  locators = []
+  for entry in locators_data["data"].values():
+    if isinstance(entry["data"], dict) and "html_tag" in entry["data"]:
+      locator = (entry["data"]["html_tag"], entry["data"]["css_class"].split())
+      if locator not in locators:
+        locators.append(locator)
+  return locators
+
+def fingerprint(tag: Optional[bs4.Tag]) -> Optional[Tuple]:
+  """ What an extracted fragment is made of: its element names in document order and its text with
+    the whitespace collapsed. Backends differ on whitespace and attribute order, but not on these.
+  """
+  if tag is None:
+    return None
+  return (tuple(t.name for t in tag.find_all()), " ".join(tag.get_text().split()))
+
+def run_benchmark(cache: CrawlCache, locators: List[Tuple[str, List[str]]], backends: List[str], limit: int = None) -> Dict[str, Dict]:
+  """ Parse every cached page with every backend.
+
+  Args:
+    cache (CrawlCache): The page cache.
+    locators (List[Tuple[str, List[str]]]): The (html tag, css classes) whose fragments are compared.
+    backends (List[str]): The backends, the first one being the reference of the comparison.
+    limit (int): Only the first pages, all of them if None.
+
+  Returns:
+    Dict[str, Dict]: Map from every backend to its number of pages, parse seconds, milliseconds per
+      page, speedup over the reference and the urls whose fragments differ from the reference.
+  """
+  urls = sorted(cache.urls())[:limit]
+  pages = [(url, cache.get(url), (cache.get_meta(url) or {}).get("charset")) for url in urls]
+  report = {}
+  reference: Dict[str, List] = {}
+  for backend in backends:
+    seconds = 0.0
+    mismatches = []
+    for url, body, charset in pages:
+      if body is None:
+        continue
+      start = time.perf_counter()
+      soup = bs4.BeautifulSoup(body, backend, from_encoding=charset)
+      seconds += time.perf_counter() - start
+      fragments = [fingerprint(soup.find(html_tag, {"class": css_class})) for html_tag, css_class in locators]
+      if backend == backends[0]:
+        reference[url] = fragments
+      elif fragments != reference[url]:
+        mismatches.append(url)
+    report[backend] = {
+      "pages": len(pages),
+      "seconds": round(seconds, 3),
+      "ms_per_page": round(1000 * seconds / max(1, len(pages)), 2),
+      "speedup": round(report[backends[0]]["seconds"] / seconds, 2) if backend != backends[0] and seconds else 1.0,
+      "mismatches": mismatches,
+    }
+  return report
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Benchmark the html parser backends on the cached pages.")
+  parser.add_argument("--cache", default="./data/html/", help="The page cache folder.")
+  parser.add_argument("--locators", default="./data/locators.json", help="The locators json.")
+  parser.add_argument("--backends", nargs="+", choices=list(PARSER_BACKENDS), help="The backends, every installed one by default.")
+  parser.add_argument("--limit", type=int, help="Only benchmark the first N pages.")
+  args = parser.parse_args(argv)
+
+  installed = available_parsers()
+  backends = [b for b in (args.backends or installed) if b in installed]
+  # html.parser is the backend the extractors were written against, so it is the reference
+  backends = [DEFAULT_PARSER] + [b for b in backends if b != DEFAULT_PARSER]
+  missing = [b for b in (args.backends or PARSER_BACKENDS) if b not in installed]
+  if missing:
+    print(f"Not installed, skipped: {missing}")
+
+  report = run_benchmark(CrawlCache(args.cache), locators_of(load_json_locators(args.locators)), backends, args.limit)
+  for backend, result in report.items():
+    print(f"{backend:>12}: {result['pages']} pages in {result['seconds']}s, {result['ms_per_page']} ms/page, "
+      f"x{result['speedup']}, {len(result['mismatches'])} pages with different fragments")
+    for url in result["mismatches"]:
+      print(f"  {url}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,89 @@
+""" @author: Alex Nguyen
+  @file: singleflight.py
+  This file contains the single-flight group which makes concurrent and repeated calls for the
+    same key share one result.
+"""
+
+from typing import Any, Callable, Dict
+from concurrent.futures import Future
+import threading
+
+class SingleFlight:
+  """ Run a function at most once per key. A caller asking for a key that is already in flight
+    waits for that call instead of starting its own. If `memoize` is on, a later caller also gets
+    the finished result back without any call. Failed calls are never memoized.
+  """
+
+  def __init__(self, memoize: bool = True) -> None:
+    """ initializer
+
+    Args:
+      memoize (bool): Keep the finished results, so repeated calls are deduped too and not only
+        the concurrent ones.
+    """
+    self.memoize = memoize
+    self.lock = threading.Lock()
+    self.flights: Dict[str, Future] = {}
+
+    # Dedupe counters
+    self.n_calls = 0 # The function actually ran
+    self.n_coalesced = 0 # Joined a call that was still in flight
+    self.n_reused = 0 # Got a memoized result
+
+  def do(self, key: str, fn: Callable[[], Any]) -> Any:
+    """ Return the result of `fn()` for this key, sharing it with every other caller of the key.
+
+    Args:
+      key (str): The key of the call, i.e, the normalized url.
+      fn (Callable): The function to run if nobody has run it for the key yet.
+
+    Returns:
+      The result of `fn()`. The exception of `fn()` is raised to every caller of that flight.
+    """
+    with self.lock:
+      future = self.flights.get(key)
+      is_owner = future is None
+      if is_owner:
+        future = Future()
+        self.flights[key] = future
+        self.n_calls += 1
+      elif future.done():
+        self.n_reused += 1
+      else:
+        self.n_coalesced += 1
+
+    if not is_owner:
+      return future.result()
+
+    try:
+      result = fn()
+    except BaseException as e:
+      with self.lock:
+        del self.flights[key]
+      future.set_exception(e)
+      raise
+    if not self.memoize:
+      with self.lock:
+        del self.flights[key]
+    future.set_result(result)
+    return result
+
+  def forget(self, key: str) -> None:
+    """ Drop the memoized result of a key, so the next call runs the function again.
+    """
+    with self.lock:
+      future = self.flights.get(key)
+      if future is not None and future.done():
+        del self.flights[key]
+
+  def stats(self) -> Dict[str, int]:
+    """ Returns:
+      Dict[str, int]: The dedupe counters. `saved` is the number of calls that did not run.
+    """
+    with self.lock:
+      return {
+        "calls": self.n_calls,
+        "coalesced": self.n_coalesced,
+        "reused": self.n_reused,
+        "saved": self.n_coalesced + self.n_reused,
+      }
@@ -0,0 +1,138 @@
+""" @author: Alex Nguyen
+  @file: sitemap.py
+  This file contains the sitemap reader, which tells from the `lastmod` of a page whether it
+    changed since it was cached.
+"""
+
+from typing import Dict, Optional
+from datetime import datetime, timedelta, timezone
+import gzip
+import re
+import warnings
+import xml.etree.ElementTree as ET
+import requests
+
+from .cache import normalize_url
+from .client import HttpClient
+
+def parse_lastmod(text: str) -> Optional[float]:
+  """ Parse a W3C datetime of a sitemap (`2022-05-01`, `2022-05-01T10:00:00+00:00`, `...Z`).
+    A date without a time is taken as the end of that day (UTC), since the page may have changed
+    at any time of the day, so a page fetched on that day still counts as modified after it.
+
+  Args:
+    text (str): The `lastmod` text.
+
+  Returns:
+    float: The timestamp, comparable with `time.time()`. None if the text is not a date.
+  """
+  text = (text or "").strip()
+  if text.endswith("Z"):
+    text = text[:-1] + "+00:00"
+  try:
+    date = datetime.fromisoformat(text)
+  except ValueError:
+    return None
+  if re.fullmatch(r"\d{4}-\d{2}-\d{2}", text):
+    date += timedelta(days=1)
+  if date.tzinfo is None:
+    date = date.replace(tzinfo=timezone.utc)
+  return date.timestamp()
+
+def _local_name(element: ET.Element) -> str:
+  # Drop the `{http://www.sitemaps.org/schemas/sitemap/0.9}` namespace
+  return element.tag.rsplit("}", 1)[-1]
+
+class Sitemap:
+  """ The `lastmod` of every page listed in a sitemap, keyed by the normalized url.
+    Sitemap indexes are followed, and gzip compressed sitemaps are read too. A sitemap which
+    cannot be read only warns: the pages it lists are unknown, so they are never skipped.
+  """
+
+  def __init__(self, source: str, client: HttpClient = None) -> None:
+    """ initializer
+
+    Args:
+      source (str): The url of the sitemap, or the path to a local sitemap file.
+      client (HttpClient): The http client used for a remote sitemap. A new one is created if
+        not given.
+    """
+    self.client = client
+    self.lastmods: Dict[str, float] = {}
+    self.load(source)
+
+  @classmethod
+  def from_lastmods(cls, lastmods: Dict[str, float]) -> "Sitemap":
+    """ A sitemap already read, e.g, shared with the crawl workers through the work queue.
+
+    Args:
+      lastmods (Dict[str, float]): The `lastmods` of the sitemap.
+
+    Returns:
+      Sitemap: The sitemap.
+    """
+    sitemap = cls.__new__(cls)
+    sitemap.client = None
+    sitemap.lastmods = dict(lastmods)
+    return sitemap
+
+  def __read(self, source: str) -> bytes:
+    if source.startswith("http://") or source.startswith("https://"):
+      if self.client is None:
+        self.client = HttpClient()
+      res = self.client.get(source)
+      res.raise_for_status()
+      data = res.content
+    else:
+      with open(source, "rb") as f:
+        data = f.read()
+    if data[:2] == b"\x1f\x8b":
+      data = gzip.decompress(data)
+    return data
+
+  def load(self, source: str) -> None:
+    """ Read a sitemap, or every sitemap of a sitemap index.
+
+    Args:
+      source (str): The url or path of the sitemap.
+    """
+    try:
+      root = ET.fromstring(self.__read(source))
+    except (requests.exceptions.RequestException, OSError, ET.ParseError) as e:
+      warnings.warn(f"Cannot read the sitemap {source} ({e!r}), its pages are crawled as if it was not given")
+      return
+    for entry in root:
+      children = {_local_name(child): (child.text or "").strip() for child in entry}
+      if not children.get("loc"):
+        continue
+      if _local_name(root) == "sitemapindex":
+        self.load(children["loc"])
+        continue
+      lastmod = parse_lastmod(children.get("lastmod"))
+      if lastmod is not None:
+        self.lastmods[normalize_url(children["loc"])] = lastmod
+
+  def __contains__(self, url: str) -> bool:
+    return normalize_url(url) in self.lastmods
+
+  def __len__(self) -> int:
+    return len(self.lastmods)
+
+  def lastmod(self, url: str) -> Optional[float]:
+    return self.lastmods.get(normalize_url(url))
+
+  def changed_since(self, url: str, fetched_at: float) -> Optional[bool]:
+    """ Tell whether a page changed after it was fetched.
+
+    Args:
+      url (str): The url of the page.
+      fetched_at (float): When the page was fetched, as a `time.time()` timestamp.
+
+    Returns:
+      bool: True if its `lastmod` is later than the fetch, False if not, and None if the sitemap
+        does not know the page.
+    """
+    lastmod = self.lastmod(url)
+    if lastmod is None:
+      return None
+    return lastmod > fetched_at
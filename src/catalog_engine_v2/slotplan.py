@@ -0,0 +1,150 @@
+""" @author: Alex Nguyen
+  @file: slotplan.py
+  This file contains the compiled slot plan of a catalog template, and its disk store. The plan is
+    everything a run needs from the template: the slots to crawl, and the generated document around
+    them, so a warm run never parses the template.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional
+import hashlib
+import json
+import os
+import bs4
+
+# Version of the compiled form. Bump it whenever the compile or the splice changes, so that the
+# plans compiled before are never reused.
+PLAN_FORMAT = 1
+
+class SlotPlan:
+  """ The compiled form of a template. The frame is the serialized output document with every slot
+    left as in the template and the generation date left empty. Each slot has the `[start, end)`
+    offsets of its `<code>` link in the frame, and the `splice` offset where the content of its page
+    goes, at the end of the slot `div`. Filling a slot drops its link and inserts the content.
+  """
+
+  def __init__(self, key: str, frame: str, date: int, slots: List[Dict]) -> None:
+    """ initializer
+
+    Args:
+      key (str): The key of the template the plan is compiled from, see `template_key()`.
+      frame (str): The serialized output document.
+      date (int): Offset of the generation date in the frame.
+      slots (List[Dict]): The slots in template order: the index of their template section, the
+        html id and level of their header, the url of their page, whether they are a courses slot,
+        and their `link` and `splice` offsets.
+    """
+    self.key = key
+    self.frame = frame
+    self.date = date
+    self.slots = slots
+    self.n_sections = max((slot["section"] for slot in slots), default=-1) + 1
+
+  @staticmethod
+  def from_document(key: str, document: str, markers: List[str], slots: List[Dict], links: List[str]) -> "SlotPlan":
+    """ Compile the plan of a serialized document holding a marker for the generation date, then
+      one for the link and one for the splice point of each slot.
+
+    Args:
+      key (str): The key of the template.
+      document (str): The serialized document.
+      markers (List[str]): The markers, in document order.
+      slots (List[Dict]): The slots, without their offsets.
+      links (List[str]): The serialized `<code>` link of each slot, which its marker stands for.
+
+    Returns:
+      SlotPlan: The plan.
+    """
+    assert len(markers) == 1 + 2 * len(slots) == 1 + 2 * len(links), "One date marker, then two markers per slot"
+    positions = [document.index(marker) for marker in markers]
+    assert positions == sorted(positions), "The markers are not in document order"
+    pieces = [document[:positions[0]]]
+    for i, position in enumerate(positions):
+      end = positions[i + 1] if i + 1 < len(positions) else len(document)
+      pieces.append(document[position + len(markers[i]):end])
+
+    frame = pieces[0]
+    date = len(frame)
+    frame += pieces[1]
+    for i, slot in enumerate(slots):
+      start = len(frame)
+      frame += links[i]
+      slot["link"] = [start, len(frame)]
+      frame += pieces[2 + 2 * i]
+      slot["splice"] = len(frame)
+      frame += pieces[3 + 2 * i]
+    return SlotPlan(key, frame, date, slots)
+
+  def to_dict(self) -> Dict:
+    return {"key": self.key, "frame": self.frame, "date": self.date, "slots": self.slots}
+
+  @staticmethod
+  def from_dict(data: Dict) -> "SlotPlan":
+    return SlotPlan(data["key"], data["frame"], data["date"], data["slots"])
+
+  def splice(self, generated_on: str, fills: Iterable[Optional[str]]) -> Iterator[str]:
+    """ The output document, piece by piece. The fills are only pulled as their slots are reached,
+      so they may be produced while the pieces are written.
+
+    Args:
+      generated_on (str): The serialized generation date.
+      fills (Iterable[Optional[str]]): The serialized content of each slot, in slot order. A slot
+        filled with None keeps its link.
+
+    Returns:
+      Iterator[str]: The pieces of the document.
+    """
+    yield self.frame[:self.date]
+    yield generated_on
+    position = self.date
+    for slot, fill in zip(self.slots, fills):
+      start, end = slot["link"]
+      if fill is None:
+        yield self.frame[position:slot["splice"]]
+      else:
+        yield self.frame[position:start]
+        yield self.frame[end:slot["splice"]]
+        yield fill
+      position = slot["splice"]
+    yield self.frame[position:]
+
+def template_key(template_src: bytes, backend: str) -> str:
+  """ The key of a compiled template: the hash of the template file, of the parser backend and of
+    the bs4 version, since the last two decide how the template is serialized, and of the plan format.
+
+  Args:
+    template_src (bytes): The content of the template file.
+    backend (str): The parser backend of the template.
+
+  Returns:
+    str: The sha1 hex digest.
+  """
+  digest = hashlib.sha1(template_src)
+  digest.update(f"\0{backend}\0{bs4.__version__}\0{PLAN_FORMAT}".encode("utf8"))
+  return digest.hexdigest()
+
+class SlotPlanStore:
+  """ The compiled plans, each one stored in `<root>/<key>.json`, so switching between templates
+    never compiles one again.
+  """
+
+  def __init__(self, root: str) -> None:
+    self.root = root
+    os.makedirs(self.root, exist_ok=True)
+
+  def __path(self, key: str) -> str:
+    return os.path.join(self.root, f"{key}.json")
+
+  def get(self, key: str) -> Optional[SlotPlan]:
+    """ Returns:
+      SlotPlan: The plan compiled for this key, None if there is none.
+    """
+    if not os.path.exists(self.__path(key)):
+      return None
+    with open(self.__path(key), "r", encoding="utf8") as f:
+      return SlotPlan.from_dict(json.load(f))
+
+  def put(self, plan: SlotPlan) -> None:
+    tmp_path = f"{self.__path(plan.key)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf8") as f:
+      json.dump(plan.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, self.__path(plan.key))
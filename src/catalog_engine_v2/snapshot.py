@@ -0,0 +1,180 @@
+""" @author: Alex Nguyen
+  @file: snapshot.py
+  This file contains the versioned local snapshots of the courses api, and the delta between
+    two snapshots.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import gzip
+import json
+import os
+import re
+import time
+import requests
+
+from .client import HttpClient
+from .const import FUNNELBACK_COURSE_API, DEFAULT_SNAPSHOT_MAX_AGE, DEFAULT_SNAPSHOT_KEEP
+from .utils import stream_courses_from_api
+
+class CourseDelta:
+  """ The courses added, removed and changed between two snapshots, by course `id`.
+  """
+
+  def __init__(self, added: List[str] = None, removed: List[str] = None, changed: List[str] = None) -> None:
+    self.added = added if added is not None else []
+    self.removed = removed if removed is not None else []
+    self.changed = changed if changed is not None else []
+
+  @staticmethod
+  def between(old: List[Dict], new: List[Dict]) -> "CourseDelta":
+    """ Compare the courses of two snapshots.
+
+    Args:
+      old (List[Dict]): The courses of the previous snapshot.
+      new (List[Dict]): The courses of the new snapshot.
+
+    Returns:
+      CourseDelta: The ids of the added, removed and changed courses, in api order.
+    """
+    old_by_id = {str(course["id"]): course for course in old}
+    new_by_id = {str(course["id"]): course for course in new}
+    return CourseDelta(
+      added=[course_id for course_id in new_by_id if course_id not in old_by_id],
+      removed=[course_id for course_id in old_by_id if course_id not in new_by_id],
+      changed=[course_id for course_id in new_by_id if course_id in old_by_id and new_by_id[course_id] != old_by_id[course_id]])
+
+  def to_dict(self) -> Dict[str, List[str]]:
+    return {"added": self.added, "removed": self.removed, "changed": self.changed}
+
+  def __bool__(self) -> bool:
+    return bool(self.added or self.removed or self.changed)
+
+  def __str__(self) -> str:
+    return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+
+class CourseSnapshotStore:
+  """ Versioned snapshots of the courses api, each one stored in `<root>/courses-<version>.json.gz`
+    with the time it was downloaded and its delta against the previous version. A download which
+    changes nothing only refreshes the time of the latest version.
+  """
+
+  def __init__(self, root: str, max_age: float = DEFAULT_SNAPSHOT_MAX_AGE, keep: int = DEFAULT_SNAPSHOT_KEEP) -> None:
+    """ initializer
+
+    Args:
+      root (str): The folder of the snapshots. Created if it does not exist.
+      max_age (float): A snapshot younger than this (in seconds) is fresh, and is used without
+        downloading the api.
+      keep (int): How many versions are kept. The oldest ones are deleted.
+    """
+    self.root = root
+    self.max_age = max_age
+    self.keep = keep
+    os.makedirs(self.root, exist_ok=True)
+
+  def __path(self, version: int) -> str:
+    return os.path.join(self.root, f"courses-{version:05d}.json.gz")
+
+  def versions(self) -> List[int]:
+    """ Returns:
+      List[int]: The stored versions, oldest first.
+    """
+    versions = []
+    for name in os.listdir(self.root):
+      match = re.fullmatch(r"courses-(\d+)\.json\.gz", name)
+      if match:
+        versions.append(int(match.group(1)))
+    return sorted(versions)
+
+  def read(self, version: int) -> Dict:
+    with gzip.open(self.__path(version), "rt", encoding="utf8") as f:
+      return json.load(f)
+
+  def __write(self, snapshot: Dict) -> None:
+    # Written aside and moved, so a crash never leaves a truncated latest version
+    tmp_path = self.__path(snapshot["version"]) + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf8") as f:
+      json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, self.__path(snapshot["version"]))
+
+  def latest(self) -> Optional[Dict]:
+    """ Returns:
+      Dict: The latest snapshot, None if there is none yet.
+    """
+    versions = self.versions()
+    return self.read(versions[-1]) if versions else None
+
+  def is_fresh(self, snapshot: Optional[Dict]) -> bool:
+    return snapshot is not None and time.time() - snapshot["fetched_at"] < self.max_age
+
+  def sync(self, client: HttpClient, url: str = FUNNELBACK_COURSE_API, attrs: List[str] = None) -> Dict:
+    """ Download the api and store it as a new version if any course was added, removed or changed.
+
+    Args:
+      client (HttpClient): The http client.
+      url (str): The url of the courses api.
+      attrs (List[str]): If given, the api is streamed and only these attributes of every course
+        are kept, so a change in any other attribute is not a change either.
+
+    Raises:
+      requests.exceptions.RequestException: If the api could not be downloaded.
+
+    Returns:
+      Dict: The latest snapshot, with `version`, `fetched_at`, `source`, `delta` and `data`.
+    """
+    if attrs is not None:
+      courses = stream_courses_from_api(url, attrs, client=client)["data"]
+    else:
+      res = client.get(url)
+      # An error page must never become a snapshot
+      res.raise_for_status()
+      courses = res.json()["data"]
+    previous = self.latest()
+    previous_courses = previous["data"] if previous is not None else []
+    if attrs is not None:
+      # A version stored with every attribute is compared on the kept attributes only
+      previous_courses = [{attr: course[attr] for attr in attrs if attr in course} for course in previous_courses]
+    if previous is not None and previous_courses == courses:
+      previous["fetched_at"] = time.time()
+      self.__write(previous)
+      return previous
+
+    snapshot = {
+      "version": previous["version"] + 1 if previous is not None else 1,
+      "fetched_at": time.time(),
+      "source": url,
+      "delta": CourseDelta.between(previous_courses, courses).to_dict(),
+      "data": courses,
+    }
+    self.__write(snapshot)
+    for version in self.versions()[:-self.keep]:
+      os.remove(self.__path(version))
+    return snapshot
+
+  def load(self, client: HttpClient = None, url: str = FUNNELBACK_COURSE_API, force: bool = False, attrs: List[str] = None) -> Tuple[Dict, CourseDelta]:
+    """ Read the latest snapshot if it is fresh, or sync it from the api first.
+
+    Args:
+      client (HttpClient): The http client used to sync. A new one is created if needed.
+      url (str): The url of the courses api.
+      force (bool): Sync even if the latest snapshot is fresh.
+      attrs (List[str]): If given, the api is streamed keeping only these attributes.
+
+    Returns:
+      (Dict, CourseDelta): The api data, in the shape `{"data": [...]}` the explorers take, and
+        the delta of the version this call stored against the one before. The delta is empty when
+        no new version was stored, so a change is only reported by the run which found it.
+    """
+    snapshot = self.latest()
+    version = snapshot["version"] if snapshot is not None else None
+    if force or not self.is_fresh(snapshot):
+      try:
+        snapshot = self.sync(client if client is not None else HttpClient(), url, attrs)
+      except requests.exceptions.RequestException as e:
+        if snapshot is None:
+          raise
+        # A stale catalog is better than no catalog
+        print(f"Failed syncing the courses api ({e}), using the snapshot version {snapshot['version']}")
+    if snapshot["version"] == version:
+      return {"data": snapshot["data"]}, CourseDelta()
+    return {"data": snapshot["data"]}, CourseDelta(**snapshot["delta"])
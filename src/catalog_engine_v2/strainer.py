@@ -0,0 +1,77 @@
+""" @author: Alex Nguyen
+  @file: strainer.py
+  This file contains the parse-only strainers compiled from the locators and the extractor
+    templates, so that parsing a page only builds the subtrees that are read from it.
+"""
+
+from typing import Iterable, List, Optional, Tuple, Union
+import bs4
+
+from .setting import PageLocator
+
+# A container read from a page: (html tag, css classes), matched like `soup.find(html_tag, {"class": css_class})`
+Container = Tuple[str, Union[str, List[str]]]
+
+class ContainerStrainer:
+  """ A parse-only strainer keeping every element matching one of the containers, with its whole
+    subtree, and dropping the rest of the page. A container nested in another one is kept inside
+    it, so `find` and `find_all` on the strained soup return the same elements as on the full soup.
+    For several containers, the strainer matches any of their tags with any of their classes,
+    which may keep a little more than needed but never less.
+  """
+
+  def __init__(self, containers: Iterable[Container]) -> None:
+    """ initializer
+
+    Args:
+      containers (Iterable[Container]): The containers. A css class given as a string may hold
+        several space separated classes, matching an element having any of them.
+    """
+    self.containers: List[Tuple[str, Tuple[str, ...]]] = []
+    for html_tag, css_class in containers:
+      classes = css_class.split() if isinstance(css_class, str) else [c for c in css_class if c]
+      container = (html_tag, tuple(classes))
+      if container not in self.containers:
+        self.containers.append(container)
+    assert all(html_tag for html_tag, _ in self.containers), "Every container needs an html tag"
+    self.tags = sorted({html_tag for html_tag, _ in self.containers})
+    # A container without a class matches every element of its tag
+    self.classes = None if any(not classes for _, classes in self.containers) else \
+      {c for _, classes in self.containers for c in classes}
+
+  def match_class(self, value) -> bool:
+    # While parsing, the class attribute is still the raw space separated string
+    if value is None:
+      return False
+    return any(c in self.classes for c in (value.split() if isinstance(value, str) else value))
+
+  @property
+  def strainer(self) -> bs4.SoupStrainer:
+    if self.classes is None:
+      return bs4.SoupStrainer(self.tags)
+    return bs4.SoupStrainer(self.tags, {"class": self.match_class})
+
+  @property
+  def key(self) -> str:
+    """ A short text identifying the strainer, e.g, to share the soups parsed with it.
+    """
+    return " ".join(f"{html_tag}.{'.'.join(classes)}" for html_tag, classes in self.containers)
+
+def needs_full_parse(locator: PageLocator) -> bool:
+  """ Whether a locator reads more than the subtree of the element it locates: its "from" and "to"
+    excludes cut the elements following a tag, which may be siblings outside that subtree.
+  """
+  return any("from" in exclude or "to" in exclude for exclude in locator.exclude_list)
+
+def locator_strainer(locator: PageLocator) -> Optional[ContainerStrainer]:
+  """ The strainer of the content of a page.
+
+  Args:
+    locator (PageLocator): The locator of the content.
+
+  Returns:
+    ContainerStrainer: The strainer, None if the page needs a full parse.
+  """
+  if not locator.html_tag or needs_full_parse(locator):
+    return None
+  return ContainerStrainer([(locator.html_tag, locator.css_class)])
@@ -0,0 +1,163 @@
+""" @author: Alex Nguyen
+  @file: streaming.py
+  This file contains the streaming fetch, which stops downloading a page as soon as the element
+    matched by its locator has been closed.
+"""
+
+from typing import List, Optional, Tuple
+from html.parser import HTMLParser
+import codecs
+
+from .cache import sniff_charset
+from .client import HttpClient, iter_body
+from .const import DEFAULT_CHARSET
+from .deadline import Deadline
+from .setting import PageLocator
+
+# Size of the chunks read from the socket
+STREAM_CHUNK_SIZE = 16 * 1024
+
+class LocatorWatcher(HTMLParser):
+  """ Incremental html parser which only watches for the first element matched by a locator,
+    the same element `soup.find(locator.html_tag, {'class': locator.css_class})` returns, and
+    remembers where that element is closed.
+  """
+
+  def __init__(self, html_tag: str, css_class: List[str]) -> None:
+    super().__init__(convert_charrefs=False)
+    self.html_tag = html_tag.lower()
+    self.css_class = [c for c in css_class if c]
+    self.depth = 0 # Number of open `html_tag` elements since the matched one, itself included
+    self.found = False
+    self.closed_at: Optional[Tuple[int, int]] = None # (line, column) of the closing tag
+
+  def matches(self, tag: str, attrs: List[Tuple[str, str]]) -> bool:
+    if tag != self.html_tag:
+      return False
+    # Like bs4, a list of classes matches an element having any of them
+    classes = (dict(attrs).get("class") or "").split()
+    return any(c in self.css_class for c in classes)
+
+  def handle_starttag(self, tag, attrs) -> None:
+    if self.closed_at is not None:
+      return
+    if self.depth > 0:
+      if tag == self.html_tag:
+        self.depth += 1
+    elif self.matches(tag, attrs):
+      self.found = True
+      self.depth = 1
+
+  def handle_startendtag(self, tag, attrs) -> None:
+    if self.closed_at is None and self.depth == 0 and self.matches(tag, attrs):
+      self.found = True
+      self.closed_at = self.getpos()
+
+  def handle_endtag(self, tag) -> None:
+    if self.closed_at is None and self.depth > 0 and tag == self.html_tag:
+      self.depth -= 1
+      if self.depth == 0:
+        self.closed_at = self.getpos()
+
+  @property
+  def done(self) -> bool:
+    return self.closed_at is not None
+
+def _end_offset(text: str, position: Tuple[int, int]) -> int:
+  """ Turn the (line, column) of a tag into the offset just after its `>` in the text.
+  """
+  line, column = position
+  offset = 0
+  for _ in range(line - 1):
+    offset = text.index("\n", offset) + 1
+  return text.index(">", offset + column) + 1
+
+def _bytes_read(res, chunks: List[bytes]) -> int:
+  # Bytes on the wire, which may be compressed. A replayed response has no connection at all.
+  if res.raw is not None:
+    return res.raw.tell()
+  return sum(len(chunk) for chunk in chunks)
+
+class StreamResult:
+  """ What the streaming fetch read from a page.
+  """
+
+  def __init__(self, src, charset: str, complete: bool, bytes_read: int, bytes_total: Optional[int], status: int, headers) -> None:
+    """ initializer
+
+    Args:
+      src (str or bytes): The source to parse. If `complete` is False, it is the decoded text up to
+        and including the closing tag of the located element, otherwise the raw body.
+      charset (str): The charset of the page.
+      complete (bool): Whether the whole body has been read.
+      bytes_read (int): Bytes read from the connection.
+      bytes_total (int): The `Content-Length` of the page, None if the server did not send it.
+      status (int): The http status of the response.
+      headers: The response headers.
+    """
+    self.src = src
+    self.charset = charset
+    self.complete = complete
+    self.bytes_read = bytes_read
+    self.bytes_total = bytes_total
+    self.status = status
+    self.headers = headers
+
+  @property
+  def bytes_saved(self) -> Optional[int]:
+    """ Bytes not downloaded thanks to the early stop, None if the size of the page is unknown.
+    """
+    if self.complete:
+      return 0
+    if self.bytes_total is None:
+      return None
+    return self.bytes_total - self.bytes_read
+
+def stream_until_locator(client: HttpClient, url: str, locator: PageLocator, deadline: Deadline = None) -> StreamResult:
+  """ Download a page chunk by chunk, feeding an incremental parser, and stop reading as soon as
+    the element matched by the locator has been closed. If the locator never matches, the whole
+    page is read, which is the same as a full fetch.
+
+  Args:
+    client (HttpClient): The http client.
+    url (str): The url of the page.
+    locator (PageLocator): The locator of the content of the page.
+    deadline (Deadline): The download is abandoned with `DeadlineExceeded` when it passes.
+
+  Returns:
+    StreamResult: The source to parse, and how many bytes have been read or saved.
+  """
+  res = client.get(url, stream=True, deadline=deadline)
+  try:
+    content_length = res.headers.get("Content-Length")
+    bytes_total = int(content_length) if content_length and content_length.isdigit() else None
+    chunks: List[bytes] = []
+    pieces: List[str] = []
+    watcher = LocatorWatcher(locator.html_tag, locator.css_class)
+    decoder = None
+    charset = None
+    for chunk in iter_body(res, STREAM_CHUNK_SIZE, deadline):
+      chunks.append(chunk)
+      if decoder is None:
+        charset = sniff_charset(res.headers.get("Content-Type"), chunk)
+        try:
+          decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+        except LookupError:
+          charset = DEFAULT_CHARSET
+          decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+      piece = decoder.decode(chunk)
+      pieces.append(piece)
+      watcher.feed(piece)
+      if watcher.done:
+        text = "".join(pieces)
+        src = text[:_end_offset(text, watcher.closed_at)]
+        return StreamResult(src, charset, False, _bytes_read(res, chunks), bytes_total, res.status_code, res.headers)
+
+    # The locator never matched (or never closed), so the whole body has been read
+    body = b"".join(chunks)
+    if charset is None:
+      charset = sniff_charset(res.headers.get("Content-Type"), body)
+    return StreamResult(body, charset, True, _bytes_read(res, chunks), bytes_total, res.status_code, res.headers)
+  finally:
+    # Closing before the end drops the rest of the body together with the connection
+    res.close()
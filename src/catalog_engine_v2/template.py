@@ -3,6 +3,7 @@
   This file work extract the information from the template 
 """
 
+import copy
 import os
 from typing import Dict
 import bs4
@@ -12,6 +13,7 @@ import dill as pickle
 
 from .const import *
 from .page import Page
+from .parser import parse_html
 from .utils import load_json_locators, request_json_from_api
 from .explorer import CourseExplorer, CoursePage
 
@@ -44,6 +46,7 @@ class Template:
     self.verbose = verbose
     self.locators_data = self.__load_locators()
     self.template_src = self.__read_template_file(self.template_path)
+    self.skeleton: BeautifulSoup = None # The parsed template, see `__template_parts()`
     self.data_path = data_path
 
     if not os.path.exists(data_path):
@@ -71,20 +74,17 @@ class Template:
       return data
     return None
 
-  def insight(self):
-    # TODO: Currently reaching maximum recursion depth, CAUSING ERROR
-    # id_to_page_path = os.path.join(self.data_path, DEFAULT_SAVED_PICKLE_PAGE_DATA_FILE_NAME)
-    # # If the data exists, no need to crawl any more
-    # if os.path.exists(id_to_page_path):
-      
-    #   with open(id_to_page_path, "rb") as f:
-    #     self.id_to_page = pickle.load(f)
-    #   print("The data exists, simply load the data.")
-    #   return
+  def __template_parts(self):
+    """ Fresh copies of the table of content (before the `<hr>` separator) and of the content
+      (after it) of the template, which is parsed only once.
 
-    soup = BeautifulSoup(self.template_src, 'html.parser')
-    toc_soup = BeautifulSoup(self.template_src, 'html.parser').body
-    all_content_soup = BeautifulSoup(self.template_src, 'html.parser').body
+    Returns:
+      (bs4.Tag, bs4.Tag): The `body` of the template cut to its toc, and cut to its content.
+    """
+    if self.skeleton is None:
+      self.skeleton = parse_html(self.template_src, PARSE_STAGE.template)
+    toc_soup = copy.copy(self.skeleton.body)
+    all_content_soup = copy.copy(self.skeleton.body)
 
     # Extract the toc by the `\<hr\>` tag => in toc_soup
     hr_separator = toc_soup.find_all('hr')[0]
@@ -92,28 +92,44 @@ class Template:
       tag.extract()
     hr_separator.extract()
 
-    # Test toc -> ok
-    # for i, tag in enumerate(toc_soup.find_all()):
-    #   print(f"{i}: {tag}")
-
     # Extract the body by the `\<hr\>` tag => in all_content_soup
     hr_separator = all_content_soup.find_all('hr')[0]
     for tag in hr_separator.find_previous_siblings():
       tag.extract()
     hr_separator.extract()
+    return toc_soup, all_content_soup
 
+  @staticmethod
+  def __walk(all_content_soup: bs4.Tag):
+    """ Every tag of the content after the first one, with the last header before it. The same
+      walk finds the pages in `insight()` and fills them in `generate()`.
+
+    Returns:
+      Iterator[(bs4.Tag, bs4.Tag)]: The header and the tag, which is a header itself or a `div`
+        holding a link.
+    """
     # Loop through every elements
     first_tag_pointer = all_content_soup.find_all()[0]
-    # print(first_tag_pointer)
-    current_page_header: bs4.BeautifulSoup = None
-    for i, tag in enumerate(first_tag_pointer.find_next_siblings()):
+    current_page_header: bs4.Tag = None
+    for tag in first_tag_pointer.find_next_siblings():
+      if tag.name != 'div':
+        current_page_header = tag
+      yield current_page_header, tag
 
-      # Debugging for courses pages only
-      # if i < 80:
-      #   continue
+  def insight(self):
+    # TODO: Currently reaching maximum recursion depth, CAUSING ERROR
+    # id_to_page_path = os.path.join(self.data_path, DEFAULT_SAVED_PICKLE_PAGE_DATA_FILE_NAME)
+    # # If the data exists, no need to crawl any more
+    # if os.path.exists(id_to_page_path):
+      
+    #   with open(id_to_page_path, "rb") as f:
+    #     self.id_to_page = pickle.load(f)
+    #   print("The data exists, simply load the data.")
+    #   return
 
-      # print(f"{i}: {tag}")
+    toc_soup, all_content_soup = self.__template_parts()
 
+    for current_page_header, tag in self.__walk(all_content_soup):
       # If it is contained in a div, then it is a link
       if tag.name == 'div':
         assert "id" in current_page_header.attrs, "Unexpected error: Wrong current_page_header behavior!"
@@ -129,14 +145,6 @@ class Template:
         self.id_to_page[current_page_header["id"]] = this_page
         if self.verbose:
           print(this_page)
-
-      # Otherwise, it is a header
-      else:
-        current_page_header = tag
-        # print(current_page_header)
-
-      # if i == 150:
-      #   break
     
     # Save the pickle serialized data inside the data folder
     # TODO: Currently reaching maximum recursion depth, CAUSING ERROR
@@ -161,32 +169,10 @@ class Template:
   def generate(self) -> str:
     content = ""
     
-    soup = BeautifulSoup(self.template_src, 'html.parser')
-    toc_soup = BeautifulSoup(self.template_src, 'html.parser').body
-    all_content_soup = BeautifulSoup(self.template_src, 'html.parser').body
+    toc_soup, all_content_soup = self.__template_parts()
 
-    # Extract the toc by the `\<hr\>` tag => in toc_soup
-    hr_separator = toc_soup.find_all('hr')[0]
-    for tag in hr_separator.find_next_siblings():
-      tag.extract()
-    hr_separator.extract()
-
-    # Test toc -> ok
-    # for i, tag in enumerate(toc_soup.find_all()):
-    #   print(f"{i}: {tag}")
-
-    # Extract the body by the `\<hr\>` tag => in all_content_soup
-    hr_separator = all_content_soup.find_all('hr')[0]
-    for tag in hr_separator.find_previous_siblings():
-      tag.extract()
-    hr_separator.extract()
-
-    # Loop through every elements
-    first_tag_pointer = all_content_soup.find_all()[0]
-    # print(first_tag_pointer)
     current_course_subject: str = None
-    current_page_header: bs4.BeautifulSoup = None
-    for i, tag in enumerate(first_tag_pointer.find_next_siblings()):
+    for current_page_header, tag in self.__walk(all_content_soup):
       # If it is contained in a div, then it is a link
       if tag.name == 'div':
         if current_page_header.text.strip() == "Courses": # If it is courses crawling, then we have two cases
@@ -232,7 +218,6 @@ class Template:
 
       # Otherwise, it is a header
       else:
-        current_page_header = tag
         # print(self.course_explorer.subjects_dict)
         # print(f"Searching {tag.text.strip()} to {self.course_explorer.subjects_dict.keys()} => {tag in self.course_explorer.subjects_dict.keys()}")
         
@@ -3,15 +3,32 @@
   This file work extract the information from the template 
 """
 
+import copy
 import os
-from typing import Dict, List
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 import bs4
 from bs4 import BeautifulSoup
 from datetime import date
 
 from .const import *
-from .page import Page
+from .cache import CrawlCache
+from .client import HttpClient
+from .deadline import Deadline
+from .fetcher import FetchEngine
+from .journal import CrawlJournal
+from .parser import get_parser_factory, parse_html
+from .page import Page, resolve_locator
+from .singleflight import SingleFlight
+from .slotplan import SlotPlan, SlotPlanStore, template_key
 from .utils import load_json_locators, request_json_from_api
+from .worker import CrawlWorker, POLL_SECONDS, page_payload
+from .workqueue import WorkQueue
 from .explorer import CourseExplorer, CoursePage, CoursePage_v2
 
 class Template:
@@ -25,12 +42,34 @@ class Template:
       course_crawling_mode=COURSE_CRAWLING_MODE.raw, 
       course_explorer: CourseExplorer = None,
       data_path: str=None,
-      verbose=True
+      verbose=True,
+      client: HttpClient = None,
+      cache: CrawlCache = None,
+      parses: SingleFlight = None,
+      stream: bool = False,
+      journal: CrawlJournal = None,
+      page_deadline: float = DEFAULT_PAGE_DEADLINE,
+      run_deadline: float = None,
+      max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+      strain: bool = True
     ) -> None:
     """ initializer
 
     Args:
       template_path (str): Path to template file. Defaults to '../data/template.html'.
+      client (HttpClient): The shared http client used to crawl every page. A new one is created if not given.
+      cache (CrawlCache): The shared page cache. Pages are always crawled if not given.
+      parses (SingleFlight): Shares one fetch and parse between the template slots of the same url.
+      stream (bool): Stop downloading each uncached page once its located element is closed.
+      journal (CrawlJournal): Records every extracted page. The pages already in the journal of a
+        resumed run are restored from it instead of being crawled again.
+      page_deadline (float): Seconds a page may take to crawl, retries included. A page missing it
+        is left blank. None means no limit.
+      run_deadline (float): Seconds `insight()` may take. The pages not crawled by then are left
+        blank. None means no limit.
+      max_concurrency (int): Number of pages crawled and extracted at the same time by `insight()`.
+      strain (bool): Only build the located element of each page when parsing it, instead of the
+        whole page.
     """
     self.template_path = template_path
     self.locators_path = locators_path
@@ -41,12 +80,25 @@ class Template:
     self.course_crawling_mode = course_crawling_mode # either "api" or "raw"
     self.course_explorer = course_explorer
     self.verbose = verbose
+    # Every page of the template is crawled through this one client
+    self.client = client if client is not None else HttpClient(pool_maxsize=max_concurrency)
+    self.cache = cache
+    self.parses = parses if parses is not None else SingleFlight()
+    self.stream = stream
+    self.journal = journal
+    self.page_deadline = page_deadline
+    self.run_deadline = run_deadline
+    self.max_concurrency = max_concurrency
+    self.strain = strain
     self.locators_data = self.__load_locators()
     self.template_src = self.__read_template_file(self.template_path)
+    self.skeleton: BeautifulSoup = None # The parsed template, see `__template_skeleton()`
     self.data_path = data_path
 
     if not os.path.exists(data_path):
       os.mkdir(data_path)
+    self.plans = SlotPlanStore(os.path.join(data_path, DEFAULT_TEMPLATE_PLAN_FOLDER_NAME))
+    self.plan: SlotPlan = None # The compiled template, see `slot_plan()`
 
     # The actual data
     self.id_to_page: Dict[str, Page] = {}
@@ -81,53 +133,321 @@ class Template:
     #   print("The data exists, simply load the data.")
     #   return
 
-    soup = BeautifulSoup(self.template_src, 'html.parser')
-    header_soup = BeautifulSoup(self.template_src, 'html.parser').body.find("header")
-    toc_soup = BeautifulSoup(self.template_src, 'html.parser').body.find("nav")
-    all_content_soup = BeautifulSoup(self.template_src, 'html.parser').body.find("main")
-    
-    for i, section in enumerate(all_content_soup.find_all("section")):
+    # The crawl plan: restore the pages a previous run already extracted, and create the others
+    # without any network i/o. Slots sharing an html id are the same page, and the last one is kept.
+    plan = self.crawl_plan()
+    pages, to_load = self.__plan_pages(plan)
+
+    # Then every fetch and extraction of the plan runs as one batch
+    run_deadline = Deadline(self.run_deadline)
+    FetchEngine(self.max_concurrency).map(lambda slot: self.__load_page(pages[slot["html_id"]], slot, run_deadline), to_load)
+
+    for slot in plan:
+      this_page = pages[slot["html_id"]]
+      self.id_to_page[slot["html_id"]] = this_page
+      if self.verbose:
+        print(this_page)
 
-      # Loop through every elements
-      first_tag_pointer = section.find_all()[0]
-      current_page_header: bs4.BeautifulSoup = first_tag_pointer
-      
-      for j, tag in enumerate(first_tag_pointer.find_next_siblings()):
-
-        # print(f"section: {i}, tag {j}: {tag}")
-        
-        # If it is contained in a div, then it is a link
-        if tag.name == 'div':
-          assert "id" in current_page_header.attrs, "Unexpected error: Wrong current_page_header behavior!"
-          
-          # Get the code html tag that contain the link for content to be replaced there!
-          url_code_block = tag.find("code")
-
-          # Because there can be a short_version text that does not require ontent to be there, we don't necessarily force
-          # it to always having the link there.
-          if url_code_block != None:
-            url = url_code_block.find("a") # Get the first and only link in the code html block
-            # Create a page
-            this_page = Page(
-              page_tag=PAGE_TAG.COURSE_PROG,
-              html_id=current_page_header["id"],
-              header_level=current_page_header.name,
-              locators_data=self.locators_data,
-              url=url["href"]
-            )
-            self.id_to_page[current_page_header["id"]] = this_page
-            if self.verbose:
-              print(this_page)
-
-        # Otherwise, it is a header
-        else:
-          current_page_header = tag
-          # print(current_page_header)
-      
       # Save the pickle serialized data inside the data folder
       # TODO: Currently reaching maximum recursion depth, CAUSING ERROR
       # self.__save_id_to_page_data()
 
+    if self.verbose:
+      self.__print_run_report()
+
+  def __plan_pages(self, plan: List[Dict]):
+    """ The page of every html id of a crawl plan, restored from the journal or created lazily.
+
+    Returns:
+      (Dict[str, Page], List[Dict]): The pages by html id, and the slots of the pages to load.
+    """
+    pages: Dict[str, Page] = {}
+    to_load: List[Dict] = []
+    for html_id, slot in {slot["html_id"]: slot for slot in plan}.items():
+      pages[html_id] = self.__restore_page(slot)
+      if pages[html_id] is None:
+        pages[html_id] = self.__build_page(slot)
+        to_load.append(slot)
+    return pages, to_load
+
+  def __build_page(self, slot: Dict) -> Page:
+    """ Create the page of a slot, without crawling it yet.
+    """
+    return Page(
+      page_tag=PAGE_TAG.COURSE_PROG,
+      html_id=slot["html_id"],
+      header_level=slot["header_level"],
+      locators_data=self.locators_data,
+      url=slot["url"],
+      client=self.client,
+      cache=self.cache,
+      parses=self.parses,
+      stream=slot["stream"],
+      strain=slot["strain"],
+      lazy=True
+    )
+
+  def __load_page(self, page: Page, slot: Dict, run_deadline: Deadline) -> Page:
+    """ Crawl and extract a page within its deadline, then journal it. Whatever goes wrong, the
+      page is loaded, blank if need be, so one page never aborts the catalog.
+    """
+    if run_deadline.expired:
+      page.set_blank("not crawled, the run missed its deadline")
+      return page
+    try:
+      page.load(deadline=run_deadline.within(self.page_deadline))
+    except Exception as e:
+      if self.verbose:
+        print(f"Failed extracting url: {slot['url']} ({e!r})")
+      page.set_blank(f"failed extracting ({e!r})")
+    self.__journal_page(page, slot)
+    return page
+
+  def degraded_report(self) -> Dict[str, str]:
+    """ The sections left with the "[CONTENT BLANK]" placeholder.
+
+    Returns:
+      Dict[str, str]: Map from the html id of the section to why it is blank.
+    """
+    return {html_id: page.blank_reason for html_id, page in self.id_to_page.items() if page.blank_reason is not None}
+
+  def __print_run_report(self) -> None:
+    """ Print what the crawl of the pages saved, cost and left blank.
+    """
+    if self.stream:
+      bytes_saved = self.stream_report()
+      print(f"Streaming saved {sum(b for b in bytes_saved.values() if b)} bytes over {len(bytes_saved)} pages")
+    print(f"Extraction took {sum(self.extract_report().values()):.3f}s over {len(self.id_to_page)} pages")
+    self.print_degraded_report()
+
+  def print_degraded_report(self) -> None:
+    degraded = self.degraded_report()
+    print(f"{len(degraded)} of {len(self.id_to_page)} sections are degraded to \"[CONTENT BLANK]\"")
+    for html_id, reason in degraded.items():
+      print(f"  {html_id}: {reason}")
+
+  def __template_skeleton(self) -> BeautifulSoup:
+    """ The template, parsed once. It is never modified: `compile_plan()` marks copies of its parts.
+    """
+    if self.skeleton is None:
+      self.skeleton = parse_html(self.template_src, PARSE_STAGE.template)
+    return self.skeleton
+
+  def __template_parts(self):
+    """ Fresh copies of the header, the table of content and the content of the template.
+
+    Returns:
+      (bs4.Tag, bs4.Tag, bs4.Tag): The `header`, `nav` and `main` of the template.
+    """
+    body = self.__template_skeleton().body
+    return copy.copy(body.find("header")), copy.copy(body.find("nav")), copy.copy(body.find("main"))
+
+  @staticmethod
+  def __walk_section(section: bs4.Tag):
+    """ Every `div` of a template section, which holds the link of a page, with the header it
+      follows, in template order.
+
+    Args:
+      section (bs4.Tag): The `section` of the template.
+
+    Returns:
+      Iterator[(bs4.Tag, bs4.Tag)]: The header and the `div`.
+    """
+    # Loop through every elements
+    first_tag_pointer = section.find_all()[0]
+    current_page_header: bs4.Tag = first_tag_pointer
+    for tag in first_tag_pointer.find_next_siblings():
+      # If it is contained in a div, then it is a link
+      if tag.name == 'div':
+        yield current_page_header, tag
+      # Otherwise, it is a header
+      else:
+        current_page_header = tag
+
+  def slot_plan(self) -> SlotPlan:
+    """ The compiled template, loaded from the plan store, or compiled and stored the first time
+      the template is seen.
+    """
+    if self.plan is None:
+      key = template_key(self.template_src, get_parser_factory().backend(PARSE_STAGE.template))
+      self.plan = self.plans.get(key)
+      if self.plan is None:
+        self.plan = self.compile_plan(key)
+        self.plans.put(self.plan)
+    return self.plan
+
+  def compile_plan(self, key: str) -> SlotPlan:
+    """ Compile the template into its slot plan. This is the only place the template is parsed.
+
+    Args:
+      key (str): The key of the template.
+
+    Returns:
+      SlotPlan: The plan.
+    """
+    header_soup, toc_soup, all_content_soup = self.__template_parts()
+    # Every point where the output differs from the template is marked, then cut out of the serialized document
+    marker = uuid.uuid4().hex
+    markers = [f"{marker}-date"]
+    slots = []
+    links = []
+    for i, section in enumerate(all_content_soup.find_all("section")):
+      for current_page_header, tag in self.__walk_section(section):
+        assert "id" in current_page_header.attrs, "Unexpected error: Wrong current_page_header behavior!"
+
+        # Get the code html tag that contain the link for content to be replaced there!
+        url_code_block = tag.find("code")
+
+        # Because there can be a short_version text that does not require ontent to be there, we don't necessarily force
+        # it to always having the link there.
+        if url_code_block != None:
+          url = url_code_block.find("a") # Get the first and only link in the code html block
+          slots.append({
+            "section": i,
+            "html_id": current_page_header["id"],
+            "level": current_page_header.name,
+            "url": url["href"],
+            "courses": current_page_header.text.strip().split()[-1] == "Courses",
+          })
+          links.append(url_code_block.decode(eventual_encoding="utf8"))
+          markers += [f"{marker}-{len(slots)}-link", f"{marker}-{len(slots)}-splice"]
+          url_code_block.replace_with(markers[-2])
+          tag.append(markers[-1])
+
+    document = self.__assemble(header_soup, toc_soup, all_content_soup, markers[0])
+    return SlotPlan.from_document(key, document.encode("utf8").decode("utf8"), markers, slots, links)
+
+  def crawl_plan(self) -> List[Dict]:
+    """ Every template slot with a link to a page, in template order.
+
+    Returns:
+      List[Dict]: The index of the template section, the html id and level of the slot header,
+        the url of the page, the locator of its content, whether the page is streamed or strained
+        and whether its subject abbreviations are needed (courses page in api mode).
+    """
+    slots = []
+    for slot in self.slot_plan().slots:
+      # In api mode, the subject abbreviations are searched in the whole courses page, so it is never streamed nor strained
+      is_api_courses = self.course_crawling_mode == COURSE_CRAWLING_MODE.api and slot["courses"]
+      slots.append({
+        "section": slot["section"],
+        "html_id": slot["html_id"],
+        "header_level": slot["level"],
+        "url": slot["url"],
+        "locator": resolve_locator(PAGE_TAG.COURSE_PROG, slot["html_id"], self.locators_data),
+        "stream": self.stream and not is_api_courses,
+        "strain": self.strain and not is_api_courses,
+        "with_subject_abbrs": is_api_courses,
+      })
+    return slots
+
+  def __restore_page(self, slot: Dict, record: Dict = None) -> Page:
+    """ Build the page of a slot from a record, by default its record in the journal.
+
+    Returns:
+      Page: The restored page, None if there is no record for the url of the slot.
+    """
+    if record is None and self.journal is not None:
+      record = self.journal.get("page", slot["html_id"])
+    if record is None or record["url"] != slot["url"]:
+      return None
+    return Page.from_record(
+      record,
+      page_tag=PAGE_TAG.COURSE_PROG,
+      html_id=slot["html_id"],
+      header_level=slot["header_level"],
+      locators_data=self.locators_data,
+      stream=slot["stream"]
+    )
+
+  def __journal_page(self, page: Page, slot: Dict) -> None:
+    # A page which failed crawling is still outstanding, so it is retried on resume
+    if self.journal is not None and (page.crawl_success or page.url.endswith(".pdf")):
+      self.journal.record("page", page.html_id, **page.to_record(with_subject_abbrs=slot["with_subject_abbrs"]))
+
+  def insight_distributed(self, queue_path: str, n_workers: int = os.cpu_count()) -> None:
+    """ Same as `insight()`, but the pages are crawled and extracted by worker processes pulling
+      jobs from a shared SQLite work queue. This process is the coordinator: it fills the queue,
+      starts `n_workers` local workers, waits until every job is finished and assembles the pages
+      in template order. More workers, on other machines sharing the queue and cache folders, may
+      join with `python -m catalog_engine_v2.worker --queue QUEUE --cache CACHE`.
+
+    Args:
+      queue_path (str): The work queue file. Its previous jobs are dropped.
+      n_workers (int): Number of local worker processes. With 0, the coordinator only waits for
+        remote workers.
+    """
+    # Slots sharing an html id are the same page, and the last one is kept as in `insight()`
+    slots = {slot["html_id"]: slot for slot in self.crawl_plan()}
+    queue = WorkQueue(queue_path)
+    queue.reset()
+    queue.set_meta("locators", self.locators_data)
+    # The workers crawl with the same settings as `insight()`: the sitemap is shared through the
+    # queue, and the cache budget and the parser backends through the command line
+    if self.cache is not None and self.cache.sitemap is not None:
+      queue.set_meta("sitemap", self.cache.sitemap.lastmods)
+    queue.put_many([
+      (html_id, page_payload(html_id, slot["header_level"], slot["url"], slot["stream"], slot["with_subject_abbrs"], self.page_deadline, slot["strain"]))
+      for html_id, slot in slots.items() if self.__restore_page(slot) is None
+    ])
+
+    command = [sys.executable, "-m", "catalog_engine_v2.worker", "--queue", os.path.abspath(queue_path)]
+    factory = get_parser_factory()
+    command += ["--parser", factory.default]
+    for stage, backend in factory.stages.items():
+      command += ["--stage-parser", f"{stage}={backend}"]
+    if self.cache is not None:
+      command += ["--cache", os.path.abspath(self.cache.root)] + (["--revalidate"] if self.cache.revalidate else [])
+      if self.cache.max_bytes is not None:
+        command += ["--max-bytes", str(self.cache.max_bytes)]
+    # The workers import the package from the folder it lives in
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [subprocess.Popen(command, cwd=package_root) for _ in range(n_workers)]
+    while queue.outstanding() > 0:
+      if workers and all(worker.poll() is not None for worker in workers):
+        # Every local worker died, so the coordinator finishes the work itself
+        CrawlWorker(queue, client=self.client, cache=self.cache).run()
+        break
+      time.sleep(POLL_SECONDS)
+    for worker in workers:
+      worker.wait()
+
+    results = queue.results()
+    errors = queue.errors()
+    queue.close()
+    if self.verbose and errors:
+      print(f"Gave up {len(errors)} pages: {list(errors)}")
+
+    for html_id, slot in slots.items():
+      this_page = self.__restore_page(slot)
+      if this_page is None:
+        # A job given up without any result (its workers kept dying) leaves its slot blank
+        record = results.get(html_id, Page.blank_record(slot["url"], f"failed in every worker ({errors.get(html_id)})"))
+        this_page = self.__restore_page(slot, record)
+        self.__journal_page(this_page, slot)
+      self.id_to_page[html_id] = this_page
+      if self.verbose:
+        print(this_page)
+    if self.verbose:
+      self.print_degraded_report()
+
+  def stream_report(self) -> Dict[str, int]:
+    """ Bytes saved by the streaming mode on each page.
+
+    Returns:
+      Dict[str, int]: Map from the html id of the page to the bytes not downloaded, None if unknown.
+    """
+    return {html_id: page.bytes_saved for html_id, page in self.id_to_page.items() if page.stream}
+
+  def extract_report(self) -> Dict[str, float]:
+    """ Seconds spent extracting the content of each page out of its parsed html.
+
+    Returns:
+      Dict[str, float]: Map from the html id of the page to its extraction seconds, 0 if the page
+        has been restored or left blank.
+    """
+    return {html_id: page.extract_seconds for html_id, page in self.id_to_page.items()}
+
   def clear_cached_data(self):
     id_to_page_path = os.path.join(self.data_path, DEFAULT_SAVED_PICKLE_PAGE_DATA_FILE_NAME)
     if os.path.exists(id_to_page_path):
@@ -144,92 +464,46 @@ class Template:
     # Driver - which can show the website temporarily using seleniums - class involved?
     pass
 
-  def generate(self) -> str:
-    
-    soup = BeautifulSoup(self.template_src, 'html.parser')
-    header_soup = BeautifulSoup(self.template_src, 'html.parser').body.find("header")
-    toc_soup = BeautifulSoup(self.template_src, 'html.parser').body.find("nav")
-    all_content_soup = BeautifulSoup(self.template_src, 'html.parser').body.find("main")
+  def __slot_content(self, slot: Dict) -> Optional[str]:
+    """ The serialized content of a template slot.
 
-    for i, section in enumerate(all_content_soup.find_all("section")):
+    Args:
+      slot (Dict): The slot of the slot plan.
+
+    Returns:
+      str: The content, None if the slot has no page and keeps its link.
+    """
+    if slot["courses"] and self.course_crawling_mode == COURSE_CRAWLING_MODE.api:
+      # CoursePage v2, create course page based on list of subject area abbreviation
+      # First of all, get all the subject abbreviation in the content page 
+      subject_abbrs: List[str] = self.id_to_page[slot["html_id"]].get_subject_abbrs()
+
+      # Second, get from the actual page content
+      content = CoursePage_v2(subject_abbrs=subject_abbrs, data=self.course_explorer.data).gen_all_courses_for_this_subject()
+    elif slot["html_id"] in self.id_to_page.keys():
+      content = self.id_to_page[slot["html_id"]].generate()
+    else:
+      return None
 
-      # Loop through every elements
-      first_tag_pointer = section.find_all()[0]
-
-      current_course_subject: str = None
-      current_page_header: bs4.BeautifulSoup = first_tag_pointer
-      for j, tag in enumerate(first_tag_pointer.find_next_siblings()):
-        # If it is contained in a div, then it is a link
-        if tag.name == 'div':
-          if current_page_header.text.strip().split()[-1] == "Courses": # If it is courses crawling, then we have two cases
-            if self.course_crawling_mode == COURSE_CRAWLING_MODE.api:
-              # TODO: Working on course crawling api here
-              # Exclude the link
-              tag_link = tag.find("code")
-
-              # if there is no link (`code` html tag, we can concatenate that content to
-              # the current tag, and continue)
-              if tag_link == None:
-                continue
-              
-              # do work
-              tag_link.extract()
-
-              # CoursePage v1, create course page based on the subject name
-              # Create a new course page (department name)
-              # NOTE: CoursePage v1 deprecated.
-              # course_page = CoursePage(subject_name=current_course_subject, data=self.course_explorer.data)
-              
-              # CoursePage v2, create course page based on list of subject area abbreviation
-              # First of all, get all the subject abbreviation in the content page 
-              subject_abbrs: List[str] = self.id_to_page[current_page_header["id"]].get_subject_abbrs()
-
-              # Second, get from the actual page content
-              course_page_v2 = CoursePage_v2(subject_abbrs=subject_abbrs, data=self.course_explorer.data)
-
-              # for page_child_tag in course_page.gen_all_courses_for_this_subject().find_all(recursive=False):
-              #   tag.append(page_child_tag)
-
-              for page_child_tag in course_page_v2.gen_all_courses_for_this_subject().find_all(recursive=False):
-                tag.append(page_child_tag)
-                  
-            elif self.course_crawling_mode == COURSE_CRAWLING_MODE.raw:
-              # We are generating based on raw html crawled pages
-              if current_page_header["id"] in self.id_to_page.keys():
-                # Exclude the link
-                tag_link = tag.find("code")
-                tag_link.extract()
-
-                # Append the content of that page into the children list of the tag
-                # tag.append(self.id_to_page[current_page_header["id"]].generate())
-
-                # Append each piece of the content of that page into the children list of the tag
-                for page_child_tag in self.id_to_page[current_page_header["id"]].generate().find_all(recursive=False):
-                  tag.append(page_child_tag)
-                  
-          else: # else, we have one case!
-            if current_page_header["id"] in self.id_to_page.keys():
-              # Exclude the link
-              tag_link = tag.find("code")
-              tag_link.extract()
-
-              # Append the content of that page into the children list of the tag
-              # tag.append(self.id_to_page[current_page_header["id"]].generate())
-
-              # Append each piece of the content of that page into the children list of the tag
-              for page_child_tag in self.id_to_page[current_page_header["id"]].generate().find_all(recursive=False):
-                tag.append(page_child_tag)
-
-        # Otherwise, it is a header
-        else:
-          current_page_header = tag
-          # print(self.course_explorer.subjects_dict)
-          # print(f"Searching {tag.text.strip()} to {self.course_explorer.subjects_dict.keys()} => {tag in self.course_explorer.subjects_dict.keys()}")
-          
-          if tag.text.strip() in self.course_explorer.subjects_dict.keys():
-            current_course_subject = tag.text.strip()
-            # print(current_course_subject)
+    # A page that could not be crawled or located only has the "[CONTENT BLANK]" placeholder
+    if isinstance(content, str):
+      return bs4.NavigableString(content).output_ready()
+    return "".join(page_child_tag.decode(eventual_encoding="utf8") for page_child_tag in content.find_all(recursive=False))
 
+  def __generated_on(self) -> str:
+    # https://www.programiz.com/python-programming/datetime/current-datetime
+    today = date.today()
+    # Textual month, day and year	
+    today_string = today.strftime(r"%B %d, %Y")
+    return bs4.NavigableString(f" generated on {today_string}.").output_ready()
+
+  def generate(self) -> str:
+    plan = self.slot_plan()
+    return "".join(plan.splice(self.__generated_on(), (self.__slot_content(slot) for slot in plan.slots)))
+
+  def __assemble(self, header_soup: bs4.Tag, toc_soup: bs4.Tag, all_content_soup: bs4.Tag, generated_on: str) -> BeautifulSoup:
+    """ Put the header, the table of content and the content of the template into the output document.
+    """
     original_html_string = \
 """
 <!DOCTYPE html>
@@ -242,18 +516,91 @@ class Template:
 </html>
 """
 
-    main_soup = BeautifulSoup(original_html_string, "html.parser")
+    main_soup = parse_html(original_html_string, PARSE_STAGE.template)
     
     # Modify the date variable header_soup 
-    # https://www.programiz.com/python-programming/datetime/current-datetime
-    today = date.today()
-    # Textual month, day and year	
-    today_string = today.strftime(r"%B %d, %Y")
     header_soup_content_list = header_soup.find("section").find_all(recursive=False)
-    header_soup_content_list[len(header_soup_content_list) - 1].string = f" generated on {today_string}."
+    header_soup_content_list[len(header_soup_content_list) - 1].string = generated_on
 
     main_soup.body.append(header_soup)
     main_soup.body.append(toc_soup)
     main_soup.body.append(all_content_soup)
     return main_soup
-    
\ No newline at end of file
+    
+
+  def generate_pipelined(self, out_path: str, max_buffered: int = DEFAULT_PIPELINE_BUFFER) -> None:
+    """ `insight()` then `generate()` as one pipeline: the pages are crawled in template order, and
+      every section of the template is rendered and written to the output file as soon as all of
+      its pages are ready, while the pages of the next sections are still downloading. The file
+      gets the same bytes as `generate()` encoded in utf8.
+
+    Args:
+      out_path (str): The output html file.
+      max_buffered (int): Backpressure of the crawl. No page of a later section starts while this
+        many crawled pages wait for their section to be written. The pages of the section being
+        written always start, so the pipeline never stalls.
+    """
+    plan = self.crawl_plan()
+    pages, to_load = self.__plan_pages(plan)
+    for slot in plan:
+      self.id_to_page[slot["html_id"]] = pages[slot["html_id"]]
+
+    # A page is needed as soon as the first section with one of its slots is written
+    first_section: Dict[str, int] = {}
+    for slot in plan:
+      first_section.setdefault(slot["html_id"], slot["section"])
+    to_load.sort(key=lambda slot: first_section[slot["html_id"]])
+    n_to_load = [0] * (max(first_section.values(), default=-1) + 1)
+    for slot in to_load:
+      n_to_load[first_section[slot["html_id"]]] += 1
+
+    run_deadline = Deadline(self.run_deadline)
+    condition = threading.Condition()
+    window = {"writing": 0, "buffered": 0}
+
+    def load(slot: Dict) -> Page:
+      section = first_section[slot["html_id"]]
+      with condition:
+        condition.wait_for(lambda: section <= window["writing"] or window["buffered"] < max_buffered)
+        window["buffered"] += 1
+      return self.__load_page(pages[slot["html_id"]], slot, run_deadline)
+
+    executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+    try:
+      # Submitted in template order, so the pages of the earlier sections are crawled first
+      futures = {slot["html_id"]: executor.submit(load, slot) for slot in to_load}
+
+      compiled = self.slot_plan()
+
+      def fills():
+        for section_index in range(compiled.n_sections):
+          # What is written so far stays readable while the section waits for its pages
+          f.flush()
+          section_slots = [slot for slot in compiled.slots if slot["section"] == section_index]
+          for slot in section_slots:
+            if slot["html_id"] in futures:
+              futures[slot["html_id"]].result()
+          section_fills = [self.__slot_content(slot) for slot in section_slots]
+          if self.verbose:
+            for slot in section_slots:
+              print(pages[slot["html_id"]])
+          with condition:
+            if section_index < len(n_to_load):
+              window["buffered"] -= n_to_load[section_index]
+            window["writing"] = section_index + 1
+            condition.notify_all()
+          yield from section_fills
+
+      # The document is written piece by piece, each section as soon as its pages are ready
+      with open(out_path, "wb") as f:
+        for piece in compiled.splice(self.__generated_on(), fills()):
+          f.write(piece.encode("utf8"))
+    finally:
+      # Let every waiting crawl through if the writing stopped early
+      with condition:
+        window["writing"] = len(n_to_load)
+        condition.notify_all()
+      executor.shutdown(cancel_futures=True)
+
+    if self.verbose:
+      self.__print_run_report()
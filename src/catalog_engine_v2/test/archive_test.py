@@ -0,0 +1,55 @@
+import pytest
+
+from ..archive import ArchiveMiss, HttpArchive, ReplayClient, open_client
+from ..links import LinkValidator
+from .conftest import html_page
+
+def test_recorded_responses_are_replayed(server, tmp_path):
+  # Bytes which are not valid utf8 must survive the round trip too
+  server.routes["/page"] = 200, {"Content-Type": "text/html; charset=latin-1", "ETag": '"1"'}, "<p>café</p>".encode("latin-1")
+  server.routes["/missing"] = 404, {}, b"Not here"
+  path = str(tmp_path / "run.json.gz")
+  with open_client(record_path=path) as client:
+    recorded = client.get(server.url("/page"))
+    client.get(server.url("/missing"))
+
+  with open_client(replay_path=path) as client:
+    assert isinstance(client, ReplayClient)
+    replayed = client.get(server.url("/page#top"))
+    assert client.get(server.url("/missing")).status_code == 404
+  assert replayed.status_code == 200
+  assert replayed.content == recorded.content
+  assert replayed.text == "<p>café</p>"
+  assert replayed.headers["etag"] == '"1"'
+  assert server.hits("/page") == 1
+
+def test_a_304_never_replaces_a_full_body(server, tmp_path):
+  def route(handler):
+    if handler.headers.get("If-None-Match"):
+      return 304, {}, b""
+    return 200, {"ETag": '"1"'}, b"<p>page</p>"
+  server.routes["/page"] = route
+  path = str(tmp_path / "run.json.gz")
+  with open_client(record_path=path) as client:
+    client.get(server.url("/page"))
+    client.get(server.url("/page"), headers={"If-None-Match": '"1"'})
+  assert HttpArchive(path).replay(server.url("/page")).content == b"<p>page</p>"
+
+def test_replaying_an_unrecorded_url_raises(tmp_path):
+  with pytest.raises(ArchiveMiss):
+    ReplayClient(HttpArchive(str(tmp_path / "empty.json.gz"))).get("http://127.0.0.1/page")
+
+def test_checked_links_are_recorded_and_replayed(server, tmp_path):
+  server.routes["/page"] = html_page("<p>page</p>")
+  server.routes["/link"] = html_page("<p>link</p>")
+  path = str(tmp_path / "run.json.gz")
+  with open_client(record_path=path) as client:
+    client.get(server.url("/page"))
+    recorded = LinkValidator(client).validate([server.url("/page"), server.url("/link"), server.url("/missing")])
+  # The HEAD request of a link never replaces the body of a page
+  assert b"<p>page</p>" in HttpArchive(path).replay(server.url("/page")).content
+
+  with open_client(replay_path=path) as client:
+    replayed = LinkValidator(client).validate([server.url("/page"), server.url("/link"), server.url("/missing")])
+  assert [result["status"] for result in replayed.values()] == [result["status"] for result in recorded.values()] == [200, 200, 404]
+  assert server.hits("/link", "HEAD") == 1
@@ -0,0 +1,150 @@
+import os
+import time
+import bs4
+
+from ..cache import CrawlCache, normalize_url, sniff_charset
+from ..client import HttpClient
+from ..const import DEFAULT_CHARSET
+from .conftest import html_page
+
+def test_spellings_of_an_url_share_one_key():
+  url = "https://www.gettysburg.edu/academic-programs/?a=1&b=2"
+  assert normalize_url("HTTPS://www.Gettysburg.edu:443/academic-programs/?b=2&a=1#top") == url
+  assert CrawlCache.key("HTTPS://www.Gettysburg.edu:443/academic-programs/?b=2&a=1#top") == CrawlCache.key(url)
+  assert CrawlCache.key(url) != CrawlCache.key("https://www.gettysburg.edu/academic-programs/other/")
+
+def test_a_page_is_fetched_once_across_spellings(server, tmp_path):
+  server.routes["/page/?a=1&b=2"] = html_page("<p>page</p>")
+  cache = CrawlCache(str(tmp_path))
+  with HttpClient() as client:
+    body, _ = cache.fetch(server.url("/page/?a=1&b=2"), client)
+    again, _ = cache.fetch(server.url("/page/?b=2&a=1#top"), client)
+  assert body == again == b"<p>page</p>"
+  assert server.hits("/page/?a=1&b=2") == 1
+  # A new cache on the same folder finds the entry too
+  assert CrawlCache(str(tmp_path)).get(server.url("/page/?a=1&b=2")) == b"<p>page</p>"
+
+def test_error_pages_are_not_cached(server, tmp_path):
+  server.routes["/missing"] = 404, {}, b"Not here"
+  cache = CrawlCache(str(tmp_path))
+  with HttpClient() as client:
+    assert cache.fetch_with_status(server.url("/missing"), client)[2] == 404
+    cache.fetch(server.url("/missing"), client)
+  assert server.url("/missing") not in cache
+  assert server.hits("/missing") == 2
+
+def etag_route(versions):
+  # Serves the last of `versions`, whose ETag is its index, and answers 304 when it is matched
+  def route(handler):
+    etag = f'"{len(versions) - 1}"'
+    if handler.headers.get("If-None-Match") == etag:
+      return 304, {"ETag": etag}, b""
+    return 200, {"Content-Type": "text/html; charset=utf-8", "ETag": etag}, versions[-1]
+  return route
+
+def test_revalidation_reuses_an_unchanged_page(server, tmp_path):
+  server.routes["/page"] = etag_route([b"<p>v0</p>"])
+  cache = CrawlCache(str(tmp_path), revalidate=True)
+  with HttpClient() as client:
+    cache.fetch(server.url("/page"), client)
+    body, _ = cache.fetch(server.url("/page"), client)
+  assert body == b"<p>v0</p>"
+  assert server.last_headers("/page")["If-None-Match"] == '"0"'
+  assert cache.stats()["not_modified"] == 1
+
+def test_revalidation_downloads_a_changed_page(server, tmp_path):
+  versions = [b"<p>v0</p>"]
+  server.routes["/page"] = etag_route(versions)
+  cache = CrawlCache(str(tmp_path), revalidate=True)
+  with HttpClient() as client:
+    cache.fetch(server.url("/page"), client)
+    versions.append(b"<p>v1</p>")
+    body, _ = cache.fetch(server.url("/page"), client)
+  assert body == b"<p>v1</p>"
+  assert cache.get(server.url("/page")) == b"<p>v1</p>"
+  assert cache.stats()["modified"] == 1
+
+def test_revalidation_refetches_a_page_without_validators(server, tmp_path):
+  server.routes["/page"] = html_page("<p>v0</p>")
+  cache = CrawlCache(str(tmp_path), revalidate=True)
+  with HttpClient() as client:
+    cache.fetch(server.url("/page"), client)
+    server.routes["/page"] = html_page("<p>v1</p>")
+    body, _ = cache.fetch(server.url("/page"), client)
+  assert body == b"<p>v1</p>"
+  assert "If-None-Match" not in server.last_headers("/page")
+  assert server.hits("/page") == 2
+
+def test_a_removed_body_is_a_miss(server, tmp_path):
+  server.routes["/page"] = html_page("<p>page</p>")
+  cache = CrawlCache(str(tmp_path))
+  with HttpClient() as client:
+    cache.fetch(server.url("/page"), client)
+    os.remove(os.path.join(str(tmp_path), cache.key(server.url("/page")) + ".html.gz"))
+    assert cache.get(server.url("/page")) is None
+    body, _ = cache.fetch(server.url("/page"), client)
+  assert body == b"<p>page</p>"
+  assert server.hits("/page") == 2
+
+def test_an_entry_evicted_during_revalidation_is_stored_again(server, tmp_path):
+  cache = CrawlCache(str(tmp_path), revalidate=True)
+  route = etag_route([b"<p>v0</p>"])
+  def evicting_route(handler):
+    if handler.headers.get("If-None-Match"):
+      os.remove(os.path.join(str(tmp_path), cache.key(server.url("/page")) + ".json"))
+    return route(handler)
+  server.routes["/page"] = evicting_route
+  with HttpClient() as client:
+    cache.fetch(server.url("/page"), client)
+    body, _ = cache.fetch(server.url("/page"), client)
+  assert body == b"<p>v0</p>"
+  assert cache.get(server.url("/page")) == b"<p>v0</p>"
+  assert cache.get_meta(server.url("/page"))["etag"] == '"0"'
+
+def test_the_declared_charset_is_sniffed():
+  assert sniff_charset("text/html; charset=ISO-8859-1", b"") == "iso-8859-1"
+  assert sniff_charset("text/html", b'<html><head><meta charset="windows-1252">') == "windows-1252"
+  assert sniff_charset(None, b'<meta http-equiv="Content-Type" content="text/html; charset=latin-1">') == "latin-1"
+  assert sniff_charset(None, b"<p>page</p>") == DEFAULT_CHARSET
+
+def test_raw_bytes_and_charset_go_through_the_cache(server, tmp_path):
+  src = "<html><head><meta charset=\"windows-1252\"></head><body><p>café – naïve</p></body></html>"
+  server.routes["/page"] = 200, {"Content-Type": "text/html"}, src.encode("windows-1252")
+  cache = CrawlCache(str(tmp_path))
+  with HttpClient() as client:
+    body, charset = cache.fetch(server.url("/page"), client)
+  assert body == src.encode("windows-1252")
+  assert charset == "windows-1252"
+  assert CrawlCache(str(tmp_path)).fetch(server.url("/page"), None) == (body, charset)
+  soup = bs4.BeautifulSoup(body, "html.parser", from_encoding=charset)
+  assert soup.p.text == "café – naïve"
+
+def test_the_least_recently_used_entries_are_evicted(tmp_path):
+  # Random bytes do not compress, so each entry takes a bit more than 1000 bytes
+  bodies = {f"https://www.gettysburg.edu/{i}/": os.urandom(1000) for i in range(3)}
+  a, b, c = bodies
+  cache = CrawlCache(str(tmp_path), max_bytes=2500)
+  cache.put(a, bodies[a])
+  time.sleep(0.01)
+  cache.put(b, bodies[b])
+  time.sleep(0.01)
+  assert cache.get(a) == bodies[a]
+  time.sleep(0.01)
+  cache.put(c, bodies[c])
+  assert a in cache and c in cache
+  assert b not in cache
+  assert cache.stats()["evictions"] == 1
+  assert cache.stats()["stored_bytes"] <= 2500
+  assert sorted(os.listdir(str(tmp_path))) == sorted(CrawlCache.key(url) + ext for url in [a, c] for ext in [".html.gz", ".json"])
+
+def test_the_budget_is_kept_across_runs(tmp_path):
+  urls = [f"https://www.gettysburg.edu/{i}/" for i in range(4)]
+  cache = CrawlCache(str(tmp_path))
+  for url in urls:
+    cache.put(url, os.urandom(1000))
+    time.sleep(0.01)
+  # The access times of the previous run are read back from the disk
+  cache = CrawlCache(str(tmp_path), max_bytes=2500)
+  assert cache.stats()["entries"] == 4
+  cache.put("https://www.gettysburg.edu/new/", os.urandom(1000))
+  assert [url in cache for url in urls] == [False, False, False, True]
@@ -0,0 +1,10 @@
+from ..client import HttpClient
+from ..fetcher import FetchEngine
+from .conftest import html_page
+
+def test_requests_share_the_pooled_connections(server):
+  server.routes["/page"] = html_page("<p>page</p>")
+  with HttpClient(pool_maxsize=2) as client:
+    FetchEngine(max_concurrency=2).map(lambda _: client.get(server.url("/page")).text, range(30))
+  assert server.hits("/page") == 30
+  assert len(server.connections) <= 2
@@ -0,0 +1,109 @@
+""" @author: Alex Nguyen
+  @file: conftest.py
+  This file contains the fixtures shared by the tests: a local http server whose routes each test
+    sets, so that nothing ever talks to the real website.
+"""
+
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import pytest
+
+from ..const import PAGE_TAG_TO_DEFAULT_LOCATOR_NAME
+
+# A route answers a request with (status, headers, body), or is that answer itself. A body which is
+# an iterator of chunks is sent chunked, one chunk at a time, e.g, to drip it slowly.
+Answer = Tuple[int, Dict[str, str], Union[bytes, Iterator[bytes]]]
+Route = Union[Answer, Callable[[BaseHTTPRequestHandler], Answer]]
+
+# The locators json of the tests, in which the content of every page is its `div.content`
+LOCATORS = {"data": {name: {"data": {"html_tag": "div", "css_class": "content"}} for name in PAGE_TAG_TO_DEFAULT_LOCATOR_NAME.values()}}
+
+class LocalServer:
+  """ A threaded http server on a free port of localhost. Every request is logged as
+    (method, path, headers) with its connection before its route answers it, and an unknown path gets a 404.
+  """
+
+  def __init__(self) -> None:
+    self.routes: Dict[str, Route] = {}
+    self.requests: List[Tuple[str, str, Dict[str, str]]] = []
+    self.connections = set() # The client (host, port) of every connection
+    self.lock = threading.Lock()
+    server = self
+
+    class Handler(BaseHTTPRequestHandler):
+      # Keep-alive, like the website, so that the connection pool is really used
+      protocol_version = "HTTP/1.1"
+      # The headers and the body are sent apart, which Nagle would hold for the delayed ack
+      disable_nagle_algorithm = True
+
+      def log_message(self, *args) -> None:
+        pass
+
+      def answer(self, send_body: bool) -> None:
+        with server.lock:
+          server.requests.append((self.command, self.path, dict(self.headers)))
+          server.connections.add(self.client_address)
+        route = server.routes.get(self.path)
+        if route is None:
+          status, headers, body = 404, {}, b"Not found"
+        elif callable(route):
+          status, headers, body = route(self)
+        else:
+          status, headers, body = route
+        self.send_response(status)
+        for name, value in headers.items():
+          self.send_header(name, value)
+        chunked = not isinstance(body, bytes)
+        if chunked:
+          self.send_header("Transfer-Encoding", "chunked")
+        elif "Content-Length" not in headers:
+          self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not send_body or status == 304:
+          return
+        try:
+          if not chunked:
+            self.wfile.write(body)
+            return
+          for chunk in body:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+          self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+          # The client stopped reading, e.g, the streaming fetch
+          pass
+
+      def do_GET(self) -> None:
+        self.answer(True)
+
+      def do_HEAD(self) -> None:
+        self.answer(False)
+
+    self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    self.httpd.daemon_threads = True
+    self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+  def url(self, path: str) -> str:
+    return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+  def hits(self, path: str, method: str = "GET") -> int:
+    with self.lock:
+      return sum(1 for m, p, _ in self.requests if p == path and m == method)
+
+  def last_headers(self, path: str) -> Dict[str, str]:
+    with self.lock:
+      return [h for _, p, h in self.requests if p == path][-1]
+
+@pytest.fixture
+def server():
+  server = LocalServer()
+  server.thread.start()
+  yield server
+  server.httpd.shutdown()
+  server.httpd.server_close()
+
+def html_page(body: str, charset: str = "utf-8") -> Answer:
+  """ A 200 html answer.
+  """
+  return 200, {"Content-Type": f"text/html; charset={charset}"}, body.encode(charset)
@@ -0,0 +1,132 @@
+import threading
+import time
+import pytest
+import requests
+
+from ..client import HttpClient
+from ..controller import AdaptiveController
+from ..deadline import Deadline, DeadlineExceeded
+from .conftest import html_page
+
+def host_limit(controller: AdaptiveController) -> float:
+  return list(controller.stats()["limits"].values())[0]
+
+def test_healthy_responses_grow_the_window(server):
+  server.routes["/page"] = html_page("<p>page</p>")
+  controller = AdaptiveController(initial_limit=2, max_limit=4)
+  with HttpClient(pool_maxsize=4, controller=controller) as client:
+    for _ in range(30):
+      client.get(server.url("/page"))
+  assert host_limit(controller) == 4
+
+def test_errors_cut_the_window_and_are_retried(server):
+  answers = [(503, {}, b"busy"), (503, {}, b"busy")]
+  server.routes["/page"] = lambda handler: answers.pop(0) if answers else html_page("<p>page</p>")
+  controller = AdaptiveController(initial_limit=4, max_limit=4, max_retries=3, backoff_base=0.01)
+  with HttpClient(pool_maxsize=4, controller=controller) as client:
+    res = client.get(server.url("/page"))
+  assert res.status_code == 200
+  stats = controller.stats()
+  assert stats["retries"] == 2
+  assert stats["failures"] == 0
+  # Halved twice down to 1, then one more slot for the healthy response
+  assert host_limit(controller) == 2
+
+def test_the_last_failed_response_is_returned(server):
+  server.routes["/page"] = 500, {}, b"broken"
+  controller = AdaptiveController(max_retries=2, backoff_base=0.01)
+  with HttpClient(controller=controller) as client:
+    assert client.get(server.url("/page")).status_code == 500
+  assert controller.stats()["failures"] == 1
+  assert server.hits("/page") == 3
+
+def test_retry_after_is_followed():
+  controller = AdaptiveController(backoff_max=10)
+  res = requests.Response()
+  res.headers["Retry-After"] = "4"
+  assert controller.backoff(0, res) == 4
+  res.headers["Retry-After"] = "60"
+  assert controller.backoff(0, res) == 10
+  assert 0 <= controller.backoff(3) <= controller.backoff_base * 2 ** 3
+
+def test_retried_streams_give_their_connection_back(server):
+  # With a pool of 2 blocking connections, a discarded streamed response which is not closed
+  # holds its connection, and the third request waits forever
+  server.routes["/page"] = 503, {}, b"busy"
+  controller = AdaptiveController(max_retries=1, backoff_base=0.01)
+  statuses = []
+  def run():
+    with HttpClient(pool_maxsize=2, controller=controller) as client:
+      for _ in range(5):
+        res = client.get(server.url("/page"), stream=True, timeout=3)
+        statuses.append(res.status_code)
+        res.close()
+  thread = threading.Thread(target=run, daemon=True)
+  thread.start()
+  thread.join(10)
+  assert statuses == [503] * 5
+
+def test_a_deadline_is_no_congestion(server):
+  def slow_page(handler):
+    time.sleep(1)
+    return html_page("<p>page</p>")
+  server.routes["/page"] = slow_page
+  controller = AdaptiveController(initial_limit=4, max_limit=4, backoff_base=0.01)
+  with HttpClient(pool_maxsize=4, controller=controller) as client:
+    with pytest.raises(DeadlineExceeded):
+      client.get(server.url("/page"), deadline=Deadline(0.2))
+  assert host_limit(controller) == 4
+  assert controller.stats()["retries"] == 0
+  assert server.hits("/page") == 1
+
+@pytest.mark.parametrize("error", [requests.exceptions.TooManyRedirects("loop"), requests.exceptions.InvalidURL("bad"), ValueError("bug")])
+def test_any_error_gives_the_slot_back(error):
+  controller = AdaptiveController(initial_limit=2, max_limit=2)
+  def send():
+    raise error
+  done = []
+  def run():
+    for _ in range(5):
+      with pytest.raises(type(error)):
+        controller.request("http://127.0.0.1/page", send)
+    done.append(True)
+  thread = threading.Thread(target=run, daemon=True)
+  thread.start()
+  thread.join(5)
+  assert done == [True]
+  # Only the request errors say something about the host, and they are not retried
+  assert controller.stats()["retries"] == 0
+
+def test_a_redirect_loop_does_not_block_its_host(server):
+  server.routes["/loop"] = 302, {"Location": "/loop"}, b""
+  server.routes["/page"] = html_page("<p>page</p>")
+  controller = AdaptiveController(initial_limit=2, max_limit=2)
+  statuses = []
+  def run():
+    with HttpClient(pool_maxsize=2, controller=controller) as client:
+      for _ in range(3):
+        with pytest.raises(requests.exceptions.TooManyRedirects):
+          client.get(server.url("/loop"))
+      statuses.append(client.get(server.url("/page")).status_code)
+  thread = threading.Thread(target=run, daemon=True)
+  thread.start()
+  thread.join(10)
+  assert statuses == [200]
+  assert controller.stats()["failures"] == 3
+
+def test_a_full_window_is_waited_for_until_the_deadline(server):
+  def slow_page(handler):
+    time.sleep(1)
+    return html_page("<p>page</p>")
+  server.routes["/slow"] = slow_page
+  controller = AdaptiveController(initial_limit=1, max_limit=1)
+  with HttpClient(pool_maxsize=2, controller=controller) as client:
+    holder = threading.Thread(target=lambda: client.get(server.url("/slow")), daemon=True)
+    holder.start()
+    time.sleep(0.2)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+      client.get(server.url("/slow"), deadline=Deadline(0.3))
+    assert time.monotonic() - start < 0.8
+    holder.join()
+  assert server.hits("/slow") == 1
@@ -0,0 +1,86 @@
+import time
+import pytest
+import requests
+
+from ..cache import CrawlCache
+from ..client import HttpClient, iter_body
+from ..const import PAGE_TAG
+from ..deadline import Deadline, DeadlineExceeded
+from ..page import Page
+from .conftest import LOCATORS
+
+def drip(n: int, pause: float):
+  for _ in range(n):
+    time.sleep(pause)
+    yield b"<p>drop</p>"
+
+def stall(pause: float):
+  yield b"<p>drop</p>"
+  time.sleep(pause)
+  yield b"<p>late</p>"
+
+def test_deadline_budget():
+  assert Deadline().remaining() is None
+  assert not Deadline().expired
+  Deadline().check()
+  deadline = Deadline(0.05)
+  assert 0 < deadline.remaining() <= 0.05
+  time.sleep(0.06)
+  assert deadline.expired and deadline.remaining() == 0
+  with pytest.raises(DeadlineExceeded):
+    deadline.check()
+
+def test_a_nested_deadline_takes_the_earlier_end():
+  run = Deadline(10)
+  assert run.within(1).remaining() <= 1
+  assert 1 < run.within(60).remaining() <= 10
+  assert run.within(60).seconds == 10
+  assert Deadline().within(None).remaining() is None
+
+def test_timeouts_are_capped_by_the_deadline():
+  deadline = Deadline(1)
+  assert deadline.cap(10) <= 1
+  connect, read = deadline.cap((0.5, 10))
+  assert connect == 0.5 and read <= 1
+  assert Deadline().cap((3, 10)) == (3, 10)
+
+def test_a_dripping_page_is_abandoned(server):
+  # Every chunk comes before the read timeout, so only the deadline stops the download
+  server.routes["/page"] = lambda handler: (200, {"Content-Type": "text/html"}, drip(50, 0.1))
+  with HttpClient(timeout=2) as client:
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+      client.get(server.url("/page"), deadline=Deadline(0.5))
+    assert time.monotonic() - start < 1.5
+
+def test_a_stalled_page_is_abandoned(server):
+  # Nothing comes after the first chunk, so the capped read timeout fires at the deadline
+  server.routes["/page"] = lambda handler: (200, {"Content-Type": "text/html"}, stall(2))
+  with HttpClient(timeout=5) as client:
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+      client.get(server.url("/page"), deadline=Deadline(0.5))
+    assert time.monotonic() - start < 1.5
+
+def test_a_stalled_body_raises_a_requests_timeout(server):
+  server.routes["/page"] = lambda handler: (200, {"Content-Type": "text/html"}, stall(2))
+  with HttpClient(timeout=0.3) as client:
+    res = client.get(server.url("/page"), stream=True)
+    with pytest.raises(requests.exceptions.Timeout) as e:
+      list(iter_body(res, 1024, Deadline(10)))
+    res.close()
+  assert not isinstance(e.value, DeadlineExceeded)
+
+def test_a_stalled_page_past_its_deadline_is_blank(server, tmp_path):
+  server.routes["/page"] = lambda handler: (200, {"Content-Type": "text/html"}, stall(2))
+  with HttpClient(timeout=5) as client:
+    page = Page(PAGE_TAG.POLICY, "policy", "h3", server.url("/page"), LOCATORS, client=client, cache=CrawlCache(str(tmp_path)), deadline=Deadline(0.5))
+  assert page.blank_reason is not None
+  assert "[CONTENT BLANK]" in page.generate()
+
+def test_a_page_past_its_deadline_is_blank(server, tmp_path):
+  server.routes["/page"] = lambda handler: (200, {"Content-Type": "text/html"}, drip(50, 0.1))
+  with HttpClient(timeout=2) as client:
+    page = Page(PAGE_TAG.POLICY, "policy", "h3", server.url("/page"), LOCATORS, client=client, cache=CrawlCache(str(tmp_path)), deadline=Deadline(0.5))
+  assert page.blank_reason is not None
+  assert "[CONTENT BLANK]" in page.generate()
@@ -0,0 +1,17 @@
+import threading
+
+from ..client import HttpClient
+from ..fetcher import FetchEngine
+from .conftest import html_page
+
+def test_results_come_back_in_job_order(server):
+  for i in range(20):
+    server.routes[f"/page/{i}"] = html_page(f"<p>{i}</p>")
+  jobs = [server.url(f"/page/{i}") for i in range(20)]
+  with HttpClient(pool_maxsize=4) as client:
+    results = FetchEngine(max_concurrency=4).map(lambda url: client.get(url).text, jobs)
+  assert results == [f"<p>{i}</p>" for i in range(20)]
+
+def test_one_worker_runs_in_the_calling_thread():
+  threads = FetchEngine(max_concurrency=1).map(lambda _: threading.get_ident(), range(3))
+  assert threads == [threading.get_ident()] * 3
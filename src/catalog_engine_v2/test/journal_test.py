@@ -0,0 +1,37 @@
+from ..journal import CrawlJournal
+
+def test_a_resumed_journal_keeps_the_previous_records(tmp_path):
+  path = str(tmp_path / "run" / "journal.jsonl")
+  with CrawlJournal(path) as journal:
+    journal.record("page", "a", body="<p>a</p>")
+    journal.record("page", "b", body="<p>b</p>")
+    journal.record("page", "a", body="<p>a2</p>")
+  with CrawlJournal(path, resume=True) as journal:
+    assert journal.get("page", "a")["body"] == "<p>a2</p>"
+    assert journal.get("page", "c") is None
+    journal.record("page", "c", body="<p>c</p>")
+    assert journal.stats() == {"page": 3, "replayed": 1}
+  with CrawlJournal(path, resume=True) as journal:
+    assert len(journal) == 3
+
+def test_a_new_run_starts_empty(tmp_path):
+  path = str(tmp_path / "journal.jsonl")
+  with CrawlJournal(path) as journal:
+    journal.record("row", "1", url="https://www.gettysburg.edu/")
+  with CrawlJournal(path) as journal:
+    assert journal.get("row", "1") is None
+  with CrawlJournal(path, resume=True) as journal:
+    assert len(journal) == 0
+
+def test_a_record_cut_by_a_crash_is_skipped(tmp_path):
+  path = str(tmp_path / "journal.jsonl")
+  with CrawlJournal(path) as journal:
+    journal.record("page", "a", body="<p>a</p>")
+  with open(path, "a", encoding="utf8") as f:
+    f.write('{"kind": "page", "key": "b", "bo')
+  with CrawlJournal(path, resume=True) as journal:
+    assert journal.get("page", "b") is None
+    journal.record("page", "b", body="<p>b</p>")
+  with CrawlJournal(path, resume=True) as journal:
+    assert journal.get("page", "a")["body"] == "<p>a</p>"
+    assert journal.get("page", "b")["body"] == "<p>b</p>"
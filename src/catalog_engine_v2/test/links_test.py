@@ -0,0 +1,95 @@
+import socket
+import threading
+
+from ..client import HttpClient
+from ..controller import AdaptiveController
+from ..links import LinkValidator, broken_links, extract_links, link_client
+from .conftest import html_page
+
+def no_head(handler):
+  # Some servers answer HEAD wrongly
+  if handler.command == "HEAD":
+    return 405, {}, b""
+  return html_page("<p>page</p>")
+
+def closed_port_url() -> str:
+  with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    return f"http://127.0.0.1:{s.getsockname()[1]}/"
+
+def quick_client(pool_maxsize: int = 4) -> HttpClient:
+  return HttpClient(pool_maxsize=pool_maxsize, timeout=2, controller=AdaptiveController(max_limit=pool_maxsize, max_retries=1, backoff_base=0.01))
+
+def test_links_are_extracted_once_without_their_fragment():
+  src = """<a href="https://www.gettysburg.edu/a#top">a</a> <a href="https://www.gettysburg.edu/a#end">a</a>
+    <a href="mailto:someone@gettysburg.edu">mail</a> <a href="/relative">relative</a> <a href=" http://example.com/b ">b</a>"""
+  assert extract_links(src) == ["https://www.gettysburg.edu/a", "http://example.com/b"]
+
+def test_links_are_checked_with_a_get_fallback(server):
+  server.routes["/ok"] = html_page("<p>ok</p>")
+  server.routes["/no-head"] = no_head
+  dead = closed_port_url()
+  with quick_client() as client:
+    validator = LinkValidator(client, max_concurrency=4)
+    results = validator.validate([server.url("/ok"), server.url("/no-head"), server.url("/missing"), dead, server.url("/ok")])
+  assert [result["ok"] for result in results.values()] == [True, True, False, False]
+  assert results[server.url("/no-head")]["method"] == "GET"
+  assert results[server.url("/missing")]["status"] == 404
+  assert results[dead]["status"] is None and results[dead]["error"]
+  assert list(broken_links(results)) == [server.url("/missing"), dead]
+  assert server.hits("/ok", "HEAD") == 1 and server.hits("/ok", "GET") == 0
+  assert validator.stats() == {"checked": 4, "cached": 0, "fallbacks": 3}
+
+def test_redirect_loops_and_invalid_urls_are_broken(server):
+  server.routes["/loop"] = 302, {"Location": "/loop"}, b""
+  invalid = ["http://[::1/", "http://exa mple.com/"]
+  assert extract_links("".join(f'<a href="{url}">x</a>' for url in invalid)) == invalid
+  results = {}
+  def run():
+    with quick_client() as client:
+      results.update(LinkValidator(client, max_concurrency=1).validate([server.url("/loop")] + invalid))
+  thread = threading.Thread(target=run, daemon=True)
+  thread.start()
+  thread.join(20)
+  assert list(broken_links(results)) == [server.url("/loop")] + invalid
+  assert "TooManyRedirects" in results[server.url("/loop")]["error"]
+  assert all("InvalidURL" in results[url]["error"] for url in invalid)
+
+def test_fresh_results_are_reused_across_runs(server, tmp_path):
+  server.routes["/ok"] = html_page("<p>ok</p>")
+  dead = closed_port_url()
+  cache_path = str(tmp_path / "links.json")
+  with quick_client() as client:
+    validator = LinkValidator(client, cache_path=cache_path)
+    validator.validate([server.url("/ok"), dead])
+    validator.save()
+    validator = LinkValidator(client, cache_path=cache_path)
+    validator.validate([server.url("/ok"), dead])
+    # A network error may be transient, so it is checked again
+    assert validator.stats() == {"checked": 1, "cached": 1, "fallbacks": 1}
+    validator = LinkValidator(client, cache_path=cache_path, ttl=0)
+    validator.validate([server.url("/ok")])
+    assert validator.stats()["checked"] == 1
+  assert server.hits("/ok", "HEAD") == 2
+
+def test_failing_links_give_their_connections_back(server):
+  # Every HEAD and GET fails with a body, through a pool of 2 blocking connections. The links are
+  # checked in the calling thread, so a leaked connection hangs that thread only.
+  urls = []
+  for i in range(12):
+    server.routes[f"/busy/{i}"] = 503, {}, b"busy" * 1000
+    urls.append(server.url(f"/busy/{i}"))
+  results = {}
+  def run():
+    with quick_client(pool_maxsize=2) as client:
+      results.update(LinkValidator(client, max_concurrency=1).validate(urls))
+  thread = threading.Thread(target=run, daemon=True)
+  thread.start()
+  thread.join(20)
+  assert len(results) == 12
+  assert all(result["status"] == 503 for result in results.values())
+
+def test_the_link_client_has_a_connection_per_thread():
+  with link_client(max_concurrency=16) as client:
+    assert client.session.get_adapter("https://www.gettysburg.edu/")._pool_maxsize == 16
+    assert client.controller.max_limit == 16
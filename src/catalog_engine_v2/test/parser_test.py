@@ -0,0 +1,29 @@
+import pytest
+
+from .. import parser
+from ..const import DEFAULT_PARSER, PARSE_STAGE
+from ..parser import ParserFactory, available_parsers, parser_factory_from_args
+
+def test_every_stage_gets_its_backend(monkeypatch):
+  monkeypatch.setattr(parser, "available_parsers", lambda: ["html.parser", "lxml"])
+  factory = parser_factory_from_args("html.parser", ["page = lxml"])
+  assert factory.backend(PARSE_STAGE.page) == "lxml"
+  assert factory.backend(PARSE_STAGE.template) == "html.parser"
+
+def test_a_missing_backend_falls_back_with_a_warning(monkeypatch):
+  monkeypatch.setattr(parser, "available_parsers", lambda: ["html.parser"])
+  with pytest.warns(UserWarning):
+    factory = ParserFactory("html5lib", {PARSE_STAGE.page: "lxml"})
+  assert factory.backend(PARSE_STAGE.page) == DEFAULT_PARSER
+  assert factory.backend(PARSE_STAGE.links) == DEFAULT_PARSER
+
+def test_unknown_stages_and_backends_are_rejected():
+  with pytest.raises(AssertionError):
+    ParserFactory(stages={"pages": "html.parser"})
+  with pytest.raises(AssertionError):
+    ParserFactory("html")
+
+@pytest.mark.parametrize("backend", available_parsers())
+def test_a_fragment_keeps_its_top_level_elements(backend):
+  soup = ParserFactory(backend).parse_fragment("<h3>Title</h3><p>Text</p>", PARSE_STAGE.course)
+  assert [tag.name for tag in soup.find_all(recursive=False)] == ["h3", "p"]
@@ -0,0 +1,49 @@
+import time
+import pytest
+
+from ..cache import CrawlCache
+from ..client import HttpClient
+from ..fetcher import FetchEngine
+from ..singleflight import SingleFlight
+from .conftest import html_page
+
+def test_concurrent_calls_share_one_call():
+  flights = SingleFlight()
+  def slow():
+    time.sleep(0.2)
+    return object()
+  results = FetchEngine(max_concurrency=8).map(lambda _: flights.do("key", slow), range(8))
+  assert all(result is results[0] for result in results)
+  stats = flights.stats()
+  assert stats["calls"] == 1
+  assert stats["saved"] == 7
+
+def test_memoized_results_are_reused_until_forgotten():
+  flights = SingleFlight(memoize=True)
+  calls = []
+  assert flights.do("key", lambda: calls.append(1) or "a") == "a"
+  assert flights.do("key", lambda: calls.append(1) or "b") == "a"
+  flights.forget("key")
+  assert flights.do("key", lambda: calls.append(1) or "c") == "c"
+  assert len(calls) == 2
+  assert flights.stats()["reused"] == 1
+
+def test_failures_are_not_memoized():
+  flights = SingleFlight(memoize=True)
+  def fail():
+    raise ValueError("failed")
+  with pytest.raises(ValueError):
+    flights.do("key", fail)
+  assert flights.do("key", lambda: "ok") == "ok"
+
+def test_concurrent_fetches_of_one_page_send_one_request(server, tmp_path):
+  def slow_page(handler):
+    time.sleep(0.2)
+    return html_page("<p>page</p>")
+  server.routes["/page"] = slow_page
+  cache = CrawlCache(str(tmp_path))
+  urls = [server.url("/page"), server.url("/page#top"), server.url("/page?")] * 3
+  with HttpClient() as client:
+    bodies = FetchEngine(max_concurrency=9).map(lambda url: cache.fetch(url, client)[0], urls)
+  assert bodies == [b"<p>page</p>"] * 9
+  assert server.hits("/page") == 1
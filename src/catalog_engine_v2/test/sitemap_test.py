@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+import gzip
+import time
+import pytest
+
+from ..cache import CrawlCache
+from ..client import HttpClient
+from ..sitemap import Sitemap, parse_lastmod
+from .conftest import html_page
+
+def urlset(entries) -> bytes:
+  urls = "".join(f"<url><loc>{loc}</loc><lastmod>{lastmod}</lastmod></url>" for loc, lastmod in entries)
+  return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'.encode("utf8")
+
+def test_lastmod_formats():
+  assert parse_lastmod("2022-05-01T10:00:00Z") == datetime(2022, 5, 1, 10, tzinfo=timezone.utc).timestamp()
+  assert parse_lastmod("2022-05-01T10:00:00+02:00") == datetime(2022, 5, 1, 8, tzinfo=timezone.utc).timestamp()
+  # A date alone is the end of that day
+  assert parse_lastmod("2022-05-01") == datetime(2022, 5, 2, tzinfo=timezone.utc).timestamp()
+  assert parse_lastmod("yesterday") is None
+
+def test_a_page_changed_on_the_day_of_its_fetch_counts_as_changed():
+  sitemap = Sitemap.from_lastmods({})
+  sitemap.lastmods["https://www.gettysburg.edu/"] = parse_lastmod(datetime.now(timezone.utc).date().isoformat())
+  assert sitemap.changed_since("https://www.gettysburg.edu/", time.time())
+  assert sitemap.changed_since("https://www.gettysburg.edu/other/", time.time()) is None
+
+def test_sitemap_indexes_and_gzip_sitemaps_are_read(server):
+  server.routes["/sitemap.xml"] = 200, {}, (
+    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+    f'<sitemap><loc>{server.url("/pages.xml.gz")}</loc></sitemap></sitemapindex>').encode("utf8")
+  server.routes["/pages.xml.gz"] = 200, {}, gzip.compress(urlset([(server.url("/page"), "2022-05-01T10:00:00Z")]))
+  with HttpClient() as client:
+    sitemap = Sitemap(server.url("/sitemap.xml"), client)
+  assert len(sitemap) == 1
+  assert sitemap.lastmod(server.url("/page#top")) == parse_lastmod("2022-05-01T10:00:00Z")
+
+def test_unchanged_pages_are_skipped(server, tmp_path):
+  for path in ["/old", "/new", "/unlisted"]:
+    server.routes[path] = html_page(f"<p>{path}</p>")
+  cache = CrawlCache(str(tmp_path))
+  with HttpClient() as client:
+    for path in ["/old", "/new", "/unlisted"]:
+      cache.fetch(server.url(path), client)
+    future = datetime.fromtimestamp(time.time() + 3600, timezone.utc).isoformat()
+    server.routes["/sitemap.xml"] = 200, {}, urlset([(server.url("/old"), "2022-05-01"), (server.url("/new"), future)])
+    cache = CrawlCache(str(tmp_path), sitemap=Sitemap(server.url("/sitemap.xml"), client))
+    for path in ["/old", "/new", "/unlisted"]:
+      cache.fetch(server.url(path), client)
+  assert [server.hits(path) for path in ["/old", "/new", "/unlisted"]] == [1, 2, 1]
+  assert cache.stats()["unchanged_skipped"] == 1
+
+def test_a_sitemap_which_cannot_be_read_warns(server, tmp_path):
+  server.routes["/broken.xml"] = 200, {}, b"<urlset><url>"
+  with HttpClient() as client:
+    with pytest.warns(UserWarning):
+      assert len(Sitemap(server.url("/sitemap.xml"), client)) == 0
+    with pytest.warns(UserWarning):
+      assert len(Sitemap(server.url("/broken.xml"), client)) == 0
+  with pytest.warns(UserWarning):
+    assert len(Sitemap(str(tmp_path / "missing.xml"))) == 0
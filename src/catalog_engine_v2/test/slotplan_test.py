@@ -0,0 +1,55 @@
+from .. import slotplan
+from ..slotplan import SlotPlan, SlotPlanStore, template_key
+
+DOCUMENT = "<p>generated on @date.</p><div>@1-link <i>one</i>@1-splice</div><div>@2-link@2-splice</div><footer/>"
+MARKERS = ["@date", "@1-link", "@1-splice", "@2-link", "@2-splice"]
+LINKS = ["<code>1</code>", "<code>2</code>"]
+
+def compile_plan() -> SlotPlan:
+  slots = [{"section": 0, "html_id": "one"}, {"section": 1, "html_id": "two"}]
+  return SlotPlan.from_document("key", DOCUMENT, MARKERS, slots, LINKS)
+
+def test_the_frame_keeps_the_template_around_the_slots():
+  plan = compile_plan()
+  assert plan.frame == "<p>generated on .</p><div><code>1</code> <i>one</i></div><div><code>2</code></div><footer/>"
+  assert plan.n_sections == 2
+  start, end = plan.slots[0]["link"]
+  assert plan.frame[start:end] == "<code>1</code>"
+
+def test_splice_fills_the_slots():
+  plan = compile_plan()
+  assert "".join(plan.splice("today", ["<p>A</p>", "<p>B</p>"])) == \
+    "<p>generated on today.</p><div> <i>one</i><p>A</p></div><div><p>B</p></div><footer/>"
+
+def test_a_slot_filled_with_none_keeps_its_link():
+  plan = compile_plan()
+  assert "".join(plan.splice("today", [None, "<p>B</p>"])) == \
+    "<p>generated on today.</p><div><code>1</code> <i>one</i></div><div><p>B</p></div><footer/>"
+
+def test_the_fills_are_pulled_as_their_slots_are_reached():
+  plan = compile_plan()
+  written = []
+  def fills():
+    assert "".join(written) == "<p>generated on today"
+    yield "<p>A</p>"
+    # Everything up to the previous fill has been written
+    assert "".join(written).endswith("<p>A</p>")
+    yield "<p>B</p>"
+  for piece in plan.splice("today", fills()):
+    written.append(piece)
+
+def test_plans_are_stored_by_key(tmp_path):
+  store = SlotPlanStore(str(tmp_path / "plans"))
+  assert store.get("key") is None
+  store.put(compile_plan())
+  plan = SlotPlanStore(str(tmp_path / "plans")).get("key")
+  assert plan.to_dict() == compile_plan().to_dict()
+  assert "".join(plan.splice("today", ["A", "B"])) == "".join(compile_plan().splice("today", ["A", "B"]))
+
+def test_the_key_changes_with_the_template_backend_and_format(monkeypatch):
+  key = template_key(b"<html></html>", "html.parser")
+  assert key == template_key(b"<html></html>", "html.parser")
+  assert key != template_key(b"<html> </html>", "html.parser")
+  assert key != template_key(b"<html></html>", "lxml")
+  monkeypatch.setattr(slotplan, "PLAN_FORMAT", slotplan.PLAN_FORMAT + 1)
+  assert key != template_key(b"<html></html>", "html.parser")
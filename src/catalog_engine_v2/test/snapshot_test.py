@@ -0,0 +1,77 @@
+import json
+
+from ..client import HttpClient
+from ..controller import AdaptiveController
+from ..snapshot import CourseDelta, CourseSnapshotStore
+
+def api_route(courses):
+  # Serves the courses api with whatever `courses` holds at the time of the request
+  return lambda handler: (200, {"Content-Type": "application/json"}, json.dumps({"data": courses}).encode("utf8"))
+
+def test_delta_between_two_versions():
+  old = [{"id": 1, "title": "A"}, {"id": 2, "title": "B"}, {"id": 3, "title": "C"}]
+  new = [{"id": 1, "title": "A"}, {"id": 3, "title": "C2"}, {"id": 4, "title": "D"}]
+  delta = CourseDelta.between(old, new)
+  assert delta.to_dict() == {"added": ["4"], "removed": ["2"], "changed": ["3"]}
+  assert not CourseDelta.between(old, old)
+
+def test_only_the_run_which_finds_a_change_reports_it(server, tmp_path):
+  courses = [{"id": 1, "title": "A"}]
+  server.routes["/api"] = api_route(courses)
+  store = CourseSnapshotStore(str(tmp_path), max_age=0)
+  with HttpClient() as client:
+    data, delta = store.load(client, server.url("/api"))
+    assert data == {"data": [{"id": 1, "title": "A"}]}
+    assert delta.added == ["1"]
+    courses.append({"id": 2, "title": "B"})
+    data, delta = store.load(client, server.url("/api"))
+    assert delta.to_dict() == {"added": ["2"], "removed": [], "changed": []}
+    # Nothing changed since, so nothing is reported again
+    data, delta = store.load(client, server.url("/api"))
+    assert not delta
+    assert len(data["data"]) == 2
+  assert store.versions() == [1, 2]
+
+def test_a_fresh_snapshot_is_used_without_a_request(server, tmp_path):
+  server.routes["/api"] = api_route([{"id": 1}])
+  store = CourseSnapshotStore(str(tmp_path), max_age=3600)
+  with HttpClient() as client:
+    store.load(client, server.url("/api"))
+    store.load(client, server.url("/api"))
+  assert server.hits("/api") == 1
+
+def test_unused_attributes_are_no_change(server, tmp_path):
+  courses = [{"id": 1, "title": "A", "views": 10}]
+  server.routes["/api"] = api_route(courses)
+  store = CourseSnapshotStore(str(tmp_path), max_age=0)
+  with HttpClient() as client:
+    # A version stored with every attribute, then synced with the used ones only
+    store.sync(client, server.url("/api"))
+    courses[0]["views"] = 11
+    snapshot = store.sync(client, server.url("/api"), attrs=["id", "title"])
+    assert snapshot["version"] == 1
+    courses[0]["title"] = "A2"
+    snapshot = store.sync(client, server.url("/api"), attrs=["id", "title"])
+  assert snapshot["version"] == 2
+  assert snapshot["delta"] == {"added": [], "removed": [], "changed": ["1"]}
+  assert snapshot["data"] == [{"id": 1, "title": "A2"}]
+
+def test_old_versions_are_dropped(server, tmp_path):
+  courses = []
+  server.routes["/api"] = api_route(courses)
+  store = CourseSnapshotStore(str(tmp_path), max_age=0, keep=2)
+  with HttpClient() as client:
+    for i in range(4):
+      courses.append({"id": i})
+      store.sync(client, server.url("/api"))
+  assert store.versions() == [3, 4]
+
+def test_a_failed_sync_keeps_the_last_version(server, tmp_path):
+  server.routes["/api"] = api_route([{"id": 1}])
+  store = CourseSnapshotStore(str(tmp_path), max_age=0)
+  with HttpClient(controller=AdaptiveController(max_retries=0)) as client:
+    store.load(client, server.url("/api"))
+    server.routes["/api"] = 500, {}, b"broken"
+    data, delta = store.load(client, server.url("/api"))
+  assert data == {"data": [{"id": 1}]}
+  assert not delta
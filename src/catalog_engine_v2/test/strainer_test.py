@@ -0,0 +1,36 @@
+import bs4
+
+from ..setting import PageLocator
+from ..strainer import ContainerStrainer, locator_strainer
+
+PAGE = """<html><body>
+<div class="nav"><div class="content">In the menu</div></div>
+<section class="content">A section</section>
+<div class="gb-c-longform content wide">
+  <h2>Title</h2>
+  <div class="content"><p>Nested <b>bold</b></p></div>
+  <table class="courses"><tr><td>BIO 101</td></tr></table>
+</div>
+<div class="gb-c-longform"><p>Second</p></div>
+<table class="courses"><tr><td>CHEM 101</td></tr></table>
+</body></html>"""
+
+def test_strained_finds_equal_full_finds():
+  full = bs4.BeautifulSoup(PAGE, "html.parser")
+  strainer = ContainerStrainer([("div", "gb-c-longform content"), ("table", ["courses"])])
+  strained = bs4.BeautifulSoup(PAGE, "html.parser", parse_only=strainer.strainer)
+  for name, attrs in [("div", {"class": ["content"]}), ("div", {"class": ["gb-c-longform", "content"]}), ("table", {"class": "courses"})]:
+    assert str(strained.find(name, attrs)) == str(full.find(name, attrs))
+    assert [str(tag) for tag in strained.find_all(name, attrs)] == [str(tag) for tag in full.find_all(name, attrs)]
+  assert "A section" not in str(strained)
+
+def test_a_container_without_class_keeps_its_whole_tag():
+  strainer = ContainerStrainer([("table", ""), ("div", "content")])
+  strained = bs4.BeautifulSoup(PAGE, "html.parser", parse_only=strainer.strainer)
+  assert len(strained.find_all("table")) == 2
+  assert strainer.key == "table. div.content"
+
+def test_from_and_to_excludes_need_a_full_parse():
+  assert locator_strainer(PageLocator("div", "content")) is not None
+  assert locator_strainer(PageLocator("div", "content", [{"from": {"html_tag": "h2"}}])) is None
+  assert locator_strainer(PageLocator("", "content")) is None
@@ -0,0 +1,48 @@
+import bs4
+
+from ..client import HttpClient
+from ..setting import PageLocator
+from ..streaming import LocatorWatcher, stream_until_locator
+from .conftest import html_page
+
+PAGE = """<html><body>
+<div class="nav"><div>menu</div></div>
+<div class="gb-c-longform content">
+  <div><p>first</p></div>
+  <div class="inner"><p>second</p><br/></div>
+</div>
+""" + "<p>filler</p>\n" * 20000 + "</body></html>"
+
+def test_the_watcher_stops_at_the_end_of_the_located_element():
+  watcher = LocatorWatcher("div", ["content", ""])
+  watcher.feed(PAGE[:200])
+  assert watcher.found
+  assert watcher.done
+  line, column = watcher.closed_at
+  assert PAGE.splitlines()[line - 1][column:] == "</div>"
+
+def test_the_watcher_needs_a_matching_class():
+  watcher = LocatorWatcher("div", ["missing"])
+  watcher.feed(PAGE)
+  assert not watcher.found
+  assert not watcher.done
+
+def test_the_download_stops_after_the_located_element(server):
+  server.routes["/page"] = html_page(PAGE)
+  with HttpClient() as client:
+    result = stream_until_locator(client, server.url("/page"), PageLocator("div", "content"))
+  assert not result.complete
+  assert result.bytes_total == len(PAGE)
+  assert result.bytes_read < len(PAGE) // 2
+  assert result.bytes_saved == result.bytes_total - result.bytes_read
+  expected = bs4.BeautifulSoup(PAGE, "html.parser").find("div", {"class": ["content"]})
+  located = bs4.BeautifulSoup(result.src, "html.parser").find("div", {"class": ["content"]})
+  assert str(located) == str(expected)
+
+def test_a_page_without_the_located_element_is_read_whole(server):
+  server.routes["/page"] = html_page(PAGE)
+  with HttpClient() as client:
+    result = stream_until_locator(client, server.url("/page"), PageLocator("div", "missing"))
+  assert result.complete
+  assert result.src == PAGE.encode("utf-8")
+  assert result.bytes_saved == 0
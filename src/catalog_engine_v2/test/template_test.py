@@ -0,0 +1,193 @@
+import json
+import random
+import time
+import pytest
+
+from ..cache import CrawlCache
+from ..sitemap import Sitemap
+from ..client import HttpClient
+from ..const import COURSE_CRAWLING_MODE
+from ..page import Page
+from .. import template_v2
+from ..template_v2 import Template
+from .conftest import LOCATORS, html_page
+
+TEMPLATE = """<!DOCTYPE html>
+<html lang="en-US">
+<head><meta charset="utf-8" /><title>Catalog</title></head>
+<body>
+<header><section><h1 id="course-catalog">Catalog</h1><p><a href="{url}/">Course Catalog</a> generated on $date.</p></section></header>
+<nav><section><h1 id="toc">Contents</h1><ol><li><a href="#introduction">Introduction</a></li></ol></section></nav>
+<main>
+<section>
+  <h1 id="introduction">Introduction</h1>
+  <div><code><a href="{url}/intro">/intro</a></code></div>
+</section>
+<section>
+  <h1 id="policies">Policies</h1>
+  <h2 id="grading">Grading</h2>
+  <div><code><a href="{url}/grading">/grading</a></code></div>
+  <h2 id="honor-code">Honor Code</h2>
+  <div><p>Short version, without any page.</p></div>
+  <h2 id="grading-again">Grading, again</h2>
+  <div><code><a href="{url}/grading#again">/grading</a></code></div>
+</section>
+<section>
+  <h1 id="biology">Biology</h1>
+  <h2 id="biology-courses">Biology Courses</h2>
+  <div><code><a href="{url}/biology">/biology</a></code></div>
+  <h2 id="gone">Gone</h2>
+  <div><code><a href="{url}/gone">/gone</a></code></div>
+</section>
+</main>
+</body>
+</html>
+"""
+
+def content_page(title: str) -> str:
+  return f"""<html><body>
+<div class="nav"><h1>Menu</h1></div>
+<div class="content">
+  <h2 class="title">{title}</h2>
+  <p class="lead">About <a href="/{title.lower()}/more" target="_blank">{title}</a>.</p>
+  <button><h1>Share</h1></button>
+  <p>   </p>
+  <h3>Details</h3>
+  <img src="/photo.png"/>
+  <ul><li>One</li><li>Two – “three”</li></ul>
+</div>
+<footer><p>Footer</p></footer>
+</body></html>"""
+
+def serve_catalog(server):
+  for path in ["/intro", "/grading", "/biology"]:
+    server.routes[path] = html_page(content_page(path[1:].title()))
+
+def make_template(server, tmp_path, name: str = "run", **kwargs) -> Template:
+  template_path = tmp_path / "template.html"
+  template_path.write_text(TEMPLATE.format(url=server.url("")), encoding="utf8")
+  locators_path = tmp_path / "locators.json"
+  locators_path.write_text(json.dumps(LOCATORS), encoding="utf8")
+  kwargs.setdefault("cache", CrawlCache(str(tmp_path / name / "html")))
+  return Template(
+    template_path=str(template_path),
+    locators_path=str(locators_path),
+    course_crawling_mode=COURSE_CRAWLING_MODE.raw,
+    data_path=str(tmp_path / name),
+    verbose=False,
+    client=kwargs.pop("client", HttpClient()),
+    **kwargs)
+
+def test_the_plan_is_crawled_as_one_batch(server, tmp_path):
+  serve_catalog(server)
+  template = make_template(server, tmp_path, max_concurrency=4)
+  plan = template.crawl_plan()
+  assert [slot["html_id"] for slot in plan] == ["introduction", "grading", "grading-again", "biology-courses", "gone"]
+  template.insight()
+  # Two slots of one url share one request
+  assert [server.hits(path) for path in ["/intro", "/grading", "/biology", "/gone"]] == [1, 1, 1, 1]
+  assert list(template.degraded_report()) == ["gone"]
+  output = template.generate()
+  assert output.count("<h3>Grading</h3>") == 2
+  assert "Short version, without any page." in output
+  assert "[CONTENT BLANK]" in output
+  assert "$date" not in output and "<code>" not in output
+
+def test_every_page_is_crawled_through_the_client_of_its_template(server, tmp_path):
+  serve_catalog(server)
+  template = make_template(server, tmp_path, client=None)
+  template.insight()
+  assert isinstance(template.client, HttpClient)
+  assert all(page.client is template.client for page in template.id_to_page.values())
+  assert make_template(server, tmp_path, name="other", client=None).client is not template.client
+
+@pytest.mark.parametrize("max_buffered", [1, 32])
+def test_pipelined_output_equals_serial_output(server, tmp_path, capsys, max_buffered):
+  serve_catalog(server)
+  serial = make_template(server, tmp_path, "serial", max_concurrency=1)
+  serial.insight()
+  expected = serial.generate().encode("utf8")
+
+  # Pages finishing out of template order
+  for path in ["/intro", "/grading", "/biology"]:
+    answer = server.routes[path]
+    server.routes[path] = lambda handler, answer=answer: (time.sleep(random.uniform(0, 0.1)), answer)[1]
+  pipelined = make_template(server, tmp_path, "pipelined", max_concurrency=4)
+  pipelined.generate_pipelined(str(tmp_path / "catalog.html"), max_buffered=max_buffered)
+  assert (tmp_path / "catalog.html").read_bytes() == expected
+  # Nothing is reported unless verbose
+  assert capsys.readouterr().out == ""
+
+@pytest.mark.parametrize("verbose", [False, True])
+def test_a_failed_page_is_reported_only_if_verbose(server, tmp_path, capsys, monkeypatch, verbose):
+  serve_catalog(server)
+  load = Page.load
+  def broken_load(page, deadline=None):
+    if page.url.endswith("/biology"):
+      raise ValueError("broken locator")
+    return load(page, deadline=deadline)
+  monkeypatch.setattr(Page, "load", broken_load)
+  template = make_template(server, tmp_path)
+  template.verbose = verbose
+  template.insight()
+  assert template.id_to_page["biology-courses"].blank_reason.startswith("failed extracting")
+  assert ("Failed extracting url" in capsys.readouterr().out) == verbose
+
+def test_strained_output_equals_the_full_parse(server, tmp_path):
+  serve_catalog(server)
+  outputs = []
+  for strain in [False, True]:
+    template = make_template(server, tmp_path, f"strain-{strain}", strain=strain)
+    template.insight()
+    assert all((page.strainer is not None) == strain for page in template.id_to_page.values())
+    outputs.append(template.generate())
+  assert outputs[0] == outputs[1]
+
+def test_the_template_is_parsed_once(server, tmp_path, monkeypatch):
+  serve_catalog(server)
+  template = make_template(server, tmp_path)
+  parsed = []
+  parse_html = template_v2.parse_html
+  monkeypatch.setattr(template_v2, "parse_html", lambda src, stage, **kwargs: parsed.append(src) or parse_html(src, stage, **kwargs))
+  first = template.compile_plan("first")
+  skeleton = str(template_v2.BeautifulSoup(template.template_src, "html.parser"))
+  second = template.compile_plan("second")
+  assert parsed.count(template.template_src) == 1
+  # Only copies of the template parts are marked, so the template itself is left as it was
+  assert str(template.skeleton) == skeleton
+  assert first.slots == second.slots
+  assert first.frame == second.frame
+
+def test_a_compiled_plan_is_reused_by_the_next_run(server, tmp_path, monkeypatch):
+  serve_catalog(server)
+  first = make_template(server, tmp_path)
+  first.insight()
+  expected = first.generate()
+  def compile_plan(self, key):
+    raise AssertionError("The template is compiled again")
+  monkeypatch.setattr(Template, "compile_plan", compile_plan)
+  second = make_template(server, tmp_path)
+  second.insight()
+  assert second.generate() == expected
+
+def test_distributed_output_equals_insight(server, tmp_path):
+  serve_catalog(server)
+  serial = make_template(server, tmp_path, "serial")
+  serial.insight()
+  distributed = make_template(server, tmp_path, "distributed")
+  distributed.insight_distributed(str(tmp_path / "queue.sqlite"), n_workers=2)
+  assert distributed.generate() == serial.generate()
+  assert list(distributed.degraded_report()) == ["gone"]
+
+def test_the_workers_skip_the_pages_the_sitemap_says_are_unchanged(server, tmp_path):
+  serve_catalog(server)
+  first = make_template(server, tmp_path, "first", cache=CrawlCache(str(tmp_path / "html")))
+  first.insight()
+  n_requests = len(server.requests)
+  # Without the sitemap, revalidating would request every page again
+  sitemap = Sitemap.from_lastmods({server.url(path): 0 for path in ["/intro", "/grading", "/biology"]})
+  cache = CrawlCache(str(tmp_path / "html"), revalidate=True, sitemap=sitemap)
+  second = make_template(server, tmp_path, "second", cache=cache)
+  second.insight_distributed(str(tmp_path / "queue.sqlite"), n_workers=2)
+  assert [path for _, path, _ in server.requests[n_requests:]] == ["/gone"]
+  assert second.generate() == first.generate()
@@ -0,0 +1,69 @@
+import copy
+import bs4
+import pytest
+
+from ..transform import ContentTransformer
+
+def clean_like_before(root: bs4.Tag, header_level: str, exclude_list) -> None:
+  """ The cleaning the transformer replaces: the excludes first, then one pass over `find_all()`.
+  """
+  for excluding_tag in exclude_list:
+    for tag in root.find_all(excluding_tag["html_tag"], {"class": excluding_tag["css_class"].split(" ")}):
+      tag.extract()
+  max_heading_level = 0
+  for tag in root.find_all():
+    if tag.name in ["img", "hr", "button", "rect", "svg"]:
+      tag.extract()
+    elif tag.name in ["h1", "h2", "h3", "h4", "h5", "h6"]:
+      original_heading_level = int(tag.name[1])
+      if max_heading_level == 0:
+        max_heading_level = original_heading_level
+      tag.name = "h" + str(int(header_level[1]) + original_heading_level - max_heading_level + 1)
+    elif tag.name == "p" and tag.text.strip() == "" and len(tag.find_all()) == 0:
+      tag.extract()
+    if tag.name != "a":
+      tag.attrs = {}
+    elif "href" in tag.attrs:
+      this_url = tag.attrs["href"]
+      if this_url[0] == "/":
+        this_url = "https://www.gettysburg.edu" + this_url
+      tag.attrs = {"href": this_url}
+
+PAGES = [
+  # Headings re-leveled from the first one, links made absolute, attributes dropped
+  """<h2 class="title">Title</h2><p style="x">Text <a href="/courses/" target="_blank">courses</a>
+    <a href="https://example.com/">out</a> <a name="anchor">no href</a></p><h4>Deeper</h4><h3>Back</h3>""",
+  # A heading inside a dropped element still sets the level of the first heading
+  """<button><h2>Share</h2></button><h4>First kept</h4><h5>Second kept</h5>""",
+  """<svg><rect/><h1>Icon</h1></svg><div><h3>Title</h3></div>""",
+  # Blank paragraphs, and paragraphs emptied by the cleaning
+  """<p>  </p><p><!-- comment --></p><p><img src="a.png"/></p><p><span class="drop">gone</span></p>
+    <p><b></b></p><p> <br/> </p><p>kept</p><div><p>\n</p><hr/></div>""",
+  # Excluded elements, with the first heading inside one of them
+  """<div class="drop wide"><h1>Excluded</h1><p>gone</p></div><h3>Title</h3><span class="keep">kept</span>
+    <button><div class="drop"><h2>Excluded too</h2></div></button><h5>Sub</h5>""",
+  # Deep nesting
+  "<div>" * 50 + "<h2>Deep</h2><p></p>" + "</div>" * 50 + "<h3>After</h3>",
+]
+
+EXCLUDES = [{"html_tag": "div", "css_class": "drop"}, {"html_tag": "span", "css_class": "drop"}, {"from": {"html_tag": "h2"}}]
+
+@pytest.mark.parametrize("src", PAGES)
+@pytest.mark.parametrize("header_level", ["h2", "h3"])
+def test_the_transformer_cleans_like_before(src, header_level):
+  root = bs4.BeautifulSoup(f'<div class="content" id="main">{src}</div>', "html.parser").div
+  expected = copy.copy(root)
+  clean_like_before(expected, header_level, [exclude for exclude in EXCLUDES if "html_tag" in exclude])
+  ContentTransformer(header_level, EXCLUDES).transform(root)
+  assert str(root) == str(expected)
+
+def test_the_first_heading_in_a_dropped_element_sets_the_level():
+  root = bs4.BeautifulSoup("<div><button><h2>Share</h2></button><h4>Title</h4></div>", "html.parser").div
+  ContentTransformer("h3").transform(root)
+  assert str(root) == "<div><h6>Title</h6></div>"
+
+def test_the_counts():
+  root = bs4.BeautifulSoup('<div><div class="drop"><p>x</p></div><img/><p> </p><p>kept</p></div>', "html.parser").div
+  counts = ContentTransformer("h3", EXCLUDES).transform(root)
+  assert counts == {"visited": 4, "excluded": 1, "removed": 2}
+  assert str(root) == "<div><p>kept</p></div>"
@@ -0,0 +1,40 @@
+import json
+import pytest
+
+from .. import utils
+from ..client import HttpClient
+from ..utils import stream_courses_from_api, stream_json_array
+
+COURSES = [
+  {"id": i, "title": f"Cours n°{i} – “intro”", "credits": 1.25 * i, "open": i % 2 == 0, "notes": None, "tags": ["a", {"b": [i]}]}
+  for i in range(50)
+]
+
+BODY = json.dumps({"status": "ok", "meta": {"data": [1, 2]}, "data": COURSES, "after": True}, ensure_ascii=False).encode("utf8")
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_the_stream_decodes_like_json_loads(server, monkeypatch, chunk_size):
+  # Tiny chunks cut numbers, literals and multi-byte characters in two
+  monkeypatch.setattr(utils, "JSON_CHUNK_SIZE", chunk_size)
+  server.routes["/api"] = 200, {"Content-Type": "application/json; charset=utf-8"}, BODY
+  with HttpClient() as client:
+    res = client.get(server.url("/api"), stream=True)
+    assert list(stream_json_array(res)) == COURSES
+
+def test_only_the_kept_attributes_are_returned(server):
+  server.routes["/api"] = 200, {"Content-Type": "application/json; charset=utf-8"}, BODY
+  with HttpClient() as client:
+    data = stream_courses_from_api(server.url("/api"), ["id", "title", "missing"], client)
+  assert data == {"data": [{"id": course["id"], "title": course["title"]} for course in COURSES]}
+
+@pytest.mark.parametrize("body", [b'{"other": []}', b"{}", b'{"data": [{"id": 1}', b'{"data": [1 2]}'])
+def test_a_body_without_the_array_raises(server, body):
+  server.routes["/api"] = 200, {"Content-Type": "application/json"}, body
+  with HttpClient() as client:
+    with pytest.raises(ValueError):
+      list(stream_json_array(client.get(server.url("/api"), stream=True)))
+
+def test_an_empty_array(server):
+  server.routes["/api"] = 200, {"Content-Type": "application/json"}, b' { "data" : [ ] } '
+  with HttpClient() as client:
+    assert list(stream_json_array(client.get(server.url("/api"), stream=True))) == []
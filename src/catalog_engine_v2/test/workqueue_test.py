@@ -0,0 +1,72 @@
+import time
+import pytest
+
+from ..workqueue import DONE, FAILED, LEASED, PENDING, WorkQueue
+
+@pytest.fixture
+def queue(tmp_path):
+  queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=0.2, max_attempts=2)
+  yield queue
+  queue.close()
+
+def test_jobs_are_leased_once_in_order(queue):
+  queue.put_many([("a", {"n": 1}), ("b", {"n": 2})])
+  queue.put("a", {"n": 3})
+  first, second = queue.lease("w1"), queue.lease("w2")
+  assert (first.key, first.payload, first.attempts) == ("a", {"n": 1}, 1)
+  assert second.key == "b"
+  assert queue.lease("w3") is None
+  assert queue.complete(first, "w1", {"html": "<p>a</p>"})
+  assert queue.counts() == {PENDING: 0, LEASED: 1, DONE: 1, FAILED: 0}
+  assert queue.results() == {"a": {"html": "<p>a</p>"}}
+
+def test_an_expired_lease_goes_to_another_worker(queue):
+  queue.put("a", {})
+  job = queue.lease("w1")
+  time.sleep(0.3)
+  reclaimed = queue.lease("w2")
+  assert reclaimed.key == "a" and reclaimed.attempts == 2
+  # The first worker lost its lease, so its result is dropped
+  assert not queue.renew(job, "w1")
+  assert not queue.complete(job, "w1", {"html": "late"})
+  assert queue.complete(reclaimed, "w2", {"html": "<p>a</p>"})
+  assert queue.results() == {"a": {"html": "<p>a</p>"}}
+
+def test_a_renewed_lease_is_kept(queue):
+  queue.put("a", {})
+  job = queue.lease("w1")
+  for _ in range(3):
+    time.sleep(0.1)
+    assert queue.renew(job, "w1")
+  assert queue.lease("w2") is None
+
+def test_failed_jobs_are_retried_then_given_up(queue):
+  queue.put("a", {})
+  job = queue.lease("w1")
+  assert queue.fail(job, "w1", "timeout")
+  assert queue.outstanding() == 1
+  job = queue.lease("w1")
+  assert queue.fail(job, "w1", "timeout again", result={"html": "[CONTENT BLANK]"})
+  assert queue.outstanding() == 0
+  assert queue.errors() == {"a": "timeout again"}
+  assert queue.results() == {"a": {"html": "[CONTENT BLANK]"}}
+
+def test_a_job_whose_workers_keep_dying_is_given_up(queue):
+  queue.put("a", {})
+  queue.lease("w1")
+  time.sleep(0.3)
+  queue.lease("w2")
+  time.sleep(0.3)
+  assert queue.lease("w3") is None
+  assert queue.errors() == {"a": "Lease expired"}
+
+def test_the_meta_and_jobs_are_shared_through_the_file(queue, tmp_path):
+  queue.set_meta("locators", {"data": {}})
+  queue.put("a", {})
+  other = WorkQueue(str(tmp_path / "queue.sqlite"))
+  assert other.get_meta("locators") == {"data": {}}
+  assert other.lease("w2").key == "a"
+  other.reset()
+  other.close()
+  assert queue.get_meta("locators") is None
+  assert queue.outstanding() == 0
@@ -0,0 +1,149 @@
+""" @author: Alex Nguyen
+  @file: transform.py
+  This file contains the content transformer, which cleans the located element of a page for the
+    catalog in a single walk of its tree.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import bs4
+
+from .const import HTML_TAG_NAME
+
+# Tags removed with their whole subtree
+DROPPED_TAGS = frozenset([HTML_TAG_NAME.img, HTML_TAG_NAME.hr, HTML_TAG_NAME.button, HTML_TAG_NAME.rect, HTML_TAG_NAME.svg])
+
+HEADING_TAGS = frozenset([HTML_TAG_NAME.h1, HTML_TAG_NAME.h2, HTML_TAG_NAME.h3, HTML_TAG_NAME.h4, HTML_TAG_NAME.h5, HTML_TAG_NAME.h6])
+
+# Host of the relative links of the crawled pages
+SITE_URL = "https://www.gettysburg.edu"
+
+class ContentTransformer:
+  """ The cleanup rules of a page content, applied in one pre-order walk of its tree:
+    - the elements matched by an exclude locator are removed,
+    - `img`, `hr`, `button`, `svg` and `rect` are removed,
+    - the headings are re-leveled, so that the first heading of the page is one level under the
+      template header of the page. A heading inside a dropped element counts as the first one,
+    - the `p` without any text nor element are removed,
+    - every attribute is removed, except the `href` of the links, which is made absolute.
+    The root element itself is kept as it is.
+  """
+
+  def __init__(self, header_level: str, exclude_list: List[Dict] = None) -> None:
+    """ initializer
+
+    Args:
+      header_level (str): The header tag of the page on the template, e.g, "h3".
+      exclude_list (List[Dict]): The excludes of the locator. Only the tag excludes are rules, the
+        "from" and "to" excludes are not supported.
+    """
+    self.header_level = int(header_level[1])
+    self.excludes: List[Tuple[str, frozenset]] = []
+    for excluding_tag in exclude_list or []:
+      if "from" in excluding_tag or "to" in excluding_tag:
+        continue
+      assert "html_tag" in excluding_tag and "css_class" in excluding_tag, "Wrong behavior excluding locators."
+      self.excludes.append((excluding_tag["html_tag"], frozenset(c for c in excluding_tag["css_class"].split(" ") if c)))
+
+  def is_excluded(self, tag: bs4.Tag) -> bool:
+    # Like `find_all(html_tag, {"class": [...]})`, an element having any of the classes matches
+    for html_tag, classes in self.excludes:
+      if tag.name == html_tag and any(c in classes for c in tag.get("class") or ()):
+        return True
+    return False
+
+  def transform(self, root: bs4.Tag) -> Dict[str, int]:
+    """ Clean the subtree of an element, in place.
+
+    Args:
+      root (bs4.Tag): The located element of the page.
+
+    Returns:
+      Dict[str, int]: The numbers of elements visited, excluded and removed.
+    """
+    counts = {"visited": 0, "excluded": 0, "removed": 0}
+    first_heading_level: Optional[int] = None
+
+    # Every frame is an element whose children are being walked, the snapshot of its children, the
+    # index of the next one, and whether an element has been removed from its subtree by a rule
+    # other than the excludes, which keeps a `p` from being blank
+    stack = [[root, list(root.contents), 0, False]]
+    while stack:
+      frame = stack[-1]
+      tag, children, i, _ = frame
+      if i == len(children):
+        stack.pop()
+        if stack and frame[3]:
+          stack[-1][3] = True
+        # A blank `p` is only known once its subtree is cleaned
+        if tag.name == HTML_TAG_NAME.p and stack and not frame[3] and self.__is_blank(tag):
+          tag.extract()
+          counts["removed"] += 1
+          stack[-1][3] = True
+        continue
+      frame[2] += 1
+      child = children[i]
+      if not isinstance(child, bs4.Tag):
+        continue
+      counts["visited"] += 1
+
+      if self.is_excluded(child):
+        child.extract()
+        counts["excluded"] += 1
+        continue
+      if child.name in DROPPED_TAGS:
+        if first_heading_level is None:
+          # A heading inside a dropped element still sets the level of the first heading, as in the
+          # find_all() walk this transformer replaces
+          heading = self.__first_heading(child)
+          if heading is not None:
+            first_heading_level = int(heading.name[1])
+        child.extract()
+        counts["removed"] += 1
+        frame[3] = True
+        continue
+
+      if child.name in HEADING_TAGS:
+        original_heading_level = int(child.name[1])
+        if first_heading_level is None:
+          first_heading_level = original_heading_level
+        # The first heading of the page is one level under the header of the page on the template
+        child.name = "h" + str(self.header_level + original_heading_level - first_heading_level + 1)
+
+      # Lastly, remove all attributes except for urls
+      if child.name != HTML_TAG_NAME.a:
+        child.attrs = {}
+      elif "href" in child.attrs:
+        this_url = child.attrs["href"]
+        if this_url.startswith("/"):
+          this_url = SITE_URL + this_url
+        # Exclude all other attributes except for href
+        child.attrs = {"href": this_url}
+
+      if child.contents:
+        stack.append([child, list(child.contents), 0, False])
+      elif child.name == HTML_TAG_NAME.p:
+        child.extract()
+        counts["removed"] += 1
+        frame[3] = True
+    return counts
+
+  def __first_heading(self, tag: bs4.Tag) -> Optional[bs4.Tag]:
+    # The first heading of the subtree which is not inside an excluded element
+    for heading in tag.find_all(list(HEADING_TAGS)):
+      element = heading
+      while element is not tag and not self.is_excluded(element):
+        element = element.parent
+      if element is tag:
+        return heading
+    return None
+
+  @staticmethod
+  def __is_blank(tag: bs4.Tag) -> bool:
+    # Only the direct children are read, so checking every `p` stays linear in the size of the page
+    text = ""
+    for child in tag.contents:
+      if isinstance(child, bs4.Tag):
+        return False
+      if type(child) in (bs4.NavigableString, bs4.CData):
+        text += child
+    return text.strip() == ""
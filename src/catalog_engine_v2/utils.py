@@ -2,8 +2,12 @@
 
 """
 
-import requests
+from typing import Dict, Iterator, List
+import codecs
 import json
+import requests
+
+from .client import HttpClient
 
 def load_json_locators(path):
     data = None
@@ -11,15 +15,143 @@ def load_json_locators(path):
         data = json.loads(f.read())
     return data
 
-def request_json_from_api(url: str):
+def request_json_from_api(url: str, client: HttpClient = None):
     """[summary]
 
     Args:
         url (str): [description]
+        client (HttpClient): The shared http client. A new one is created if not given.
 
     Returns:
         [type]: [description]
     """
-    res = requests.get(url)
-    data = res.json()
-    return data
\ No newline at end of file
+    if client is None:
+        client = HttpClient()
+    data = client.get_json(url)
+    return data
+
+# Size of the chunks read from the socket while streaming a json body
+JSON_CHUNK_SIZE = 64 * 1024
+
+class _JsonStream:
+    """ A json text read chunk by chunk from a response, of which only the part not decoded yet is kept
+    """
+
+    def __init__(self, res: requests.Response) -> None:
+        self.chunks = res.iter_content(JSON_CHUNK_SIZE)
+        self.decoder = codecs.getincrementaldecoder(res.encoding or "utf-8")(errors="replace")
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def __fill(self) -> bool:
+        """ Read one more chunk. Returns False at the end of the body.
+        """
+        if self.exhausted:
+            return False
+        # Drop what has been decoded already, so the buffer never grows past a few values
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            self.buffer += self.decoder.decode(b"", final=True)
+        else:
+            self.buffer += self.decoder.decode(chunk)
+        return True
+
+    def peek(self) -> str:
+        """ The next character which is not a whitespace, without consuming it
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.__fill():
+                raise ValueError("Unexpected end of the json body")
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in the json body, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        """ Decode the next json value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # A value touching the end of the buffer may be cut (a number, or `true` split in two)
+                if end < len(self.buffer) or self.exhausted:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            self.__fill()
+
+def stream_json_array(res: requests.Response, key: str = "data", attrs: List[str] = None) -> Iterator[Dict]:
+    """ Decode the objects of the array at `key` of a json response one by one, while the body
+        is downloaded, instead of decoding the whole body at once.
+
+    Args:
+        res (requests.Response): A response requested with `stream=True`, whose body is an
+            object holding the array at `key`.
+        key (str): The key of the array.
+        attrs (List[str]): If given, only these attributes of every object are kept.
+
+    Raises:
+        ValueError: If the body is not valid json, or has no array at `key`.
+
+    Returns:
+        Iterator[Dict]: The objects of the array.
+    """
+    stream = _JsonStream(res)
+    stream.expect("{")
+    if stream.peek() == "}":
+        raise ValueError(f"No {key!r} array in the json body")
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name != key:
+            # Any other member is decoded and thrown away
+            stream.value()
+        else:
+            stream.expect("[")
+            if stream.peek() == "]":
+                return
+            while True:
+                item = stream.value()
+                if attrs is not None:
+                    item = {attr: item[attr] for attr in attrs if attr in item}
+                yield item
+                if stream.peek() == "]":
+                    return
+                stream.expect(",")
+        if stream.peek() == "}":
+            raise ValueError(f"No {key!r} array in the json body")
+        stream.expect(",")
+
+def stream_courses_from_api(url: str, attrs: List[str], client: HttpClient = None) -> Dict:
+    """ Download the courses api as a stream, keeping only the given attributes of every course,
+        so the memory used while loading does not grow with the unused fields.
+
+    Args:
+        url (str): The url of the courses api.
+        attrs (List[str]): The attributes kept, i.e, `CourseExplorer.attrs`.
+        client (HttpClient): The shared http client. A new one is created if not given.
+
+    Returns:
+        Dict: The api data in the shape `{"data": [...]}` the explorers take.
+    """
+    if client is None:
+        client = HttpClient()
+    res = client.get(url, stream=True)
+    try:
+        res.raise_for_status()
+        return {"data": list(stream_json_array(res, "data", attrs))}
+    finally:
+        res.close()
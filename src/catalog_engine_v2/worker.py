@@ -0,0 +1,157 @@
+""" @author: Alex Nguyen
+  @file: worker.py
+  This file contains the crawl worker, which crawls and extracts the pages leased from a shared
+    work queue. Run it as `python -m catalog_engine_v2.worker --queue QUEUE --cache CACHE` from the
+    `src` folder, on this machine or on any machine sharing the queue and cache folders.
+"""
+
+from typing import Dict
+import argparse
+import os
+import socket
+import threading
+import time
+
+from .cache import CrawlCache
+from .client import HttpClient
+from .const import DEFAULT_PARSER, PAGE_TAG
+from .deadline import Deadline
+from .page import Page
+from .parser import PARSER_BACKENDS, parser_factory_from_args, set_parser_factory
+from .sitemap import Sitemap
+from .singleflight import SingleFlight
+from .workqueue import Job, WorkQueue
+
+# Seconds an idle worker waits before asking the queue again
+POLL_SECONDS = 0.5
+
+def page_payload(html_id: str, header_level: str, url: str, stream: bool, with_subject_abbrs: bool, deadline: float = None, strain: bool = False) -> Dict:
+  """ The job of one template slot.
+
+  Args:
+    html_id (str): The html id of the slot header.
+    header_level (str): The header tag, e.g, "h3".
+    url (str): The url of the page.
+    stream (bool): Whether the page is streamed.
+    with_subject_abbrs (bool): Whether the subject abbreviations of the page are needed.
+    deadline (float): Seconds the page may take to crawl. None means no limit.
+    strain (bool): Whether only the located element of the page is parsed.
+
+  Returns:
+    Dict: The payload of the job.
+  """
+  return {
+    "page_tag": PAGE_TAG.COURSE_PROG.value,
+    "html_id": html_id,
+    "header_level": header_level,
+    "url": url,
+    "stream": stream,
+    "with_subject_abbrs": with_subject_abbrs,
+    "deadline": deadline,
+    "strain": strain,
+  }
+
+class CrawlWorker:
+  """ Lease page jobs from the queue one by one, build each `Page` and store its journal record
+    (see `Page.to_record`) as the result of the job. The lease of the running job is renewed in the
+    background, so only a dead worker loses its job.
+  """
+
+  def __init__(self, queue: WorkQueue, client: HttpClient = None, cache: CrawlCache = None, worker_id: str = None) -> None:
+    """ initializer
+
+    Args:
+      queue (WorkQueue): The shared work queue.
+      client (HttpClient): The http client. A new one is created if not given.
+      cache (CrawlCache): The page cache, shared with the other workers through the filesystem.
+      worker_id (str): The id of the worker in the queue. Defaults to `host:pid`.
+    """
+    self.queue = queue
+    self.client = client if client is not None else HttpClient()
+    self.cache = cache
+    self.worker_id = worker_id if worker_id is not None else f"{socket.gethostname()}:{os.getpid()}"
+    self.parses = SingleFlight()
+    self.locators_data = queue.get_meta("locators")
+    self.n_jobs = 0
+
+  def __renew(self, job: Job, stop: threading.Event) -> None:
+    while not stop.wait(self.queue.lease_seconds / 3):
+      if not self.queue.renew(job, self.worker_id):
+        return
+
+  def run_job(self, job: Job) -> None:
+    payload = job.payload
+    stop = threading.Event()
+    renewer = threading.Thread(target=self.__renew, args=(job, stop), daemon=True)
+    renewer.start()
+    try:
+      page = Page(
+        page_tag=PAGE_TAG(payload["page_tag"]),
+        html_id=payload["html_id"],
+        header_level=payload["header_level"],
+        locators_data=self.locators_data,
+        url=payload["url"],
+        client=self.client,
+        cache=self.cache,
+        parses=self.parses,
+        stream=payload["stream"],
+        deadline=Deadline(payload.get("deadline")),
+        strain=payload.get("strain", False)
+      )
+      record = page.to_record(with_subject_abbrs=payload["with_subject_abbrs"])
+    except Exception as e:
+      # Retried by any worker, and given up without a result after `max_attempts`
+      self.queue.fail(job, self.worker_id, repr(e))
+      self.n_jobs += 1
+      return
+    finally:
+      stop.set()
+      renewer.join()
+    if page.crawl_success or page.url.endswith(".pdf"):
+      self.queue.complete(job, self.worker_id, record)
+    else:
+      # Retried by any worker, and kept blank once it is given up
+      self.queue.fail(job, self.worker_id, "\n".join(page.logging), result=record)
+    self.n_jobs += 1
+
+  def run(self) -> int:
+    """ Work until the queue has no pending nor leased job left.
+
+    Returns:
+      int: The number of jobs this worker did.
+    """
+    while True:
+      job = self.queue.lease(self.worker_id)
+      if job is None:
+        # The leased jobs of the other workers may still come back if a worker dies
+        if self.queue.outstanding() == 0:
+          return self.n_jobs
+        time.sleep(POLL_SECONDS)
+        continue
+      self.run_job(job)
+
+def main(argv=None) -> None:
+  parser = argparse.ArgumentParser(description="Crawl the pages of a shared work queue.")
+  parser.add_argument("--queue", required=True, help="The work queue file.")
+  parser.add_argument("--cache", help="The shared page cache folder.")
+  parser.add_argument("--revalidate", action="store_true", help="Revalidate the cached pages.")
+  parser.add_argument("--max-bytes", type=int, help="Size budget of the page cache, in bytes.")
+  parser.add_argument("--parser", choices=list(PARSER_BACKENDS), default=DEFAULT_PARSER, help="The html parser backend of every parsing stage.")
+  parser.add_argument("--stage-parser", action="append", metavar="STAGE=BACKEND",
+    help="The html parser backend of one parsing stage, e.g, page=lxml.")
+  args = parser.parse_args(argv)
+  set_parser_factory(parser_factory_from_args(args.parser, args.stage_parser))
+
+  queue = WorkQueue(args.queue)
+  # The sitemap of the run is read once by the coordinator, and shared through the queue
+  lastmods = queue.get_meta("sitemap")
+  sitemap = Sitemap.from_lastmods(lastmods) if lastmods is not None else None
+  cache = CrawlCache(args.cache, revalidate=args.revalidate, max_bytes=args.max_bytes, sitemap=sitemap) if args.cache else None
+  with HttpClient() as client:
+    worker = CrawlWorker(queue, client=client, cache=cache)
+    n_jobs = worker.run()
+  queue.close()
+  print(f"Worker {worker.worker_id} did {n_jobs} jobs")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,210 @@
+""" @author: Alex Nguyen
+  @file: workqueue.py
+  This file contains the SQLite work queue shared by the crawl worker processes, with leased jobs
+    which are reclaimed when their worker dies.
+"""
+
+from typing import Any, Dict, List, Optional
+import json
+import sqlite3
+import threading
+import time
+
+from .const import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+class Job:
+  """ A leased job.
+  """
+
+  def __init__(self, id: int, key: str, payload: Dict, attempts: int) -> None:
+    self.id = id
+    self.key = key
+    self.payload = payload
+    self.attempts = attempts
+
+class WorkQueue:
+  """ A work queue in one SQLite file, shared by every worker process on this machine, or on
+    several machines whose filesystem locks work (a local disk; network filesystems often do not
+    lock reliably). A worker leases a job for `lease_seconds` and must complete, fail or renew it
+    before the lease ends, otherwise the job goes back to the other workers.
+  """
+
+  def __init__(self, path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> None:
+    """ initializer
+
+    Args:
+      path (str): The path to the queue file. Created if it does not exist.
+      lease_seconds (float): How long a leased job belongs to its worker.
+      max_attempts (int): How many times a job is leased before it is given up.
+    """
+    self.path = path
+    self.lease_seconds = lease_seconds
+    self.max_attempts = max_attempts
+    # Autocommit mode, every write takes its own `BEGIN IMMEDIATE` transaction. The connection is
+    # shared with the lease renewing thread of the worker, hence the lock.
+    self.lock = threading.Lock()
+    self.db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+    self.db.execute("PRAGMA journal_mode=WAL")
+    self.db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+      id INTEGER PRIMARY KEY,
+      key TEXT UNIQUE NOT NULL,
+      payload TEXT NOT NULL,
+      state TEXT NOT NULL,
+      worker TEXT,
+      lease_until REAL,
+      attempts INTEGER NOT NULL DEFAULT 0,
+      result TEXT,
+      error TEXT)""")
+    self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+  def __execute(self, sql: str, params=()) -> List:
+    with self.lock:
+      return self.db.execute(sql, params).fetchall()
+
+  def __update(self, sql: str, params) -> bool:
+    # Whether exactly one row changed, i.e, the worker still held the lease
+    with self.lock:
+      return self.db.execute(sql, params).rowcount == 1
+
+  def __transaction(self, fn):
+    with self.lock:
+      self.db.execute("BEGIN IMMEDIATE")
+      try:
+        result = fn()
+      except BaseException:
+        self.db.execute("ROLLBACK")
+        raise
+      self.db.execute("COMMIT")
+      return result
+
+  def reset(self) -> None:
+    """ Drop every job and setting, to start a new run.
+    """
+    self.__transaction(lambda: (self.db.execute("DELETE FROM jobs"), self.db.execute("DELETE FROM meta")))
+
+  def set_meta(self, key: str, value: Any) -> None:
+    """ Share a setting of the run with every worker, e.g, the locators.
+    """
+    self.__execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+  def get_meta(self, key: str) -> Any:
+    rows = self.__execute("SELECT value FROM meta WHERE key = ?", (key,))
+    return json.loads(rows[0][0]) if rows else None
+
+  def put(self, key: str, payload: Dict) -> None:
+    """ Add a job, unless a job of the same key is already there.
+
+    Args:
+      key (str): The unique key of the job.
+      payload (Dict): Everything the worker needs to do the job.
+    """
+    self.__execute("INSERT OR IGNORE INTO jobs (key, payload, state) VALUES (?, ?, ?)", (key, json.dumps(payload), PENDING))
+
+  def put_many(self, jobs: List[tuple]) -> None:
+    """ Add many jobs in one transaction.
+
+    Args:
+      jobs (List[(str, Dict)]): The (key, payload) of every job.
+    """
+    self.__transaction(lambda: self.db.executemany(
+      "INSERT OR IGNORE INTO jobs (key, payload, state) VALUES (?, ?, ?)",
+      [(key, json.dumps(payload), PENDING) for key, payload in jobs]))
+
+  def lease(self, worker: str) -> Optional[Job]:
+    """ Take the oldest pending job, or a job whose lease has ended.
+
+    Args:
+      worker (str): The id of the worker.
+
+    Returns:
+      Job: The leased job, None if there is nothing to do right now.
+    """
+    def take():
+      now = time.time()
+      # A job whose worker died too many times is given up, it probably kills its workers
+      self.db.execute(
+        "UPDATE jobs SET state = ?, error = ? WHERE state = ? AND lease_until < ? AND attempts >= ?",
+        (FAILED, "Lease expired", LEASED, now, self.max_attempts))
+      row = self.db.execute(
+        "SELECT id, key, payload, attempts FROM jobs WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY id LIMIT 1",
+        (PENDING, LEASED, now)).fetchone()
+      if row is None:
+        return None
+      self.db.execute(
+        "UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+        (LEASED, worker, now + self.lease_seconds, row[0]))
+      return Job(row[0], row[1], json.loads(row[2]), row[3] + 1)
+    return self.__transaction(take)
+
+  def renew(self, job: Job, worker: str) -> bool:
+    """ Extend the lease of a job which is still running.
+
+    Returns:
+      bool: False if the lease was lost, i.e, the job has been reclaimed by another worker.
+    """
+    return self.__update(
+      "UPDATE jobs SET lease_until = ? WHERE id = ? AND state = ? AND worker = ?",
+      (time.time() + self.lease_seconds, job.id, LEASED, worker))
+
+  def complete(self, job: Job, worker: str, result: Dict) -> bool:
+    """ Store the result of a job.
+
+    Returns:
+      bool: False if the lease was lost, in which case the result is dropped.
+    """
+    return self.__update(
+      "UPDATE jobs SET state = ?, result = ?, lease_until = NULL WHERE id = ? AND state = ? AND worker = ?",
+      (DONE, json.dumps(result, ensure_ascii=False), job.id, LEASED, worker))
+
+  def fail(self, job: Job, worker: str, error: str, result: Dict = None) -> bool:
+    """ Give a job back to be retried, or give it up after `max_attempts`.
+
+    Args:
+      job (Job): The failed job.
+      worker (str): The id of the worker.
+      error (str): What went wrong.
+      result (Dict): The result to keep if the job is given up.
+
+    Returns:
+      bool: False if the lease was lost.
+    """
+    given_up = job.attempts >= self.max_attempts
+    return self.__update(
+      "UPDATE jobs SET state = ?, error = ?, result = ?, worker = NULL, lease_until = NULL WHERE id = ? AND state = ? AND worker = ?",
+      (FAILED if given_up else PENDING, error, json.dumps(result, ensure_ascii=False) if given_up and result is not None else None,
+        job.id, LEASED, worker))
+
+  def counts(self) -> Dict[str, int]:
+    """ Returns:
+      Dict[str, int]: The number of jobs in every state.
+    """
+    counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+    for state, count in self.__execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+      counts[state] = count
+    return counts
+
+  def outstanding(self) -> int:
+    counts = self.counts()
+    return counts[PENDING] + counts[LEASED]
+
+  def results(self) -> Dict[str, Dict]:
+    """ Returns:
+      Dict[str, Dict]: The result of every finished job (done, or given up with a result) by key.
+    """
+    rows = self.__execute("SELECT key, result FROM jobs WHERE result IS NOT NULL ORDER BY id")
+    return {key: json.loads(result) for key, result in rows}
+
+  def errors(self) -> Dict[str, str]:
+    """ Returns:
+      Dict[str, str]: The last error of every given up job by key.
+    """
+    return dict(self.__execute("SELECT key, error FROM jobs WHERE state = ?", (FAILED,)))
+
+  def close(self) -> None:
+    with self.lock:
+      self.db.close()
@@ -12,25 +12,96 @@
 
 from catalog_engine.explorer import CourseExplorer
 from catalog_engine.generator import Generator
-from catalog_engine.scraper import Scraper
+from catalog_engine.scraper import Scraper, DiscoveryCrawler
 from catalog_engine.extractor import CourseExtractor, PolicyExtractor, FacultyExtractor
+from catalog_engine_v2.cache import CrawlCache
+from catalog_engine_v2.journal import CrawlJournal
+from catalog_engine_v2.sitemap import Sitemap
+from catalog_engine_v2.archive import open_client
+from catalog_engine_v2.singleflight import SingleFlight
+from catalog_engine_v2.const import GETTYSBURG_SITEMAP, DEFAULT_SNAPSHOT_MAX_AGE, DEFAULT_PARSER
+from catalog_engine_v2.parser import PARSER_BACKENDS, parser_factory_from_args, set_parser_factory
+from catalog_engine_v2.snapshot import CourseSnapshotStore
 
 import argparse
+import atexit
+import os
+import tempfile
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--revalidate", action="store_true",
+        help="Revalidate the cached pages with conditional requests instead of reusing them as they are.")
+    parser.add_argument("--record", metavar="ARCHIVE",
+        help="Record every response of this run to an archive file.")
+    parser.add_argument("--replay", metavar="ARCHIVE",
+        help="Serve every response from an archive file, without any network.")
+    parser.add_argument("--cache-budget", metavar="MB", type=float,
+        help="Size budget of the compressed page cache. The least recently used pages are evicted beyond it.")
+    parser.add_argument("--discover", metavar="FOLDER",
+        help="Crawl the site for the catalog pages first, write the url manifests to FOLDER and print how they differ from ./data/. Use ./data/ to scrape the discovered pages.")
+    parser.add_argument("--sitemap", metavar="SITEMAP", nargs="?", const=GETTYSBURG_SITEMAP,
+        help="Reuse the cached pages whose sitemap lastmod is older than their fetch without any request, and crawl the others again. Takes an url or a local file, and defaults to the sitemap of the website.")
+    parser.add_argument("--api-max-age", metavar="HOURS", type=float, default=DEFAULT_SNAPSHOT_MAX_AGE / 3600,
+        help="Use the local snapshot of the courses api without downloading it if it is younger than this.")
+    parser.add_argument("--api-sync", action="store_true",
+        help="Download the courses api even if the local snapshot is fresh.")
+    parser.add_argument("--resume", action="store_true",
+        help="Continue an interrupted run from its crawl journal, redoing only the work it had not finished.")
+    parser.add_argument("--parser", choices=list(PARSER_BACKENDS), default=DEFAULT_PARSER,
+        help="The html parser backend of every parsing stage.")
+    parser.add_argument("--stage-parser", metavar="STAGE=PARSER", action="append",
+        help="The html parser backend of one parsing stage (page, scraper, links, template, course), e.g, page=lxml.")
+    parser.add_argument("--full-parse", action="store_true",
+        help="Build the whole tree of every page instead of only the elements the extractors read.")
+    args = parser.parse_args()
+    set_parser_factory(parser_factory_from_args(args.parser, args.stage_parser))
+
     csv_course_path = './data/courseLinks.csv'
     csv_policies_path = './data/pages.csv'
     csv_faculty_path = './data/faculty.csv'
-    s_c = Scraper(csv_course_path, flag='courses')
-    s_p = Scraper(csv_policies_path, flag='policies')
-    s_f = Scraper(csv_faculty_path, flag='faculty')
+    # One pooled client, one url-keyed cache and one parse group are shared by every scraper,
+    # so an url listed in several csv files is fetched and parsed once
+    client = open_client(record_path=args.record, replay_path=args.replay)
+    html_cache_path = './data/html/'
+    api_snapshot_path = './data/api/'
+    if args.record or args.replay:
+        # Every request has to reach the client to be recorded or replayed
+        scratch = tempfile.TemporaryDirectory()
+        # Removed with everything in it when the run exits
+        atexit.register(scratch.cleanup)
+        html_cache_path = os.path.join(scratch.name, "html")
+        api_snapshot_path = os.path.join(scratch.name, "api")
+    cache_budget = int(args.cache_budget * 1024 * 1024) if args.cache_budget else None
+    sitemap = Sitemap(args.sitemap, client=client) if args.sitemap else None
+    cache = CrawlCache(html_cache_path, revalidate=args.revalidate, max_bytes=cache_budget, sitemap=sitemap)
+    parses = SingleFlight()
+    journal = CrawlJournal('./data/journal/main.jsonl', resume=args.resume)
+    if args.discover:
+        crawler = DiscoveryCrawler(client=client, cache=cache)
+        for flag, (added, removed) in crawler.write_manifests(args.discover).items():
+            print(f"Manifest {flag}: {len(crawler.manifests[flag])} urls, {len(added)} new: {added}, {len(removed)} gone: {removed}")
+        if crawler.failed:
+            print(f"Failed discovering {len(crawler.failed)} urls: {list(crawler.failed)}")
+    # Unless asked otherwise, only the elements each extractor reads are built when parsing the pages
+    strain = not args.full_parse
+    s_c = Scraper(csv_course_path, flag='courses', client=client, cache=cache, parses=parses, journal=journal, containers=CourseExtractor.CONTAINERS if strain else None)
+    s_p = Scraper(csv_policies_path, flag='policies', client=client, cache=cache, parses=parses, journal=journal, containers=PolicyExtractor.CONTAINERS if strain else None)
+    s_f = Scraper(csv_faculty_path, flag='faculty', client=client, cache=cache, parses=parses, journal=journal, containers=FacultyExtractor.CONTAINERS if strain else None)
+    print(f"Dedupe: {parses.stats()}")
+    print(f"Cache: {cache.stats()}")
+    print(f"Journal: {journal.stats()}")
     ce = CourseExtractor(s_c)
     pe = PolicyExtractor(s_p)
     fe = FacultyExtractor(s_f)
 
     api = 'https://www.gettysburg.edu/api/funnelback/courses/'
-    c_explore = CourseExplorer(s_c.request_json_from_api(api))
+    snapshots = CourseSnapshotStore(api_snapshot_path, max_age=args.api_max_age * 3600)
+    c_explore = CourseExplorer.from_snapshot(snapshots, client=client, url=api, force=args.api_sync)
+    print(f"Courses api delta: {c_explore.delta}")
     gen = Generator(ce, pe, fe, c_explore)
     gen.generate_html_from_data("../output", "new_official")
     gen.generate_json_from_data("../output","output_official")
+    journal.close()
+    client.close()
@@ -10,22 +10,74 @@
         can be viewed at `../../doc/` folder.
 """
 
+from catalog_engine_v2.cache import CrawlCache
+from catalog_engine_v2.journal import CrawlJournal
+from catalog_engine_v2.links import link_client, print_broken_report, validate_catalogs
+from catalog_engine_v2.sitemap import Sitemap
+from catalog_engine_v2.archive import open_client
 from catalog_engine_v2.explorer import CourseExplorer
-from catalog_engine_v2.const import COURSE_CRAWLING_MODE, FUNNELBACK_COURSE_API
+from catalog_engine_v2.const import COURSE_CRAWLING_MODE, FUNNELBACK_COURSE_API, GETTYSBURG_SITEMAP, DEFAULT_SNAPSHOT_MAX_AGE, DEFAULT_PAGE_DEADLINE, DEFAULT_MAX_CONCURRENCY, DEFAULT_PARSER
+from catalog_engine_v2.parser import PARSER_BACKENDS, parser_factory_from_args, set_parser_factory
+from catalog_engine_v2.singleflight import SingleFlight
+from catalog_engine_v2.snapshot import CourseSnapshotStore
 from catalog_engine_v2.template_v2 import Template
-from catalog_engine_v2.utils import request_json_from_api
 
 import argparse
+import atexit
+import os
+import tempfile
 # import sys
 # import resource
 
 if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--revalidate", action="store_true",
+        help="Revalidate the cached pages with conditional requests instead of reusing them as they are.")
+    parser.add_argument("--record", metavar="ARCHIVE",
+        help="Record every response of this run to an archive file.")
+    parser.add_argument("--replay", metavar="ARCHIVE",
+        help="Serve every response from an archive file, without any network.")
+    parser.add_argument("--cache-budget", metavar="MB", type=float,
+        help="Size budget of the compressed page cache. The least recently used pages are evicted beyond it.")
+    parser.add_argument("--stream", action="store_true",
+        help="Stop downloading each uncached page once the content matched by its locator is read.")
+    parser.add_argument("--sitemap", metavar="SITEMAP", nargs="?", const=GETTYSBURG_SITEMAP,
+        help="Reuse the cached pages whose sitemap lastmod is older than their fetch without any request, and crawl the others again. Takes an url or a local file, and defaults to the sitemap of the website.")
+    parser.add_argument("--api-max-age", metavar="HOURS", type=float, default=DEFAULT_SNAPSHOT_MAX_AGE / 3600,
+        help="Use the local snapshot of the courses api without downloading it if it is younger than this.")
+    parser.add_argument("--api-sync", action="store_true",
+        help="Download the courses api even if the local snapshot is fresh.")
+    parser.add_argument("--resume", action="store_true",
+        help="Continue an interrupted run from its crawl journal, redoing only the work it had not finished.")
+    parser.add_argument("--workers", metavar="N", type=int,
+        help="Crawl the pages with N worker processes pulling from a shared work queue. Workers on other machines can join with `python -m catalog_engine_v2.worker`. Workers do not record nor replay.")
+    parser.add_argument("--page-deadline", metavar="SECONDS", type=float, default=DEFAULT_PAGE_DEADLINE,
+        help="Leave a page blank if it takes longer than this to crawl, retries included.")
+    parser.add_argument("--run-deadline", metavar="SECONDS", type=float,
+        help="Leave blank every page not crawled after this many seconds.")
+    parser.add_argument("--max-concurrency", metavar="N", type=int, default=DEFAULT_MAX_CONCURRENCY,
+        help="Number of pages crawled and extracted at the same time.")
+    parser.add_argument("--pipeline", action="store_true",
+        help="Write each section of the catalog as soon as its pages are crawled, while the next pages are still downloading.")
+    parser.add_argument("--check-links", action="store_true",
+        help="Check every outbound link of the generated catalog and report the broken ones.")
+    parser.add_argument("--parser", choices=list(PARSER_BACKENDS), default=DEFAULT_PARSER,
+        help="The html parser backend of every parsing stage.")
+    parser.add_argument("--stage-parser", metavar="STAGE=PARSER", action="append",
+        help="The html parser backend of one parsing stage (page, scraper, links, template, course), e.g, page=lxml.")
+    parser.add_argument("--full-parse", action="store_true",
+        help="Build the whole tree of every page instead of only the element its locator reads.")
+    args = parser.parse_args()
+    set_parser_factory(parser_factory_from_args(args.parser, args.stage_parser))
     
     # template_path = "./data/template.html"
     template_2022_path = "./model/model-output-2022.html"
     locators_path = "./data/locators.json"
     exported_content_path = "../output/tmp_v2.html"
     data_path = "./data/page_objects"
+    html_cache_path = "./data/html/"
+    api_snapshot_path = "./data/api/"
 
     # https://stackoverflow.com/a/41916266
     # max_rec = 0x100000
@@ -33,8 +85,29 @@ if __name__ == '__main__':
     # resource.setrlimit(resource.RLIMIT_STACK, [0x100 * max_rec, resource.RLIM_INFINITY])
     # sys.setrecursionlimit(max_rec)
 
+    # One pooled client is shared by the api request and every page crawl
+    client = open_client(record_path=args.record, replay_path=args.replay)
+    if args.record or args.replay:
+        # Every request has to reach the client to be recorded or replayed
+        scratch = tempfile.TemporaryDirectory()
+        # Removed with everything in it when the run exits
+        atexit.register(scratch.cleanup)
+        html_cache_path = os.path.join(scratch.name, "html")
+        api_snapshot_path = os.path.join(scratch.name, "api")
+    # Same url-keyed cache folder as the v1 scrapers in `main.py`
+    cache_budget = int(args.cache_budget * 1024 * 1024) if args.cache_budget else None
+    sitemap = Sitemap(args.sitemap, client=client) if args.sitemap else None
+    cache = CrawlCache(html_cache_path, revalidate=args.revalidate, max_bytes=cache_budget, sitemap=sitemap)
+    # Template slots of the same url share one fetch and one parse
+    parses = SingleFlight()
+    # Every extracted page is journaled, so an interrupted run can be resumed with `--resume`
+    journal = CrawlJournal("./data/journal/mainv2.jsonl", resume=args.resume)
+
     # First of all, process the code from the api
-    explorer = CourseExplorer(request_json_from_api(FUNNELBACK_COURSE_API))
+    # The api is read from its local snapshot, and only downloaded when the snapshot is stale
+    snapshots = CourseSnapshotStore(api_snapshot_path, max_age=args.api_max_age * 3600)
+    explorer = CourseExplorer.from_snapshot(snapshots, client=client, url=FUNNELBACK_COURSE_API, force=args.api_sync)
+    print(f"Courses api delta: {explorer.delta}")
     # print(explorer.subjects_dict)
 
     # Second, process the catalog generation
@@ -45,9 +118,33 @@ if __name__ == '__main__':
         course_crawling_mode=COURSE_CRAWLING_MODE.api, 
         course_explorer=explorer, 
         data_path=data_path,
-        verbose=True)
-    T.insight()
-    exported_content = T.generate()
-    with open(exported_content_path, "wb") as f:
-        f.write(exported_content.encode("utf8"))
-    
\ No newline at end of file
+        verbose=True,
+        client=client,
+        cache=cache,
+        parses=parses,
+        stream=args.stream,
+        journal=journal,
+        page_deadline=args.page_deadline,
+        run_deadline=args.run_deadline,
+        max_concurrency=args.max_concurrency,
+        strain=not args.full_parse)
+    if args.pipeline and args.workers is None:
+        T.generate_pipelined(exported_content_path)
+    else:
+        if args.workers is not None:
+            T.insight_distributed("./data/queue.sqlite", n_workers=args.workers)
+        else:
+            T.insight()
+        exported_content = T.generate()
+        with open(exported_content_path, "wb") as f:
+            f.write(exported_content.encode("utf8"))
+    print(f"Dedupe: {parses.stats()}")
+    print(f"Cache: {cache.stats()}")
+    print(f"Crawler stats: {client.controller.stats()}")
+    print(f"Journal: {journal.stats()}")
+    journal.close()
+    client.close()
+
+    if args.check_links:
+        with link_client() as link_checker:
+            print_broken_report(validate_catalogs([exported_content_path], link_checker, cache_path="./data/links.json"))